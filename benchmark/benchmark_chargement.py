@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import create_engine, text
+from generer_donnees import GRAINE, TAUX_DOUBLONS, TAUX_ORPHELINS, generer
+
+# Mesure le chargement de creation/remplissage.py sur des CSV synthétiques, dans une base dédiée
+# (recréée à chaque mesure), et écrit le résultat dans un fichier JSON comparable d'un commit à l'autre.
+
+# --- Configuration de la base de données ---
+USER = 'postgres'
+PASSWORD = ''
+HOST = '127.0.0.1'
+PORT = 5434
+DB_BENCHMARK = 'sport_benchmark'  # Jamais la base 'sport' : elle est supprimée et recréée
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_CHARGEMENT = os.path.join(RACINE, "creation", "remplissage.py")
+DOSSIER_CSV = os.path.join(RACINE, "benchmark", "csv")
+DOSSIER_RESULTATS = os.path.join(RACINE, "benchmark", "resultats")
+
+TABLES = ["data_es_installation_updated", "data_es_equipement_updated", "data_es_activite_updated"]
+
+# Indicateurs comparés avec --comparer : (clé, libellé, True si plus grand = mieux)
+INDICATEURS = [
+    ("duree_s", "Durée totale (s)", False),
+    ("lignes_par_s", "Lignes/s", True),
+    ("mo_par_s", "Mo/s", True),
+    ("pic_rss_mo", "Pic RSS (Mo)", False),
+]
+
+
+def commit_courant():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def recreer_base():
+    """Supprime puis recrée la base de benchmark (AUTOCOMMIT obligatoire pour CREATE/DROP DATABASE)."""
+    url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/postgres"
+    engine = create_engine(url, isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{DB_BENCHMARK}"'))
+            conn.execute(text(f'CREATE DATABASE "{DB_BENCHMARK}"'))
+    finally:
+        engine.dispose()
+
+
+def compter_lignes():
+    url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_BENCHMARK}"
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            return {table: conn.execute(text(f'SELECT count(*) FROM "{table}"')).scalar() for table in TABLES}
+    finally:
+        engine.dispose()
+
+
+def donnees(args):
+    """CSV à charger : réutilisés si generation.json correspond aux paramètres, sinon régénérés."""
+    chemin_description = os.path.join(args.csv, "generation.json")
+    parametres = {"lignes": args.lignes, "doublons": args.doublons, "orphelins": args.orphelins,
+                  "graine": args.graine}
+    if os.path.exists(chemin_description) and not args.regenerer:
+        with open(chemin_description, encoding="utf-8") as f:
+            description = json.load(f)
+        if description["parametres"] == parametres:
+            print(f"CSV synthétiques réutilisés : {args.csv}")
+            return description
+    return generer(args.csv, args.lignes, args.doublons, args.orphelins, args.graine)
+
+
+def mesurer_chargement(args):
+    """Lance remplissage.py dans un sous-processus et renvoie (durée, pic RSS en Mo, temps par phase)."""
+    fichier_temps = os.path.join(args.csv, "temps.json")
+    if os.path.exists(fichier_temps):
+        os.remove(fichier_temps)
+
+    commande = [sys.executable, SCRIPT_CHARGEMENT, "--base", DB_BENCHMARK, "--csv", args.csv,
+                "--temps", fichier_temps, "--mode", args.mode]
+    if args.workers:
+        commande += ["--workers", str(args.workers)]
+
+    debut = time.perf_counter()
+    subprocess.run(commande, cwd=RACINE, check=True)
+    duree = time.perf_counter() - debut
+
+    # ru_maxrss (Ko sous Linux) : plus gros processus parmi le chargeur et ses processus de chargement
+    pic_rss_mo = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    if not os.path.exists(fichier_temps):
+        raise RuntimeError("Le chargement a échoué (voir la sortie de remplissage.py ci-dessus).")
+    with open(fichier_temps, encoding="utf-8") as f:
+        phases = json.load(f)
+    return duree, pic_rss_mo, phases
+
+
+def comparer(resultat, chemin_reference):
+    with open(chemin_reference, encoding="utf-8") as f:
+        reference = json.load(f)
+
+    print(f"\nComparaison avec {chemin_reference} (commit {reference['commit']}) :")
+    if reference["parametres"] != resultat["parametres"]:
+        print("  Attention : paramètres différents, la comparaison n'est qu'indicative.")
+    print(f"  {'Indicateur':<20} {'Référence':>12} {'Actuel':>12} {'Écart':>9}")
+    for cle, libelle, plus_grand_mieux in INDICATEURS:
+        avant, apres = reference[cle], resultat[cle]
+        ecart = (apres - avant) / avant * 100 if avant else 0
+        tendance = ""
+        if ecart:
+            tendance = "mieux" if (ecart > 0) == plus_grand_mieux else "moins bien"
+        print(f"  {libelle:<20} {avant:>12.1f} {apres:>12.1f} {ecart:>+8.1f}% {tendance}")
+    for phase in sorted(set(reference["phases"]) | set(resultat["phases"])):
+        avant, apres = reference["phases"].get(phase), resultat["phases"].get(phase)
+        avant_str = f"{avant:.2f}" if avant is not None else "-"
+        apres_str = f"{apres:.2f}" if apres is not None else "-"
+        print(f"  {phase:<40} {avant_str:>10} {apres_str:>10}")
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark du chargement (creation/remplissage.py).")
+    parser.add_argument("--lignes", type=int, default=100_000,
+                        help="nombre total de lignes générées, de 100 000 à 10 000 000 (défaut : 100 000)")
+    parser.add_argument("--doublons", type=float, default=TAUX_DOUBLONS, help="part des doublons de clé primaire")
+    parser.add_argument("--orphelins", type=float, default=TAUX_ORPHELINS, help="part des clés étrangères orphelines")
+    parser.add_argument("--graine", type=int, default=GRAINE, help="graine du générateur aléatoire")
+    parser.add_argument("--regenerer", action="store_true", help="régénère les CSV même s'ils existent déjà")
+    parser.add_argument("--csv", default=DOSSIER_CSV, help=f"dossier des CSV synthétiques (défaut : {DOSSIER_CSV})")
+    parser.add_argument("--mode", choices=["copy", "ligne"], default="copy", help="mode de chargement mesuré")
+    parser.add_argument("--workers", type=int, help="nombre de processus du chargeur (défaut : le sien)")
+    parser.add_argument("--sortie", help="fichier JSON du résultat (défaut : benchmark/resultats/<commit>-<lignes>.json)")
+    parser.add_argument("--comparer", metavar="REFERENCE", help="fichier JSON d'un benchmark précédent à comparer")
+    return parser.parse_args()
+
+
+def main():
+    args = lire_arguments()
+    print("BENCHMARK DU CHARGEMENT")
+    print("-" * 50)
+
+    description = donnees(args)
+    nb_lignes = sum(fichier["lignes"] for fichier in description["fichiers"].values())
+    nb_octets = sum(fichier["octets"] for fichier in description["fichiers"].values())
+
+    print(f"\nRecréation de la base '{DB_BENCHMARK}'...")
+    recreer_base()
+
+    print(f"Chargement de {nb_lignes} lignes ({nb_octets / 1e6:.1f} Mo) en mode {args.mode}...")
+    duree, pic_rss_mo, phases = mesurer_chargement(args)
+
+    commit = commit_courant()
+    resultat = {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "parametres": dict(description["parametres"], mode=args.mode, workers=args.workers),
+        "lignes": nb_lignes,
+        "octets": nb_octets,
+        "duree_s": duree,
+        "lignes_par_s": nb_lignes / duree,
+        "mo_par_s": nb_octets / 1e6 / duree,
+        "pic_rss_mo": pic_rss_mo,
+        "phases": phases,
+        "lignes_chargees": compter_lignes(),
+    }
+
+    sortie = args.sortie or os.path.join(DOSSIER_RESULTATS, f"{commit}-{nb_lignes}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(sortie)), exist_ok=True)
+    with open(sortie, mode="w", encoding="utf-8") as f:
+        json.dump(resultat, f, ensure_ascii=False, indent=2)
+
+    print("-" * 50)
+    print(f"Durée : {duree:.2f} s | {resultat['lignes_par_s']:.0f} lignes/s | {resultat['mo_par_s']:.1f} Mo/s "
+          f"| pic RSS {pic_rss_mo:.0f} Mo")
+    print(f"Résultat écrit dans {sortie}")
+
+    if args.comparer:
+        comparer(resultat, args.comparer)
+
+
+if __name__ == "__main__":
+    main()
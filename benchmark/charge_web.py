@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+
+# Test de charge du serveur web (utilisation/requete_web.py ou utilisation/serveur.py) : plusieurs clients
+# envoient /execute en boucle pendant une durée fixée ; débit, latences et codes de réponse sont affichés.
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RACINE, "utilisation"))
+from moteur import PREDEFINED_QUERIES
+
+URL = "http://127.0.0.1:5001"
+NB_CLIENTS = 20
+DUREE = 30  # Secondes
+DELAI_HTTP = 120  # Secondes avant d'abandonner une réponse
+
+
+def envoyer(url, corps):
+    """(code HTTP, durée en s, octets reçus) d'un appel à /execute."""
+    requete = urllib.request.Request(f"{url}/execute", data=json.dumps(corps).encode(), method="POST",
+                                     headers={"Content-Type": "application/json", "Accept-Encoding": "gzip"})
+    debut = time.perf_counter()
+    try:
+        with urllib.request.urlopen(requete, timeout=DELAI_HTTP) as reponse:
+            taille = len(reponse.read())
+            return reponse.status, time.perf_counter() - debut, taille
+    except urllib.error.HTTPError as e:
+        taille = len(e.read())
+        return e.code, time.perf_counter() - debut, taille
+    except OSError:
+        return "erreur réseau", time.perf_counter() - debut, 0
+
+
+def client(url, corps, sans_cache, fin, mesures, verrou):
+    while time.monotonic() < fin:
+        envoi = dict(corps)
+        if sans_cache:
+            # Littéral unique (un commentaire est retiré de la clé du cache) : la requête est vraiment exécutée.
+            # Envoyée en SQL libre : une requête prédéfinie est mise en cache d'après son propre SQL.
+            envoi.pop("predefinie", None)
+            envoi["sql"] = f"SELECT * FROM ({corps['sql'].strip().rstrip(';')}) AS requete WHERE '{uuid.uuid4().hex}' <> ''"
+        mesure = envoyer(url, envoi)
+        with verrou:
+            mesures.append(mesure)
+
+
+def centile(valeurs, p):
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * p / 100))]
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Test de charge de /execute.")
+    parser.add_argument("--url", default=URL, help=f"adresse du serveur (défaut : {URL})")
+    parser.add_argument("--clients", type=int, default=NB_CLIENTS, help=f"clients simultanés (défaut : {NB_CLIENTS})")
+    parser.add_argument("--duree", type=int, default=DUREE, help=f"durée du test en secondes (défaut : {DUREE})")
+    groupe = parser.add_mutually_exclusive_group()
+    groupe.add_argument("--predefinie", default="4", choices=list(PREDEFINED_QUERIES),
+                        help="requête prédéfinie envoyée (défaut : 4, la jointure à trois tables)")
+    groupe.add_argument("--sql", help="requête SQL libre envoyée à la place")
+    parser.add_argument("--sans-cache", action="store_true", help="rend chaque requête unique pour contourner le cache")
+    parser.add_argument("--sortie", help="fichier JSON où écrire le résultat")
+    return parser.parse_args()
+
+
+def main():
+    args = lire_arguments()
+    if args.sql:
+        corps = {"sql": args.sql}
+    else:
+        corps = {"sql": PREDEFINED_QUERIES[args.predefinie]["sql"], "predefinie": args.predefinie}
+
+    print(f"TEST DE CHARGE : {args.clients} clients pendant {args.duree} s sur {args.url}")
+    print("-" * 50)
+    mesures = []
+    verrou = threading.Lock()
+    fin = time.monotonic() + args.duree
+    threads = [threading.Thread(target=client, args=(args.url, corps, args.sans_cache, fin, mesures, verrou))
+               for _ in range(args.clients)]
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duree = time.perf_counter() - debut
+
+    if not mesures:
+        print("Aucune réponse.")
+        return
+    codes = Counter(str(code) for code, _, _ in mesures)
+    latences = sorted(d * 1000 for code, d, _ in mesures if code == 200) or [0]
+    resultat = {
+        "clients": args.clients,
+        "duree_s": round(duree, 1),
+        "requetes": len(mesures),
+        "requetes_par_s": round(len(mesures) / duree, 1),
+        "codes": dict(codes),
+        "latence_ms": {
+            "moyenne": round(statistics.mean(latences), 1),
+            "p50": round(centile(latences, 50), 1),
+            "p95": round(centile(latences, 95), 1),
+            "p99": round(centile(latences, 99), 1),
+            "max": round(latences[-1], 1),
+        },
+        "octets_recus": sum(taille for _, _, taille in mesures),
+    }
+    print(f"Requêtes : {resultat['requetes']} ({resultat['requetes_par_s']} /s)")
+    print(f"Codes : {', '.join(f'{code} x{nb}' for code, nb in codes.most_common())}")
+    print("Latence (réponses 200, ms) : " + ", ".join(f"{k} {v}" for k, v in resultat["latence_ms"].items()))
+    if codes.get("429"):
+        # Tous les clients du test ont la même adresse : les limites par client du serveur s'appliquent à tous
+        print("Réponses 429 : limites par client du serveur (lancer serveur.py avec --sans-limite-client).")
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(resultat, f, indent=2, ensure_ascii=False)
+        print(f"Résultat écrit dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import csv
+import json
+import os
+import random
+
+# Génère des CSV Data ES synthétiques (installations, équipements, activités) pour le benchmark du chargement.
+# Mêmes noms de fichiers, séparateur et colonnes clés que les vrais CSV, avec des doublons de clé primaire
+# et des clés étrangères orphelines pour exercer les rejets de remplissage.py.
+
+DOSSIER_SORTIE = "./benchmark/csv"
+NB_LIGNES = 100_000  # Total des trois fichiers
+TAUX_DOUBLONS = 0.01  # Part des lignes qui répètent la clé primaire d'une ligne précédente
+TAUX_ORPHELINS = 0.005  # Part des lignes dont la clé étrangère ne pointe sur rien
+GRAINE = 42
+
+# Répartition des lignes entre les fichiers (proche des vrais jeux de données)
+REPARTITION = {
+    "data-es-installation-updated.csv": 0.15,
+    "data-es-equipement-updated.csv": 0.35,
+    "data-es-activite-updated.csv": 0.50,
+}
+
+REGIONS = {
+    "Auvergne-Rhône-Alpes": ("84", [("Lyon", "69001"), ("Grenoble", "38000"), ("Bourg-en-Bresse", "01000")]),
+    "Occitanie": ("76", [("Toulouse", "31000"), ("Nîmes", "30000"), ("Montpellier", "34000")]),
+    "Pays de la Loire": ("52", [("Nantes", "44000"), ("Le Mans", "72000"), ("Angers", "49000")]),
+    "Provence-Alpes-Côte d'Azur": ("93", [("Aix-en-Provence", "13090"), ("Nice", "06000"), ("Marseille", "13001")]),
+    "Île-de-France": ("11", [("Paris", "75001"), ("Versailles", "78000"), ("Créteil", "94000")]),
+    "Bretagne": ("53", [("Rennes", "35000"), ("Brest", "29200"), ("Quimper", "29000")]),
+}
+
+TYPES_EQUIPEMENTS = [
+    ("Terrain de football", "Terrains de grands jeux"),
+    ("Court de tennis", "Courts de tennis"),
+    ("Salle multisports", "Salles multisports (gymnase)"),
+    ("Bassin sportif de natation", "Bassins aquatiques"),
+    ("Boulodrome", "Boulodromes"),
+    ("Mur d'escalade", "Equipements d'activités de forme et de santé"),
+    ("Skatepark", "Equipements de sports de glisse urbaine"),
+]
+
+DISCIPLINES = [
+    ("1101", "Football"), ("1201", "Tennis"), ("1301", "Natation"), ("1401", "Basket-ball"),
+    ("1501", "Handball"), ("1601", "Pétanque"), ("1701", "Escalade"), ("1801", "Volley-ball"),
+    ("1901", "Skateboard"), ("2001", "Badminton"), ("2101", "Judo"), ("2201", "Danse"),
+]
+NIVEAUX = ["Loisir", "Compétition régionale", "Compétition nationale", "Scolaire", ""]
+
+# Certains noms contiennent ';' ou des guillemets : COPY reçoit aussi des champs entre guillemets
+NOMS = ["Stade municipal", "Complexe sportif \"Les Pins\"", "Gymnase Jean Moulin", "Piscine; centre nautique",
+        "Plateau sportif", "Espace loisirs"]
+
+
+def numero_installation(i):
+    return f"I{i:09d}"
+
+
+def numero_equipement(i):
+    return f"E{i:09d}"
+
+
+def numero_orphelin(prefixe, rng):
+    # Jamais produit par les fonctions ci-dessus (lettre après le préfixe)
+    return f"{prefixe}X{rng.randrange(10 ** 8):08d}"
+
+
+def cle_generee(i, numero, rng, taux_doublons):
+    """Clé primaire de la ligne i : parfois celle d'une ligne précédente (doublon)."""
+    if i > 0 and rng.random() < taux_doublons:
+        return numero(rng.randrange(i))
+    return numero(i)
+
+
+def lignes_installations(nb, rng, taux_doublons):
+    yield ["numero", "nom", "commune", "code_postal", "reg_code", "reg_nom", "latitude", "longitude"]
+    regions = list(REGIONS.items())
+    for i in range(nb):
+        reg_nom, (reg_code, communes) = regions[rng.randrange(len(regions))]
+        commune, code_postal = communes[rng.randrange(len(communes))]
+        yield [
+            cle_generee(i, numero_installation, rng, taux_doublons),
+            f"{rng.choice(NOMS)} {i}",
+            commune,
+            code_postal,
+            reg_code,
+            reg_nom,
+            f"{rng.uniform(42.0, 51.0):.6f}",
+            f"{rng.uniform(-4.5, 8.0):.6f}",
+        ]
+
+
+def lignes_equipements(nb, nb_installations, rng, taux_doublons, taux_orphelins):
+    yield ["numero", "nom", "type", "famille", "installation_numero", "date_mise_en_service", "surface",
+           "eclairage"]
+    for i in range(nb):
+        type_equipement, famille = TYPES_EQUIPEMENTS[rng.randrange(len(TYPES_EQUIPEMENTS))]
+        if rng.random() < taux_orphelins:
+            installation = numero_orphelin("I", rng)
+        else:
+            installation = numero_installation(rng.randrange(nb_installations))
+        date = "" if rng.random() < 0.2 else f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2023)}"
+        yield [
+            cle_generee(i, numero_equipement, rng, taux_doublons),
+            f"{type_equipement} {i}",
+            type_equipement,
+            famille,
+            installation,
+            date,
+            f"{rng.uniform(50, 8000):.2f}".replace(".", ","),
+            rng.choice(["oui", "non"]),
+        ]
+
+
+def lignes_activites(nb, nb_equipements, rng, taux_doublons, taux_orphelins):
+    yield ["equip_numero", "aps_code", "aps_discipline", "niveau"]
+    precedente = None
+    for _ in range(nb):
+        # Les activités n'ont pas de clé primaire dans le CSV : un doublon est une ligne répétée
+        if precedente and rng.random() < taux_doublons:
+            yield precedente
+            continue
+        if rng.random() < taux_orphelins:
+            equipement = numero_orphelin("E", rng)
+        else:
+            equipement = numero_equipement(rng.randrange(nb_equipements))
+        aps_code, aps_discipline = DISCIPLINES[rng.randrange(len(DISCIPLINES))]
+        precedente = [equipement, aps_code, aps_discipline, rng.choice(NIVEAUX)]
+        yield precedente
+
+
+def ecrire_csv(chemin, lignes):
+    """Écrit les lignes (en-tête compris) et renvoie le nombre de lignes de données."""
+    nb = -1
+    with open(chemin, mode="w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";", lineterminator="\n")
+        for ligne in lignes:
+            writer.writerow(ligne)
+            nb = nb + 1
+    return nb
+
+
+def generer(dossier, nb_lignes, taux_doublons=TAUX_DOUBLONS, taux_orphelins=TAUX_ORPHELINS, graine=GRAINE):
+    """Génère les trois CSV dans `dossier` et renvoie leur description (aussi écrite dans generation.json)."""
+    os.makedirs(dossier, exist_ok=True)
+    rng = random.Random(graine)
+    nb = {nom: max(1, int(nb_lignes * part)) for nom, part in REPARTITION.items()}
+    nb_installations = nb["data-es-installation-updated.csv"]
+    nb_equipements = nb["data-es-equipement-updated.csv"]
+
+    generateurs = {
+        "data-es-installation-updated.csv": lignes_installations(nb_installations, rng, taux_doublons),
+        "data-es-equipement-updated.csv": lignes_equipements(
+            nb_equipements, nb_installations, rng, taux_doublons, taux_orphelins),
+        "data-es-activite-updated.csv": lignes_activites(
+            nb["data-es-activite-updated.csv"], nb_equipements, rng, taux_doublons, taux_orphelins),
+    }
+
+    description = {
+        "parametres": {"lignes": nb_lignes, "doublons": taux_doublons, "orphelins": taux_orphelins,
+                       "graine": graine},
+        "fichiers": {},
+    }
+    for nom, lignes in generateurs.items():
+        chemin = os.path.join(dossier, nom)
+        print(f"Génération de {chemin}...")
+        nb_ecrites = ecrire_csv(chemin, lignes)
+        description["fichiers"][nom] = {"lignes": nb_ecrites, "octets": os.path.getsize(chemin)}
+
+    with open(os.path.join(dossier, "generation.json"), mode="w", encoding="utf-8") as f:
+        json.dump(description, f, ensure_ascii=False, indent=2)
+    return description
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Génère des CSV Data ES synthétiques pour le benchmark.")
+    parser.add_argument("--lignes", type=int, default=NB_LIGNES,
+                        help=f"nombre total de lignes des trois fichiers (défaut : {NB_LIGNES})")
+    parser.add_argument("--doublons", type=float, default=TAUX_DOUBLONS,
+                        help=f"part des lignes en doublon de clé primaire (défaut : {TAUX_DOUBLONS})")
+    parser.add_argument("--orphelins", type=float, default=TAUX_ORPHELINS,
+                        help=f"part des lignes avec une clé étrangère orpheline (défaut : {TAUX_ORPHELINS})")
+    parser.add_argument("--graine", type=int, default=GRAINE, help="graine du générateur aléatoire")
+    parser.add_argument("--dossier", default=DOSSIER_SORTIE, help=f"dossier de sortie (défaut : {DOSSIER_SORTIE})")
+    return parser.parse_args()
+
+
+def main():
+    args = lire_arguments()
+    description = generer(args.dossier, args.lignes, args.doublons, args.orphelins, args.graine)
+    for nom, fichier in description["fichiers"].items():
+        print(f"  -> {nom} : {fichier['lignes']} lignes, {fichier['octets'] / 1e6:.1f} Mo")
+
+
+if __name__ == "__main__":
+    main()
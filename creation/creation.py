@@ -1,4 +1,8 @@
+import argparse
+import time
+from psycopg2.errors import ObjectInUse
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
 
 # --- Configuration ---
 USER = 'postgres'
@@ -6,21 +10,106 @@ PASSWORD = ''
 HOST = '127.0.0.1'
 PORT = 5434
 DB_TO_CREATE = 'sport' # Nom de la base à créer
+DB_MODELE = 'sport_modele'  # Copie de 'sport' chargée et indexée, prise avec --snapshot
+ESSAIS_TEMPLATE = 5  # CREATE DATABASE ... TEMPLATE échoue tant qu'une session est connectée au modèle
+
+
+def base_existe(conn, nom_base):
+    return conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :nom"), {"nom": nom_base}).scalar() is not None
+
+
+def terminer_connexions(conn, nom_base):
+    """Ferme les sessions encore ouvertes sur la base (sauf la nôtre) et renvoie leur nombre."""
+    return conn.execute(text("""
+        SELECT count(pg_terminate_backend(pid)) FROM pg_stat_activity
+        WHERE datname = :nom AND pid <> pg_backend_pid()
+    """), {"nom": nom_base}).scalar()
+
+
+def copier_parametres(conn, nom_base, modele):
+    """Reporte les paramètres de la base modèle (ALTER DATABASE ... SET) sur la copie, que TEMPLATE ne copie pas."""
+    parametres = conn.execute(text("""
+        SELECT unnest(s.setconfig) FROM pg_db_role_setting s JOIN pg_database d ON d.oid = s.setdatabase
+        WHERE d.datname = :modele AND s.setrole = 0
+    """), {"modele": modele}).scalars().all()
+    for parametre in parametres:
+        nom, valeur = parametre.split("=", 1)
+        valeur = valeur.replace("'", "''")
+        conn.execute(text(f'ALTER DATABASE "{nom_base}" SET {nom} = \'{valeur}\''))
+
+
+def copier_base(conn, nom_base, modele):
+    """CREATE DATABASE ... TEMPLATE : copie fichier par fichier, quelques secondes au lieu d'un rechargement.
+
+    Les sessions connectées au modèle sont fermées avant chaque essai (une session qui se reconnecte
+    entre-temps fait échouer la copie : on réessaie). Les paramètres de la base (enable_partitionwise_*
+    posés par remplissage.py) sont reportés ensuite.
+    """
+    for essai in range(1, ESSAIS_TEMPLATE + 1):
+        nb = terminer_connexions(conn, modele)
+        if nb:
+            print(f"  -> {nb} connexion(s) à '{modele}' fermée(s)")
+        try:
+            conn.execute(text(f'CREATE DATABASE "{nom_base}" TEMPLATE "{modele}"'))
+            break
+        except OperationalError as e:
+            if not isinstance(e.orig, ObjectInUse) or essai == ESSAIS_TEMPLATE:
+                raise
+            time.sleep(0.5)
+    copier_parametres(conn, nom_base, modele)
+
+
+def supprimer_modele(conn):
+    # Une base marquée IS_TEMPLATE ne peut pas être supprimée
+    conn.execute(text(f'ALTER DATABASE "{DB_MODELE}" WITH IS_TEMPLATE false'))
+    conn.execute(text(f'DROP DATABASE "{DB_MODELE}"'))
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description=f"Crée la base '{DB_TO_CREATE}'.")
+    groupe = parser.add_mutually_exclusive_group()
+    groupe.add_argument("--modele", action="store_true",
+                        help=f"crée '{DB_TO_CREATE}' comme copie de la base modèle '{DB_MODELE}' (déjà chargée)")
+    groupe.add_argument("--snapshot", action="store_true",
+                        help=f"copie la base '{DB_TO_CREATE}' chargée dans la base modèle '{DB_MODELE}' (remplacée)")
+    return parser.parse_args()
+
 
 def main():
+    args = lire_arguments()
     # On se connecte à la base 'postgres' par défaut avec AUTOCOMMIT
     # AUTOCOMMIT est obligatoire pour exécuter CREATE DATABASE
     url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/postgres"
     engine = None
 
-    print(f"Création de la base '{DB_TO_CREATE}' sur {HOST}:{PORT}...")
+    if args.snapshot:
+        print(f"Copie de la base '{DB_TO_CREATE}' dans la base modèle '{DB_MODELE}' sur {HOST}:{PORT}...")
+    elif args.modele:
+        print(f"Création de la base '{DB_TO_CREATE}' depuis le modèle '{DB_MODELE}' sur {HOST}:{PORT}...")
+    else:
+        print(f"Création de la base '{DB_TO_CREATE}' sur {HOST}:{PORT}...")
 
     try:
         engine = create_engine(url, isolation_level="AUTOCOMMIT")
         with engine.connect() as conn:
-            conn.execute(text(f'CREATE DATABASE "{DB_TO_CREATE}"'))
-        print("Succès : La base de données a été créée.")
-        
+            if args.snapshot:
+                if base_existe(conn, DB_MODELE):
+                    supprimer_modele(conn)
+                copier_base(conn, DB_MODELE, DB_TO_CREATE)
+                # Modèle en lecture seule de fait : plus personne ne peut s'y connecter
+                conn.execute(text(f'ALTER DATABASE "{DB_MODELE}" WITH IS_TEMPLATE true ALLOW_CONNECTIONS false'))
+                print(f"Succès : La base modèle '{DB_MODELE}' a été créée.")
+            elif args.modele:
+                if not base_existe(conn, DB_MODELE):
+                    print(f"Erreur : la base modèle '{DB_MODELE}' n'existe pas (lancer d'abord --snapshot).")
+                    return
+                debut = time.perf_counter()
+                copier_base(conn, DB_TO_CREATE, DB_MODELE)
+                print(f"Succès : La base de données a été créée en {time.perf_counter() - debut:.1f} s.")
+            else:
+                conn.execute(text(f'CREATE DATABASE "{DB_TO_CREATE}"'))
+                print("Succès : La base de données a été créée.")
+
     except Exception as e:
         print(f"Erreur : {e}")
     finally:
@@ -1,27 +1,67 @@
+import argparse
 import csv
+import hashlib
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 from sqlalchemy.exc import IntegrityError
+from psycopg2 import DataError
 from psycopg2.errors import UniqueViolation, ForeignKeyViolation  # AJOUT
+from sources import est_decoupable, ouvrir_source
+from typage import ELARGISSEMENTS, FONCTIONS_VALIDATION, conversion_sql, echantillonner, inferer_types, test_sql
 
 # --- Configuration de la base de données ---
 USER = 'postgres'
 PASSWORD = ''
 HOST = '127.0.0.1'
 PORT = 5434
-DB_NAME = 'sport' # Nom de la base à remplir
-
-DB_URL = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
+DB_NAME = 'sport' # Nom de la base à remplir (par défaut, voir --base)
 
 TAILLE_LOT = 1000  # Commit tous les 1000 lignes (évite les erreurs de mémoire de pyscopg2 en librérant les verrous)
 
+# Mode de chargement par défaut :
+#  - "copy"  : COPY du CSV dans une table de staging UNLOGGED, puis transfert ensembliste (rapide)
+#  - "ligne" : insertion ligne par ligne avec un SAVEPOINT par ligne (ancien mode, lent)
+MODE_CHARGEMENT = "copy"
+
+# Mode "copy" : nombre de processus (une connexion chacun) pour charger les morceaux de CSV en parallèle
+NB_WORKERS = os.cpu_count() or 1
+TAILLE_MORCEAU_MIN = 16 * 1024 * 1024  # Pas de découpage en morceaux plus petits que 16 Mo
+TAILLE_MORCEAU_MAX = 128 * 1024 * 1024  # Ni plus gros que 128 Mo : c'est le travail perdu au pire avec --resume
+
+# Index post-chargement construits avec CREATE INDEX CONCURRENTLY (la base reste lisible pendant la construction)
+INDEX_CONCURRENTS = True
+
+# Partitionnement par liste sans "valeurs" : une partition pour chacune des valeurs les plus fréquentes du CSV,
+# les autres vont dans la partition DEFAULT
+PARTITIONS_LISTE_MAX = 32
+
 # --- Configuration des Tables ---
+# "chemin_csv" accepte aussi un CSV compressé (.csv.gz, .csv.zst) ou un fichier Parquet (.parquet),
+# lus en flux (voir sources.py) ; ces fichiers ne sont pas découpés entre les processus.
+# "types" force le type SQL d'une colonne au lieu de l'inférer (mode copy), ex. {"code_postal": "TEXT"}
+# "index" liste les colonnes (ou tuples de colonnes) indexées après le chargement : GROUP BY / ORDER BY /
+# jointures des requêtes prédéfinies. Les colonnes FK sont indexées automatiquement.
+# "partition" (optionnel) crée une table partitionnée :
+#   {"methode": "hash", "colonne": "equip_numero", "partitions": 8}
+#   {"methode": "list", "colonne": "reg_nom", "valeurs": ["Bretagne", ["Occitanie", "Corse"], ...]}
+#   (sans "valeurs" : les valeurs les plus fréquentes du CSV) + une partition DEFAULT
+# "dimensions" : colonnes texte répétitives déplacées dans des tables dim_<colonne> avec --dimensions
 TABLES = [
     {
         "nom_table": "data_es_installation_updated",
         "chemin_csv": "./csv/data-es-installation-updated.csv",
         "cle_primaire": ["numero"],
         "cle_etrangere": [],
-        "colonnes_extra": []
+        "colonnes_extra": [],
+        "types": {},
+        "index": ["reg_nom", "commune"],
+        "dimensions": ["commune", "dep_nom", "reg_nom"]
     },
     {
         "nom_table": "data_es_equipement_updated",
@@ -30,7 +70,10 @@ TABLES = [
         "cle_etrangere": [
             ("installation_numero", "data_es_installation_updated", "numero")
         ],
-        "colonnes_extra": []
+        "colonnes_extra": [],
+        "types": {},
+        "index": ["type"],
+        "dimensions": ["type"]
     },
     {
         "nom_table": "data_es_activite_updated",
@@ -39,127 +82,1570 @@ TABLES = [
         "cle_etrangere": [
             ("equip_numero", "data_es_equipement_updated", "numero")
         ],
-        "colonnes_extra": ["activite_pk BIGSERIAL"]
+        "colonnes_extra": ["activite_pk BIGSERIAL"],
+        "types": {},
+        "index": [("equip_numero", "aps_discipline")],  # couvre la FK et la jointure de la requête 4
+        # Pas de colonne région dans ce CSV : hachage sur la clé de jointure avec les équipements
+        "partition": {"methode": "hash", "colonne": "equip_numero", "partitions": 8},
+        "dimensions": ["aps_discipline"]
     },
 ]
 
-def main():
-    engine = None
-    print("DEMARRAGE DU PROGRAMME D'IMPORTATION")
-    print("-" * 50)
 
+# --- Vues matérialisées des requêtes prédéfinies (rafraîchies à la fin du chargement) ---
+# Les trois interfaces de utilisation/ les lisent directement quand elles existent.
+# "unique" : colonnes de l'index unique (obligatoire pour REFRESH ... CONCURRENTLY) ; "index" : clés de l'index de tri
+VUES_MATERIALISEES = [
+    {
+        "nom_vue": "mv_types_equipements",
+        "sql": """
+        SELECT "type", COUNT(*) AS total_equipements
+        FROM "data_es_equipement_updated"
+        GROUP BY "type"
+        """,
+        "unique": ["type"],
+        "index": ['"total_equipements" DESC']
+    },
+    {
+        "nom_vue": "mv_equipements_region",
+        "sql": """
+        SELECT i."reg_nom", COUNT(*) AS nb_equipements
+        FROM "data_es_equipement_updated" e
+        JOIN "data_es_installation_updated" i ON i."numero" = e."installation_numero"
+        GROUP BY i."reg_nom"
+        """,
+        "unique": ["reg_nom"],
+        "index": ['"nb_equipements" DESC']
+    },
+    {
+        "nom_vue": "mv_disciplines_commune",
+        "sql": """
+        SELECT i."commune", COUNT(DISTINCT a."aps_discipline") AS nb_disciplines
+        FROM "data_es_installation_updated" i
+        JOIN "data_es_equipement_updated" e ON i."numero" = e."installation_numero"
+        JOIN "data_es_activite_updated" a ON e."numero" = a."equip_numero"
+        GROUP BY i."commune"
+        HAVING COUNT(DISTINCT a."aps_discipline") > 0
+        """,
+        "unique": ["commune"],
+        "index": ['"nb_disciplines" DESC', '"commune"']
+    },
+]
+
+def lire_entete(f):
+    """Lit la ligne d'en-tête d'un CSV ouvert en binaire et renvoie la liste des colonnes."""
+    premiere_ligne = f.readline().decode("utf-8-sig").rstrip("\r\n")
+    if not premiere_ligne:
+        return []
+    return next(csv.reader([premiere_ligne], delimiter=";"))
+
+
+def creer_table(conn, config, colonnes, avec_contraintes=True):
+    """(Re)crée la table cible ({colonne: type SQL}), avec ou sans ses clés primaire et étrangères."""
+    table_nom = config["nom_table"]
+    definitions_colonnes = []
+
+    for col_extra in config["colonnes_extra"]:
+        definitions_colonnes.append(col_extra)
+
+    for col, type_sql in colonnes.items():
+        definitions_colonnes.append(f'"{col}" {type_sql}')
+
+    if avec_contraintes:
+        definitions_colonnes.extend(definitions_contraintes(config))
+
+    corps_table = ", ".join(definitions_colonnes)
+    requete_creation = f'CREATE TABLE "{table_nom}" ({corps_table})'
+    partition = config.get("partition")
+    if partition:
+        requete_creation += f' PARTITION BY {partition["methode"].upper()} ("{partition["colonne"]}")'
+
+    # Les partitions se calculent avant le DROP : elles peuvent dépendre du staging
+    requetes_partitions = definitions_partitions(conn, config, colonnes)
+
+    print("  -> Réinitialisation de la structure SQL...")
+    conn.execute(text(f'DROP TABLE IF EXISTS "{table_nom}" CASCADE'))
+    conn.execute(text(requete_creation))
+    for requete in requetes_partitions:
+        conn.execute(text(requete))
+    if requetes_partitions:
+        print(f"  -> {len(requetes_partitions)} partition(s) créée(s)")
+    conn.commit()
+
+
+def litteral_sql(valeur):
+    return "'" + str(valeur).replace("'", "''") + "'"
+
+
+def definitions_partitions(conn, config, colonnes):
+    """Requêtes CREATE TABLE ... PARTITION OF de la table ([] si elle n'est pas partitionnée)."""
+    partition = config.get("partition")
+    if not partition:
+        return []
+    table_nom = config["nom_table"]
+
+    if partition["methode"] == "hash":
+        nb = partition["partitions"]
+        return [
+            f'CREATE TABLE "{table_nom}_p{i}" PARTITION OF "{table_nom}" FOR VALUES WITH (MODULUS {nb}, REMAINDER {i})'
+            for i in range(nb)
+        ]
+
+    valeurs = partition.get("valeurs")
+    if valeurs is None:
+        valeurs = valeurs_frequentes(conn, table_nom, partition["colonne"], colonnes)
+    requetes = []
+    for i, groupe in enumerate(valeurs):
+        groupe = [groupe] if isinstance(groupe, str) else groupe
+        liste = ", ".join(litteral_sql(valeur) for valeur in groupe)
+        requetes.append(f'CREATE TABLE "{table_nom}_p{i}" PARTITION OF "{table_nom}" FOR VALUES IN ({liste})')
+    # NULL et les valeurs non prévues
+    requetes.append(f'CREATE TABLE "{table_nom}_defaut" PARTITION OF "{table_nom}" DEFAULT')
+    return requetes
+
+
+def valeurs_frequentes(conn, table_nom, col, colonnes):
+    """Valeurs les plus fréquentes de la colonne dans le staging ([] sans staging, mode ligne)."""
+    staging = nom_staging(table_nom)
+    if not conn.execute(text("SELECT to_regclass(quote_ident(:staging))"), {"staging": staging}).scalar():
+        return []
+    valeur = valeur_typee(col, colonnes)
+    return conn.execute(text(f"""
+        SELECT ({valeur})::text FROM "{staging}" s
+        WHERE {valeur_propre(col)} IS NOT NULL
+        GROUP BY 1 ORDER BY count(*) DESC, 1
+        LIMIT {PARTITIONS_LISTE_MAX}
+    """)).scalars().all()
+
+
+def est_partitionnee(conn, table_nom):
+    return bool(conn.execute(text("""
+        SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(quote_ident(:table_nom))
+    """), {"table_nom": table_nom}).scalar())
+
+
+def definitions_contraintes(config, type_contrainte=None):
+    """Clauses PRIMARY KEY / FOREIGN KEY de la table ("pk", "fk" ou les deux si None)."""
+    definitions = []
+
+    if config["cle_primaire"] and type_contrainte in (None, "pk"):
+        liste_pk = []
+        for pk_col in config["cle_primaire"]:
+            liste_pk.append(f'"{pk_col}"')
+        partition = config.get("partition")
+        if partition and partition["colonne"] not in config["cle_primaire"]:
+            # La clé d'une table partitionnée doit contenir la colonne de partition, qui peut être NULL :
+            # contrainte UNIQUE (la clé primaire d'origine reste unique) plutôt que PRIMARY KEY
+            liste_pk.append(f'"{partition["colonne"]}"')
+            definitions.append(f"UNIQUE ({', '.join(liste_pk)})")
+        else:
+            pk_str = ", ".join(liste_pk)
+            definitions.append(f"PRIMARY KEY ({pk_str})")
+
+    if type_contrainte in (None, "fk"):
+        for col_fk, table_ref, col_ref in config["cle_etrangere"]:
+            constraint = f'FOREIGN KEY ("{col_fk}") REFERENCES "{table_ref}"("{col_ref}")'
+            definitions.append(constraint)
+
+    return definitions
+
+
+def ajouter_contraintes(conn, config, type_contrainte):
+    """Ajoute après coup les contraintes d'une table chargée sans contraintes."""
+    for definition in definitions_contraintes(config, type_contrainte):
+        conn.execute(text(f'ALTER TABLE "{config["nom_table"]}" ADD {definition}'))
+    conn.commit()
+
+
+# --- Reprise après interruption (points de contrôle) ---
+# _reprise_chargement : étape, position (octet + numéro de ligne) et compteurs de chaque table ;
+# _reprise_morceaux   : morceaux de CSV déjà copiés dans le staging (mode copy).
+# Chaque point de contrôle est écrit dans la même transaction que les données qu'il décrit.
+
+def initialiser_reprise(conn, reprendre):
+    """Crée les tables de reprise et renvoie l'état de l'exécution précédente ({} sans --resume)."""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS _reprise_chargement (
+            nom_table TEXT PRIMARY KEY,
+            mode TEXT,
+            empreinte TEXT,
+            etape TEXT,
+            octet BIGINT,
+            ligne BIGINT,
+            bilan TEXT,
+            maj TIMESTAMPTZ DEFAULT now()
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS _reprise_morceaux (
+            nom_table TEXT,
+            debut BIGINT,
+            fin BIGINT,
+            lignes BIGINT,
+            PRIMARY KEY (nom_table, debut)
+        )
+    """))
+    # Lignes mal formées écartées du morceau (voir FiltreLignes), ajoutées aux autres erreurs de la table
+    conn.execute(text("ALTER TABLE _reprise_morceaux ADD COLUMN IF NOT EXISTS rejetees BIGINT DEFAULT 0"))
+    conn.commit()
+
+    if not reprendre:
+        effacer_reprise(conn)
+        return {}
+
+    etats = {}
+    for ligne in conn.execute(text("SELECT * FROM _reprise_chargement")).mappings():
+        etat = dict(ligne)
+        etat["bilan"] = json.loads(etat["bilan"]) if etat["bilan"] else None
+        etats[etat["nom_table"]] = etat
+    return etats
+
+
+def enregistrer_reprise(conn, table_nom, mode, empreinte, etape, octet=None, ligne=None, bilan=None):
+    """Met à jour le point de contrôle d'une table (sans commit : il part avec la transaction en cours)."""
+    conn.execute(text("""
+        INSERT INTO _reprise_chargement (nom_table, mode, empreinte, etape, octet, ligne, bilan, maj)
+        VALUES (:nom_table, :mode, :empreinte, :etape, :octet, :ligne, :bilan, now())
+        ON CONFLICT (nom_table) DO UPDATE
+        SET mode = EXCLUDED.mode, empreinte = EXCLUDED.empreinte, etape = EXCLUDED.etape,
+            octet = EXCLUDED.octet, ligne = EXCLUDED.ligne, bilan = EXCLUDED.bilan, maj = now()
+    """), {
+        "nom_table": table_nom, "mode": mode, "empreinte": empreinte, "etape": etape,
+        "octet": octet, "ligne": ligne, "bilan": json.dumps(bilan) if bilan else None,
+    })
+
+
+def effacer_reprise(conn):
+    """Oublie les points de contrôle (chargement terminé ou nouveau départ)."""
+    conn.execute(text("DELETE FROM _reprise_chargement"))
+    conn.execute(text("DELETE FROM _reprise_morceaux"))
+    conn.commit()
+
+
+def reprise_valide(etat, mode, empreinte, parents, recharges):
+    """Un point de contrôle n'est réutilisable que pour le même mode, le même fichier et des parents intacts."""
+    if not etat or etat["mode"] != mode or etat["empreinte"] != empreinte:
+        return False
+    return not any(parent in recharges for parent in parents)
+
+
+class LignesAvecPosition:
+    """Itère sur les lignes décodées d'un fichier binaire en retenant la position après la dernière ligne lue."""
+
+    def __init__(self, f):
+        self.f = f
+        self.position = f.tell()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        ligne = self.f.readline()
+        if not ligne:
+            raise StopIteration
+        self.position = self.position + len(ligne)
+        return ligne.decode("utf-8")
+
+
+# --- Mode "ligne" : insertion ligne par ligne ---
+
+def inserer_ligne_par_ligne(conn, table_nom, headers, f, empreinte, depart=None):
+    """Insère les lignes une à une (un SAVEPOINT par ligne) et renvoie le bilan.
+
+    Un point de contrôle (octet, ligne, compteurs) est enregistré à chaque commit ; `depart` est
+    celui d'une exécution interrompue, `f` étant déjà positionné sur son octet.
+    """
+    liste_cols_propre = []
+    liste_params_propre = []
+
+    for h in headers:
+        liste_cols_propre.append(f'"{h}"')
+        liste_params_propre.append(f':{h}')
+
+    cols_str = ", ".join(liste_cols_propre)
+    params_str = ", ".join(liste_params_propre)
+
+    sql_insert = text(f'INSERT INTO "{table_nom}" ({cols_str}) VALUES ({params_str})')
+
+    # csv ne lit jamais au-delà de la ligne rendue : la position est celle de la fin de la dernière ligne
+    lignes_texte = LignesAvecPosition(f)
+    reader = csv.DictReader(lignes_texte, fieldnames=headers, delimiter=";")
+
+    succes = 0
+    doublons = 0
+    erreurs_fk = 0
+    autres_erreurs = 0
+    compteur_lot = 0
+    if depart:
+        succes = depart["bilan"]["succes"]
+        doublons = depart["bilan"]["doublons"]
+        erreurs_fk = depart["bilan"]["erreurs_fk"]
+        autres_erreurs = depart["bilan"]["autres_erreurs"]
+        compteur_lot = depart["ligne"]
+
+    for ligne in reader:
+
+        ligne_propre = {}
+        for cle, valeur in ligne.items():
+            if valeur == "" or valeur is None:
+                ligne_propre[cle] = None
+            else:
+                ligne_propre[cle] = valeur.strip()
+
+        try:
+            with conn.begin_nested():
+                conn.execute(sql_insert, ligne_propre)
+            succes = succes + 1
+
+        except IntegrityError as e:
+            if isinstance(e.orig, UniqueViolation):
+                doublons = doublons + 1
+
+            elif isinstance(e.orig, ForeignKeyViolation):
+                erreurs_fk = erreurs_fk + 1
+
+            else:
+                autres_erreurs = autres_erreurs + 1
+                print(f"  -> Erreur SQL sur la ligne : {ligne_propre}")
+                print(f"     Message : {e}")
+
+        except Exception as e:
+            print(f"  -> Erreur Python : {e}")
+
+        compteur_lot = compteur_lot + 1
+        if compteur_lot % TAILLE_LOT == 0:
+            bilan = {"succes": succes, "doublons": doublons, "erreurs_fk": erreurs_fk, "autres_erreurs": autres_erreurs}
+            enregistrer_reprise(conn, table_nom, "ligne", empreinte, "insertion", lignes_texte.position, compteur_lot, bilan)
+            conn.commit()
+
+    bilan = {"succes": succes, "doublons": doublons, "erreurs_fk": erreurs_fk, "autres_erreurs": autres_erreurs}
+    enregistrer_reprise(conn, table_nom, "ligne", empreinte, "termine", lignes_texte.position, compteur_lot, bilan)
+    conn.commit()
+
+    return bilan
+
+
+# --- Mode "copy" : COPY dans une table de staging puis transfert ensembliste ---
+
+def nom_staging(table_nom):
+    return f"_staging_{table_nom}"
+
+
+def valeur_propre(col, alias="s"):
+    """Expression SQL équivalente au nettoyage Python : chaîne vide -> NULL, espaces retirés."""
+    return f"NULLIF(btrim({alias}.\"{col}\"), '')"
+
+
+def valeur_typee(col, colonnes, alias="s"):
+    """Valeur nettoyée puis convertie vers le type de la colonne cible."""
+    return conversion_sql(valeur_propre(col, alias), colonnes[col])
+
+
+def verifier_types(conn, table_nom, colonnes):
+    """Vérifie les types sur toutes les lignes du staging ; renvoie {colonne: nb de valeurs invalides}."""
+    staging = nom_staging(table_nom)
+    tests = {}
+    for col, type_sql in colonnes.items():
+        test = test_sql(valeur_propre(col), type_sql)
+        if test is not None:
+            tests[col] = test
+    if not tests:
+        return {}
+
+    conn.execute(text(FONCTIONS_VALIDATION))
+    comptes = ", ".join(
+        f"count(*) FILTER (WHERE {valeur_propre(col)} IS NOT NULL AND NOT ({test}))"
+        for col, test in tests.items()
+    )
+    invalides = conn.execute(text(f'SELECT {comptes} FROM "{staging}" s')).one()
+    conn.commit()
+    return {col: nb for col, nb in zip(tests, invalides) if nb}
+
+
+def corriger_types(conn, table_nom, colonnes, fixes=()):
+    """Vérifie les types sur tout le staging ; renvoie {colonne: nouveau type} pour les colonnes invalides.
+
+    Une colonne invalide prend le premier type plus large (ELARGISSEMENTS) qui accepte toutes ses valeurs,
+    sinon TEXT. Les colonnes de `fixes` (clés étrangères, au type de la colonne référencée) gardent leur
+    type : leurs valeurs invalides sont comptées comme parents manquants (voir regles_staging).
+    """
+    a_elargir = {}
+    for col, nb in verifier_types(conn, table_nom, colonnes).items():
+        if col in fixes:
+            print(f"  -> Colonne {col} : {nb} valeur(s) invalide(s) pour {colonnes[col]} (type de la clé référencée), "
+                  f"comptées comme parents manquants")
+        else:
+            a_elargir[col] = nb
+
+    # Tous les types plus larges de toutes les colonnes invalides, vérifiés en une seule lecture
+    candidats = [(col, type_sql) for col in a_elargir for type_sql in ELARGISSEMENTS.get(colonnes[col], [])]
+    echecs = []
+    if candidats:
+        comptes = ", ".join(
+            f"count(*) FILTER (WHERE {valeur_propre(col)} IS NOT NULL AND NOT ({test_sql(valeur_propre(col), type_sql)}))"
+            for col, type_sql in candidats
+        )
+        echecs = conn.execute(text(f'SELECT {comptes} FROM "{nom_staging(table_nom)}" s')).one()
+        conn.commit()
+
+    corrections = {}
+    for col, nb in a_elargir.items():
+        nouveau = next((type_sql for (c, type_sql), echec in zip(candidats, echecs) if c == col and not echec), "TEXT")
+        print(f"  -> Colonne {col} : {nb} valeur(s) invalide(s) pour {colonnes[col]}, passage en {nouveau}")
+        corrections[col] = nouveau
+    return corrections
+
+
+def creer_staging(conn, table_nom, headers):
+    """Crée la table de staging UNLOGGED (tout en TEXT) qui recevra les COPY."""
+    staging = nom_staging(table_nom)
+    # _morceau (début du morceau dans le fichier) + _ligne (BIGSERIAL) conservent l'ordre du fichier,
+    # même quand plusieurs morceaux sont copiés en parallèle : la première occurrence d'une clé l'emporte
+    definitions = [
+        "_morceau BIGINT DEFAULT current_setting('chargement.morceau')::bigint",
+        "_ligne BIGSERIAL",
+    ]
+    definitions += [f'"{col}" TEXT' for col in headers]
+
+    conn.execute(text(f'DROP TABLE IF EXISTS "{staging}"'))
+    conn.execute(text(f'CREATE UNLOGGED TABLE "{staging}" ({", ".join(definitions)})'))
+    conn.commit()
+
+
+class LecteurPlage:
+    """Fichier binaire limité à la plage d'octets [debut, fin[ (un morceau de CSV pour COPY).
+
+    Avec fin = None, le flux est lu jusqu'au bout (fichier compressé ou Parquet, non découpable).
+    """
+
+    def __init__(self, f, debut, fin):
+        f.seek(debut)
+        self.f = f
+        self.restant = None if fin is None else fin - debut
+
+    def tell(self):
+        return self.f.tell()
+
+    def read(self, taille=-1):
+        if self.restant is None:
+            return self.f.read(taille)
+        if self.restant <= 0:
+            return b""
+        if taille is None or taille < 0 or taille > self.restant:
+            taille = self.restant
+        donnees = self.f.read(taille)
+        self.restant = self.restant - len(donnees)
+        return donnees
+
+
+def decouper_csv(f, debut, fin, nb_morceaux):
+    """Découpe la plage [debut, fin[ du fichier en plages d'octets alignées sur les fins de ligne.
+
+    Attention : un champ entre guillemets contenant un retour à la ligne peut être coupé en deux ;
+    pour un tel fichier, lancer le chargement avec --workers 1 (un seul morceau).
+    """
+    taille_cible = max(TAILLE_MORCEAU_MIN, (fin - debut) // nb_morceaux + 1)
+    if nb_morceaux > 1:
+        taille_cible = min(taille_cible, TAILLE_MORCEAU_MAX)
+
+    bornes = [debut]
+    position = debut
+    while True:
+        position = position + taille_cible
+        if position >= fin:
+            break
+        f.seek(position)
+        f.readline()  # on termine la ligne en cours
+        position = f.tell()
+        if position >= fin:
+            break
+        bornes.append(position)
+    bornes.append(fin)
+
+    return list(zip(bornes[:-1], bornes[1:]))
+
+
+def morceaux_a_copier(conn, table_nom, headers, f, debut_donnees, nb_morceaux, reprendre, decoupable=True):
+    """Plages du fichier restant à copier dans le staging.
+
+    Avec --resume, les morceaux déjà copiés sont sautés si le staging contient bien leurs lignes
+    (une table UNLOGGED est vidée après un arrêt brutal du serveur) ; sinon tout est recopié.
+    Un fichier non découpable (compressé, Parquet) forme un seul morceau (debut_donnees, None).
+    """
+    staging = nom_staging(table_nom)
+
+    faits = []
+    if reprendre:
+        faits = conn.execute(text("""
+            SELECT debut, fin, lignes FROM _reprise_morceaux WHERE nom_table = :table_nom ORDER BY debut
+        """), {"table_nom": table_nom}).all()
+        attendu = sum(lignes for _, _, lignes in faits)
+        present = None
+        if conn.execute(text("SELECT to_regclass(quote_ident(:staging))"), {"staging": staging}).scalar():
+            present = conn.execute(text(f'SELECT count(*) FROM "{staging}"')).scalar()
+        if faits and present == attendu:
+            print(f"  -> Reprise : {len(faits)} morceau(x) déjà copié(s), {attendu} ligne(s), "
+                  f"octet {max(fin for _, fin, _ in faits)}")
+        else:
+            faits = []
+
+    if not faits:
+        conn.execute(text("DELETE FROM _reprise_morceaux WHERE nom_table = :table_nom"), {"table_nom": table_nom})
+        conn.commit()
+        creer_staging(conn, table_nom, headers)
+
+    if not decoupable:
+        return [] if faits else [(debut_donnees, None)]
+
+    f.seek(0, os.SEEK_END)
+    taille_fichier = f.tell()
+
+    # On découpe les trous laissés entre les morceaux déjà copiés
+    restants = []
+    position = debut_donnees
+    for debut, fin, _ in list(faits) + [(taille_fichier, taille_fichier, 0)]:
+        if debut > position:
+            restants.extend(decouper_csv(f, position, debut, nb_morceaux))
+        position = max(position, fin)
+    return restants
+
+
+class FiltreLignes:
+    """Flux CSV (pour COPY) des seules lignes bien formées d'un morceau : autant de champs que l'en-tête.
+
+    Utilisé quand COPY a refusé le morceau brut : une seule ligne avec un champ en trop ou en moins (ou des
+    octets qui ne sont pas de l'UTF-8) fait échouer tout le COPY. Les lignes écartées sont comptées dans
+    `rejetees` ; les lignes vides sont ignorées, comme en mode ligne.
+    """
+
+    TAILLE_BLOC = 1024 * 1024
+
+    def __init__(self, f, nb_colonnes):
+        self.f = f
+        self.nb_colonnes = nb_colonnes
+        self.rejetees = 0
+        self.lignes = csv.reader(self.lignes_texte(), delimiter=";")
+        self.tampon = io.StringIO()
+        self.ecrivain = csv.writer(self.tampon, delimiter=";", lineterminator="\n")
+        self.sortie = b""
+
+    def lignes_texte(self):
+        reste = b""
+        while True:
+            bloc = self.f.read(self.TAILLE_BLOC)
+            if not bloc:
+                break
+            lignes = (reste + bloc).split(b"\n")
+            reste = lignes.pop()
+            for ligne in lignes:
+                texte = self.decoder(ligne + b"\n")
+                if texte is not None:
+                    yield texte
+        if reste:
+            texte = self.decoder(reste)
+            if texte is not None:
+                yield texte
+
+    def decoder(self, ligne):
+        try:
+            return ligne.decode("utf-8")
+        except UnicodeDecodeError:
+            self.rejetees = self.rejetees + 1
+            return None
+
+    def tell(self):
+        return self.f.tell()
+
+    def read(self, taille=-1):
+        while taille is None or taille < 0 or len(self.sortie) < taille:
+            ligne = next(self.lignes, None)
+            if ligne is None:
+                break
+            if not ligne:
+                continue
+            if len(ligne) != self.nb_colonnes:
+                self.rejetees = self.rejetees + 1
+                continue
+            self.ecrivain.writerow(ligne)
+            if self.tampon.tell() >= self.TAILLE_BLOC:
+                self.sortie = self.sortie + self.tampon.getvalue().encode("utf-8")
+                self.tampon.seek(0)
+                self.tampon.truncate()
+        self.sortie = self.sortie + self.tampon.getvalue().encode("utf-8")
+        self.tampon.seek(0)
+        self.tampon.truncate()
+        if taille is None or taille < 0:
+            taille = len(self.sortie)
+        donnees, self.sortie = self.sortie[:taille], self.sortie[taille:]
+        return donnees
+
+
+def copier_morceau(conn, table_nom, headers, f, debut):
+    """Envoie un morceau de CSV (sans en-tête) dans la table de staging via COPY et renvoie le nombre de lignes.
+
+    Le morceau est noté dans _reprise_morceaux dans la même transaction que ses lignes ; sa fin est
+    la position atteinte dans le flux (octets décompressés pour un fichier compressé). Avec un FiltreLignes,
+    le nombre de lignes écartées est noté avec lui.
+    """
+    staging = nom_staging(table_nom)
+    cols_str = ", ".join(f'"{col}"' for col in headers)
+    sql_copy = f'COPY "{staging}" ({cols_str}) FROM STDIN WITH (FORMAT csv, DELIMITER \';\', ENCODING \'UTF8\')'
+
+    conn.execute(text("SELECT set_config('chargement.morceau', :debut, false)"), {"debut": str(debut)})
+    curseur = conn.connection.cursor()
     try:
-        engine = create_engine(DB_URL)
+        curseur.copy_expert(sql_copy, f)
+        nb_lignes = curseur.rowcount
+    finally:
+        curseur.close()
+    conn.execute(text("""
+        INSERT INTO _reprise_morceaux (nom_table, debut, fin, lignes, rejetees)
+        VALUES (:nom_table, :debut, :fin, :lignes, :rejetees)
+    """), {"nom_table": table_nom, "debut": debut, "fin": f.tell(), "lignes": nb_lignes,
+           "rejetees": getattr(f, "rejetees", 0)})
+    conn.commit()
+    return nb_lignes
+
+
+def regles_staging(config, colonnes):
+    """Conditions SQL communes au transfert et au delta : clés étrangères valides et clé primaire du CSV."""
+    # Une ligne est rejetée pour FK si la valeur est renseignée mais absente de la table parente, ou si elle
+    # ne passe pas le type de la colonne référencée (aucun parent possible). CASE : pas de conversion tentée
+    # sur une valeur invalide
+    conditions_fk = []
+    for col_fk, table_ref, col_ref in config["cle_etrangere"]:
+        propre = valeur_propre(col_fk)
+        test = test_sql(propre, colonnes[col_fk])
+        invalide = f"WHEN NOT ({test}) THEN FALSE " if test else ""
+        conditions_fk.append(
+            f'(CASE WHEN {propre} IS NULL THEN TRUE {invalide}'
+            f'ELSE EXISTS (SELECT 1 FROM "{table_ref}" p WHERE p."{col_ref}" = {valeur_typee(col_fk, colonnes)}) END)'
+        )
+    fk_ok = " AND ".join(conditions_fk) if conditions_fk else "TRUE"
+
+    # La clé primaire n'est dédoublonnée que si elle vient du CSV (pas pour un BIGSERIAL)
+    pk_csv = [col for col in config["cle_primaire"] if col in colonnes]
+    if len(pk_csv) != len(config["cle_primaire"]):
+        pk_csv = []
+    pk_non_nulle = " AND ".join(f"{valeur_propre(col)} IS NOT NULL" for col in pk_csv) if pk_csv else "TRUE"
+
+    return fk_ok, pk_csv, pk_non_nulle
+
+
+def compter_staging(conn, table_nom, fk_ok, pk_non_nulle):
+    """Renvoie (lignes totales, parents manquants, autres erreurs) pour la table de staging de `table_nom`.
+
+    Les autres erreurs sont les lignes à clé primaire vide, plus les lignes mal formées écartées au COPY
+    (comptées aussi dans le total).
+    """
+    staging = nom_staging(table_nom)
+    conn.execute(text(f'ANALYZE "{staging}"'))
+    total, erreurs_fk, pk_vide = conn.execute(text(f"""
+        SELECT count(*),
+               count(*) FILTER (WHERE NOT ({fk_ok})),
+               count(*) FILTER (WHERE ({fk_ok}) AND NOT ({pk_non_nulle}))
+        FROM "{staging}" s
+    """)).one()
+    rejetees = conn.execute(text("""
+        SELECT coalesce(sum(rejetees), 0) FROM _reprise_morceaux WHERE nom_table = :nom_table
+    """), {"nom_table": table_nom}).scalar()
+    return total + rejetees, erreurs_fk, pk_vide + rejetees
+
+
+def selection_staging(staging, colonnes, pk_csv, fk_ok, pk_non_nulle):
+    """SELECT des lignes valides du staging, nettoyées, typées et dédoublonnées sur la clé primaire."""
+    valeurs_str = ", ".join(f'{valeur_typee(col, colonnes)} AS "{col}"' for col in colonnes)
+    distinct = ""
+    ordre = ""
+    if pk_csv:
+        pk_valeurs = ", ".join(valeur_typee(col, colonnes) for col in pk_csv)
+        distinct = f"DISTINCT ON ({pk_valeurs})"
+        ordre = f"ORDER BY {pk_valeurs}, s._morceau, s._ligne"
+
+    return f"""
+        SELECT {distinct} {valeurs_str}
+        FROM "{staging}" s
+        WHERE ({fk_ok}) AND ({pk_non_nulle})
+        {ordre}
+    """
+
+
+def transferer_staging(conn, config, colonnes):
+    """Déplace les lignes du staging vers la table cible et renvoie le même bilan que le mode ligne."""
+    table_nom = config["nom_table"]
+    staging = nom_staging(table_nom)
+
+    fk_ok, pk_csv, pk_non_nulle = regles_staging(config, colonnes)
+    total, erreurs_fk, autres_erreurs = compter_staging(conn, table_nom, fk_ok, pk_non_nulle)
+
+    cols_str = ", ".join(f'"{col}"' for col in colonnes)
+    selection = selection_staging(staging, colonnes, pk_csv, fk_ok, pk_non_nulle)
+    resultat = conn.execute(text(f"""
+        INSERT INTO "{table_nom}" ({cols_str})
+        {selection}
+        ON CONFLICT DO NOTHING
+    """))
+    succes = resultat.rowcount
+    conn.commit()
+
+    doublons = total - erreurs_fk - autres_erreurs - succes
+    return {"succes": succes, "doublons": doublons, "erreurs_fk": erreurs_fk, "autres_erreurs": autres_erreurs}
+
+
+def afficher_bilan(bilan):
+    if "ajouts" in bilan:
+        afficher_bilan_delta(bilan)
+        return
+    print("  -> FINI. Bilan :")
+    print(f"     ✅ Insérés avec succès  : {bilan['succes']}")
+    print(f"     ⚠️ Doublons ignorés     : {bilan['doublons']}")
+    print(f"     ⛔️ Parents manquants (FK): {bilan['erreurs_fk']}")
+    if bilan["autres_erreurs"]:
+        print(f"     ❌ Autres erreurs       : {bilan['autres_erreurs']}")
+
+
+# --- Mode incrémental : manifeste des fichiers et delta par clé primaire ---
+
+def nom_delta(table_nom):
+    return f"_delta_{table_nom}"
 
-        with engine.connect() as conn:
 
-            for config in TABLES:
+def signature_fichier(chemin):
+    """Taille et date de modification du fichier, sans le lire : identifie le fichier d'un point de reprise.
+
+    Un fichier qui les garde est considéré comme inchangé (voir comparer_au_manifeste).
+    """
+    infos = os.stat(chemin)
+    return f"{infos.st_size}:{infos.st_mtime_ns}"
+
+
+def empreinte_fichier(chemin):
+    """Empreinte SHA-256 du fichier, lue par blocs de 1 Mo (une lecture complète : seulement si nécessaire)."""
+    empreinte = hashlib.sha256()
+    with open(chemin, mode="rb") as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def lire_manifeste(conn):
+    """Renvoie {nom_table: (signature, empreinte SHA-256 ou None)} des fichiers des exécutions précédentes."""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS _manifeste_chargement (
+            nom_table TEXT PRIMARY KEY,
+            chemin_csv TEXT,
+            empreinte TEXT,
+            charge_le TIMESTAMPTZ DEFAULT now()
+        )
+    """))
+    conn.execute(text("ALTER TABLE _manifeste_chargement ADD COLUMN IF NOT EXISTS signature TEXT"))
+    conn.commit()
+    lignes = conn.execute(text("SELECT nom_table, signature, empreinte FROM _manifeste_chargement")).all()
+    return {nom_table: (signature, empreinte) for nom_table, signature, empreinte in lignes}
+
+
+def enregistrer_manifeste(conn, config, signature, empreinte=None):
+    conn.execute(text("""
+        INSERT INTO _manifeste_chargement (nom_table, chemin_csv, signature, empreinte, charge_le)
+        VALUES (:nom_table, :chemin_csv, :signature, :empreinte, now())
+        ON CONFLICT (nom_table) DO UPDATE
+        SET chemin_csv = EXCLUDED.chemin_csv, signature = EXCLUDED.signature, empreinte = EXCLUDED.empreinte,
+            charge_le = now()
+    """), {"nom_table": config["nom_table"], "chemin_csv": config["chemin_csv"], "signature": signature,
+           "empreinte": empreinte})
+    conn.commit()
+
+
+def comparer_au_manifeste(entree, chemin, signature):
+    """(inchangé, empreinte SHA-256 ou None) du fichier par rapport à son entrée du manifeste.
+
+    Même taille et même date : inchangé, sans relire le fichier. Sinon le contenu est haché (une lecture
+    complète) et comparé à l'empreinte notée ; un chargement complet n'en note pas (pas de hachage).
+    """
+    if entree is None:
+        return False, None
+    signature_notee, empreinte_notee = entree
+    if signature_notee == signature:
+        return True, empreinte_notee
+    empreinte = empreinte_fichier(chemin)
+    return empreinte == empreinte_notee, empreinte
+
+
+def types_table(conn, table_nom):
+    """{colonne: type SQL} de la table existante (dictionnaire vide si elle n'existe pas)."""
+    lignes = conn.execute(text("""
+        SELECT a.attname, upper(format_type(a.atttypid, a.atttypmod))
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(quote_ident(:table_nom)) AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+    """), {"table_nom": table_nom}).all()
+    return {nom: type_sql for nom, type_sql in lignes}
+
+
+def hash_ligne(alias, colonnes):
+    return "md5(ROW(" + ", ".join(f'{alias}."{col}"' for col in colonnes) + ")::text)"
+
+
+def egalite(alias_a, alias_b, colonnes):
+    return " AND ".join(f'{alias_a}."{col}" = {alias_b}."{col}"' for col in colonnes)
+
+
+def identite_ligne(config, alias):
+    """Colonnes identifiant une ligne de la table cible (clé primaire, sinon ctid)."""
+    if config["cle_primaire"]:
+        return [f'{alias}."{col}"' for col in config["cle_primaire"]]
+    return [f"{alias}.ctid"]
+
+
+def lignes_cibles_classees(config, colonnes):
+    """Lignes de la cible avec leur empreinte et leur rang parmi les lignes identiques (tables sans clé CSV)."""
+    identite = ", ".join(f"{expr} AS _id{i}" for i, expr in enumerate(identite_ligne(config, "t")))
+    return f"""
+        SELECT {identite}, {hash_ligne("t", colonnes)} AS _hash,
+               row_number() OVER (PARTITION BY {hash_ligne("t", colonnes)}) AS _rang
+        FROM "{config["nom_table"]}" t
+    """
+
+
+def appliquer_delta_ajouts(conn, config, colonnes):
+    """Phase 1 du delta (ordre des FK) : calcule le contenu attendu puis applique ajouts et mises à jour.
+
+    Avec une clé primaire dans le CSV, les lignes sont comparées clé par clé (empreinte MD5 de la ligne).
+    Sinon (clé BIGSERIAL), les lignes sont comparées par empreinte et par rang parmi les lignes identiques.
+    """
+    table_nom = config["nom_table"]
+    staging = nom_staging(table_nom)
+    delta = nom_delta(table_nom)
+
+    fk_ok, pk_csv, pk_non_nulle = regles_staging(config, colonnes)
+    total, erreurs_fk, autres_erreurs = compter_staging(conn, table_nom, fk_ok, pk_non_nulle)
+
+    selection = selection_staging(staging, colonnes, pk_csv, fk_ok, pk_non_nulle)
+    if pk_csv:
+        requete_delta = f'SELECT d.*, {hash_ligne("d", colonnes)} AS _hash FROM ({selection}) d'
+    else:
+        requete_delta = f"""
+            SELECT x.*, row_number() OVER (PARTITION BY x._hash) AS _rang
+            FROM (SELECT d.*, {hash_ligne("d", colonnes)} AS _hash FROM ({selection}) d) x
+        """
+    conn.execute(text(f'DROP TABLE IF EXISTS "{delta}"'))
+    valides = conn.execute(text(f'CREATE UNLOGGED TABLE "{delta}" AS {requete_delta}')).rowcount
+    conn.execute(text(f'ANALYZE "{delta}"'))
+
+    cols_str = ", ".join(f'"{col}"' for col in colonnes)
+    cols_delta = ", ".join(f'd."{col}"' for col in colonnes)
+    mises_a_jour = 0
+
+    if pk_csv:
+        autres_cols = [col for col in colonnes if col not in pk_csv]
+        if autres_cols:
+            affectations = ", ".join(f'"{col}" = d."{col}"' for col in autres_cols)
+            mises_a_jour = conn.execute(text(f"""
+                UPDATE "{table_nom}" t SET {affectations}
+                FROM "{delta}" d
+                WHERE {egalite("t", "d", pk_csv)} AND {hash_ligne("t", colonnes)} <> d._hash
+            """)).rowcount
+
+        ajouts = conn.execute(text(f"""
+            INSERT INTO "{table_nom}" ({cols_str})
+            SELECT {cols_delta} FROM "{delta}" d
+            WHERE NOT EXISTS (SELECT 1 FROM "{table_nom}" t WHERE {egalite("t", "d", pk_csv)})
+        """)).rowcount
+    else:
+        ajouts = conn.execute(text(f"""
+            INSERT INTO "{table_nom}" ({cols_str})
+            SELECT {cols_delta} FROM "{delta}" d
+            LEFT JOIN ({lignes_cibles_classees(config, colonnes)}) x
+                   ON x._hash = d._hash AND x._rang = d._rang
+            WHERE x._hash IS NULL
+        """)).rowcount
+
+    conn.commit()
+
+    return {
+        "ajouts": ajouts,
+        "mises_a_jour": mises_a_jour,
+        "suppressions": 0,
+        "conservees": 0,
+        "doublons": total - erreurs_fk - autres_erreurs - valides,
+        "erreurs_fk": erreurs_fk,
+        "autres_erreurs": autres_erreurs,
+    }
+
+
+def appliquer_delta_suppressions(conn, config, colonnes, enfants, bilan):
+    """Phase 2 du delta (ordre inverse des FK) : supprime les lignes absentes du nouveau fichier.
+
+    Une ligne encore référencée par une table enfant est conservée (et comptée à part).
+    """
+    table_nom = config["nom_table"]
+    delta = nom_delta(table_nom)
+    _, pk_csv, _ = regles_staging(config, colonnes)
+
+    non_referencee = []
+    for enfant_nom, col_fk, col_ref in enfants:
+        non_referencee.append(f'NOT EXISTS (SELECT 1 FROM "{enfant_nom}" c WHERE c."{col_fk}" = t."{col_ref}")')
+    non_referencee = " AND ".join(non_referencee) if non_referencee else "TRUE"
+
+    if pk_csv:
+        absente = f'NOT EXISTS (SELECT 1 FROM "{delta}" d WHERE {egalite("t", "d", pk_csv)})'
+        a_supprimer = conn.execute(text(f'SELECT count(*) FROM "{table_nom}" t WHERE {absente}')).scalar()
+        suppressions = conn.execute(text(f"""
+            DELETE FROM "{table_nom}" t WHERE {absente} AND {non_referencee}
+        """)).rowcount
+    else:
+        # Lignes de la cible sans équivalent (empreinte, rang) dans le nouveau fichier
+        identite = identite_ligne(config, "t")
+        absentes = f"""
+            SELECT a.* FROM ({lignes_cibles_classees(config, colonnes)}) a
+            LEFT JOIN "{delta}" d ON d._hash = a._hash AND d._rang = a._rang
+            WHERE d._hash IS NULL
+        """
+        egalites_id = " AND ".join(f"{expr} = x._id{i}" for i, expr in enumerate(identite))
+        a_supprimer = conn.execute(text(f"SELECT count(*) FROM ({absentes}) x")).scalar()
+        suppressions = conn.execute(text(f"""
+            DELETE FROM "{table_nom}" t USING ({absentes}) x
+            WHERE {egalites_id} AND {non_referencee}
+        """)).rowcount
+
+    conn.execute(text(f'DROP TABLE IF EXISTS "{delta}"'))
+    conn.commit()
+
+    bilan["suppressions"] = suppressions
+    bilan["conservees"] = a_supprimer - suppressions
+    return bilan
+
+
+def afficher_bilan_delta(bilan):
+    print("  -> FINI (incrémental). Bilan :")
+    print(f"     ➕ Lignes ajoutées       : {bilan['ajouts']}")
+    print(f"     ✏️ Lignes mises à jour   : {bilan['mises_a_jour']}")
+    print(f"     ➖ Lignes supprimées     : {bilan['suppressions']}")
+    if bilan["conservees"]:
+        print(f"     🔒 Conservées (référencées): {bilan['conservees']}")
+    print(f"     ⚠️ Doublons ignorés     : {bilan['doublons']}")
+    print(f"     ⛔️ Parents manquants (FK): {bilan['erreurs_fk']}")
+    if bilan["autres_erreurs"]:
+        print(f"     ❌ Autres erreurs       : {bilan['autres_erreurs']}")
+
+
+# --- Ordonnancement parallèle (mode "copy") ---
+
+_engine_worker = None
+
+
+def initialiser_worker(url):
+    """Chaque processus du pool ouvre sa propre connexion à la base (celle du processus principal)."""
+    global _engine_worker
+    _engine_worker = create_engine(url, poolclass=NullPool)
+
+
+def tache_copier_morceau(table_nom, headers, chemin, debut, fin):
+    with _engine_worker.connect() as conn:
+        try:
+            with ouvrir_source(chemin) as f:
+                return copier_morceau(conn, table_nom, headers, LecteurPlage(f, debut, fin), debut)
+        except DataError as e:
+            # Ligne mal formée : COPY refuse tout le morceau, recopié sans les lignes fautives
+            conn.rollback()
+            print(f"  -> {table_nom}, morceau à l'octet {debut} : {str(e).splitlines()[0]} ; lignes mal formées écartées")
+        with ouvrir_source(chemin) as f:
+            return copier_morceau(conn, table_nom, headers, FiltreLignes(LecteurPlage(f, debut, fin), len(headers)), debut)
+
+
+def tache_transferer(config, colonnes, mode):
+    with _engine_worker.connect() as conn:
+        conn.execute(text(FONCTIONS_VALIDATION))  # Test des clés étrangères de type DATE ou forcé (regles_staging)
+        if mode == "delta":
+            return appliquer_delta_ajouts(conn, config, colonnes)
+        return transferer_staging(conn, config, colonnes)
+
+
+def tache_supprimer(config, colonnes, enfants, bilan):
+    with _engine_worker.connect() as conn:
+        return appliquer_delta_suppressions(conn, config, colonnes, enfants, bilan)
+
+
+def niveaux_dependances(tables):
+    """Regroupe les tables par niveau : une table ne dépend (cle_etrangere) que des niveaux précédents."""
+    noms = {config["nom_table"] for config in tables}
+    restantes = list(tables)
+    places = set()
+    niveaux = []
+
+    while restantes:
+        niveau = []
+        for config in restantes:
+            parents = {table_ref for _, table_ref, _ in config["cle_etrangere"] if table_ref in noms}
+            parents.discard(config["nom_table"])
+            if parents <= places:
+                niveau.append(config)
+        if not niveau:
+            bloquees = ", ".join(config["nom_table"] for config in restantes)
+            raise ValueError(f"Dépendance circulaire entre les clés étrangères de : {bloquees}")
+        niveaux.append(niveau)
+        places.update(config["nom_table"] for config in niveau)
+        restantes = [config for config in restantes if config not in niveau]
+
+    return niveaux
+
+
+def preparer_types(conn, config, colonnes, types_finals):
+    """Vérifie les types proposés sur tout le staging et élargit (ou replie en TEXT) les colonnes invalides.
+
+    Une colonne FK prend toujours le type (final) de la colonne référencée, même si des valeurs ne le
+    passent pas : une FK TEXT vers une colonne typée ferait échouer la comparaison et la contrainte.
+    """
+    table_nom = config["nom_table"]
+    fixes = set()
+    for col_fk, table_ref, col_ref in config["cle_etrangere"]:
+        if col_fk in colonnes and col_ref in types_finals.get(table_ref, {}):
+            colonnes[col_fk] = types_finals[table_ref][col_ref]
+            fixes.add(col_fk)
+
+    colonnes.update(corriger_types(conn, table_nom, colonnes, fixes))
+
+    typees = [f"{col} {type_sql}" for col, type_sql in colonnes.items() if type_sql != "TEXT"]
+    print(f"  -> Colonnes typées : {len(typees)}/{len(colonnes)}" + (f" ({', '.join(typees)})" if typees else ""))
+    return colonnes
+
+
+def enfants_de(tables, table_nom):
+    """Liste des (table enfant, colonne FK, colonne référencée) qui pointent vers table_nom."""
+    enfants = []
+    for config in tables:
+        for col_fk, table_ref, col_ref in config["cle_etrangere"]:
+            if table_ref == table_nom and config["nom_table"] != table_nom:
+                enfants.append((config["nom_table"], col_fk, col_ref))
+    return enfants
+
+
+def terminer_table(conn, table_nom, empreinte, bilan):
+    """Supprime le staging et marque la table comme terminée (même transaction)."""
+    conn.execute(text(f'DROP TABLE IF EXISTS "{nom_staging(table_nom)}"'))
+    conn.execute(text("DELETE FROM _reprise_morceaux WHERE nom_table = :table_nom"), {"table_nom": table_nom})
+    enregistrer_reprise(conn, table_nom, "copy", empreinte, "termine", bilan=bilan)
+    conn.commit()
+
+
+def charger_en_parallele(conn, tables, nb_workers, incremental=False, reprendre=False, temps=None):
+    """Charge les tables en mode "copy" avec un pool de processus.
+
+    1. Les types des colonnes sont proposés à partir d'un échantillon de chaque CSV.
+    2. Les morceaux de tous les CSV sont copiés en parallèle dans les tables de staging (tout en TEXT).
+    3. Niveau par niveau (ordre des clés étrangères), les types sont vérifiés sur le staging, les tables
+       cibles sont créées sans contraintes puis remplies en parallèle, et reçoivent enfin leur clé
+       primaire et leurs clés étrangères.
+
+    En mode incrémental, un CSV dont l'empreinte n'a pas changé (et dont aucun parent n'a été
+    rechargé) est ignoré ; une table existante avec les mêmes colonnes reçoit seulement le delta
+    (ajouts et mises à jour dans l'ordre des FK, suppressions dans l'ordre inverse).
+
+    Avec `reprendre` (--resume), les tables déjà terminées et les morceaux déjà copiés lors de
+    l'exécution interrompue sont sautés.
+
+    La durée de chaque phase (préparation, COPY, transfert, suppressions) est ajoutée à `temps`.
+    """
+    temps = {} if temps is None else temps
+    manifeste = lire_manifeste(conn)
+    etats = initialiser_reprise(conn, reprendre)
+    a_charger = []
+    a_manifester = []
+    taches_copie = []
+    modes = {}
+    types_finals = {}
+    hachages = {}  # nom_table -> SHA-256 du fichier, calculé seulement en mode incrémental (manifeste)
+
+    with chronometre("préparation", temps):
+        for niveau in niveaux_dependances(tables):
+            for config in niveau:
                 table_nom = config["nom_table"]
                 fichier_csv = config["chemin_csv"]
-                
-                print(f"\nTraitement de la table : {table_nom}")
-                
+                parents = [table_ref for _, table_ref, _ in config["cle_etrangere"]]
+
                 try:
-                    with open(fichier_csv, mode="r", encoding="utf-8-sig") as f:
-                        reader = csv.DictReader(f, delimiter=";")
-                        
-                        headers = reader.fieldnames
+                    empreinte = signature_fichier(fichier_csv)
+                    with ouvrir_source(fichier_csv) as f:
+                        headers = lire_entete(f)
                         if not headers:
-                            print("  -> Fichier vide, passage à la suite.")
+                            print(f"  -> {table_nom} : fichier vide, passage à la suite.")
                             continue
+                        debut_donnees = f.tell()
 
-                        # ÉTAPE 1 : CREATE TABLE
-                        definitions_colonnes = []
+                        etat = etats.get(table_nom)
+                        reprise = reprise_valide(etat, "copy", empreinte, parents, modes)
+                        if reprise and etat["etape"] == "termine" and types_table(conn, table_nom):
+                            print(f"\nTable déjà chargée lors de l'exécution interrompue : {table_nom}")
+                            types_finals[table_nom] = types_table(conn, table_nom)
+                            a_manifester.append((config, empreinte))
+                            continue
 
-                        for col_extra in config["colonnes_extra"]:
-                            definitions_colonnes.append(col_extra)
+                        colonnes = inferer_types(echantillonner(f, headers), config.get("types"))
 
-                        for col in headers:
-                            definitions_colonnes.append(f'"{col}" TEXT')
+                        mode = "complet"
+                        if incremental:
+                            modes_parents = [modes.get(parent) for parent in parents]
+                            colonnes_attendues = [col.split()[0] for col in config["colonnes_extra"]] + headers
+                            types_existants = types_table(conn, table_nom)
+                            partitionnement_change = est_partitionnee(conn, table_nom) != bool(config.get("partition"))
+                            if (list(types_existants) != colonnes_attendues or "complet" in modes_parents
+                                    or partitionnement_change):
+                                mode = "complet"
+                            else:
+                                inchangee = False
+                                if "delta" not in modes_parents:
+                                    inchangee, hachages[table_nom] = comparer_au_manifeste(
+                                        manifeste.get(table_nom), fichier_csv, empreinte)
+                                if inchangee:
+                                    print(f"\nTable inchangée, ignorée : {table_nom}")
+                                    types_finals[table_nom] = types_existants
+                                    continue
+                                mode = "delta"
+                                colonnes = {col: types_existants[col] for col in headers}
+                        modes[table_nom] = mode
 
-                        if config["cle_primaire"]:
-                            liste_pk = []
-                            for pk_col in config["cle_primaire"]:
-                                liste_pk.append(f'"{pk_col}"')
-                            pk_str = ", ".join(liste_pk)
-                            definitions_colonnes.append(f"PRIMARY KEY ({pk_str})")
+                        print(f"\nPréparation de la table : {table_nom} ({mode})")
+                        morceaux = morceaux_a_copier(conn, table_nom, headers, f, debut_donnees, nb_workers * 2, reprise,
+                                                     est_decoupable(fichier_csv))
+                        print(f"  -> {len(morceaux)} morceau(x) à copier")
+                        enregistrer_reprise(conn, table_nom, "copy", empreinte, "copie")
+                        conn.commit()
+                except FileNotFoundError:
+                    print(f"  -> ERREUR FATALE : Le fichier '{fichier_csv}' est introuvable.")
+                    continue
 
-                        for col_fk, table_ref, col_ref in config["cle_etrangere"]:
-                            constraint = f'FOREIGN KEY ("{col_fk}") REFERENCES "{table_ref}"("{col_ref}")'
-                            definitions_colonnes.append(constraint)
+                a_charger.append((config, colonnes, empreinte))
+                for debut, fin in morceaux:
+                    taches_copie.append((table_nom, headers, fichier_csv, debut, fin))
 
-                        corps_table = ", ".join(definitions_colonnes)
-                        requete_creation = f'CREATE TABLE "{table_nom}" ({corps_table})'
+    bilans = {}
+    url = conn.engine.url.render_as_string(hide_password=False)
+    with ProcessPoolExecutor(max_workers=nb_workers, initializer=initialiser_worker, initargs=(url,)) as pool:
+        print(f"\nCOPY de {len(taches_copie)} morceau(x) sur {nb_workers} processus...")
+        with chronometre("COPY", temps):
+            futures = [pool.submit(tache_copier_morceau, *tache) for tache in taches_copie]
+            for future in futures:
+                future.result()
 
-                        print("  -> Réinitialisation de la structure SQL...")
-                        conn.execute(text(f'DROP TABLE IF EXISTS "{table_nom}" CASCADE'))
-                        conn.execute(text(requete_creation))
+        niveaux = niveaux_dependances([config for config, _, _ in a_charger])
+        empreintes = {config["nom_table"]: empreinte for config, _, empreinte in a_charger}
+        with chronometre("transfert", temps):
+            for niveau in niveaux:
+                a_transferer = [(config, colonnes) for config, colonnes, _ in a_charger if config in niveau]
+                futures = []
+                for config, colonnes in a_transferer:
+                    table_nom = config["nom_table"]
+                    print(f"\nTypage de la table : {table_nom}")
+                    if modes[table_nom] == "complet":
+                        preparer_types(conn, config, colonnes, types_finals)
+                        creer_table(conn, config, colonnes, avec_contraintes=False)
+                    else:
+                        # Table existante : une colonne invalide pour son type actuel est élargie (ou passe en TEXT),
+                        # sauf une clé étrangère, qui garde le type de la colonne référencée
+                        fixes = {col_fk for col_fk, _, _ in config["cle_etrangere"]}
+                        for col, type_sql in corriger_types(conn, table_nom, colonnes, fixes).items():
+                            conn.execute(text(f'ALTER TABLE "{table_nom}" ALTER COLUMN "{col}" TYPE {type_sql}'))
+                            colonnes[col] = type_sql
                         conn.commit()
+                    types_finals[table_nom] = colonnes
+                    futures.append(pool.submit(tache_transferer, config, colonnes, modes[table_nom]))
 
-                        # ÉTAPE 2 : Préparation de l'insertion
-                        liste_cols_propre = []
-                        liste_params_propre = []
-                        
-                        for h in headers:
-                            liste_cols_propre.append(f'"{h}"')
-                            liste_params_propre.append(f':{h}')
-
-                        cols_str = ", ".join(liste_cols_propre)
-                        params_str = ", ".join(liste_params_propre)
-                        
-                        sql_insert = text(f'INSERT INTO "{table_nom}" ({cols_str}) VALUES ({params_str})')
-
-                        # ÉTAPE 3 : Insertion ligne par ligne
-                        print("  -> Insertion des données en cours...")
-                        
-                        succes = 0
-                        doublons = 0
-                        erreurs_fk = 0
-                        autres_erreurs = 0
-                        compteur_lot = 0
-
-                        for ligne in reader:
-                            
-                            ligne_propre = {}
-                            for cle, valeur in ligne.items():
-                                if valeur == "" or valeur is None:
-                                    ligne_propre[cle] = None
-                                else:
-                                    ligne_propre[cle] = valeur.strip()
-
-                            try:
-                                with conn.begin_nested():
-                                    conn.execute(sql_insert, ligne_propre)
-                                succes = succes + 1
-                            
-                            except IntegrityError as e:
-                                if isinstance(e.orig, UniqueViolation):
-                                    doublons = doublons + 1
-                                
-                                elif isinstance(e.orig, ForeignKeyViolation):
-                                    erreurs_fk = erreurs_fk + 1
-                                
-                                else:
-                                    autres_erreurs = autres_erreurs + 1
-                                    print(f"  -> Erreur SQL sur la ligne : {ligne_propre}")
-                                    print(f"     Message : {e}")
-
-                            except Exception as e:
-                                print(f"  -> Erreur Python : {e}")
-
-                            compteur_lot = compteur_lot + 1
-                            if compteur_lot % TAILLE_LOT == 0:
-                                conn.commit()
+                for (config, _), future in zip(a_transferer, futures):
+                    table_nom = config["nom_table"]
+                    bilans[table_nom] = future.result()
+                    if modes[table_nom] == "complet":
+                        print(f"\nTraitement de la table : {table_nom}")
+                        print("  -> Création des contraintes...")
+                        ajouter_contraintes(conn, config, "pk")
+                        ajouter_contraintes(conn, config, "fk")
+                        terminer_table(conn, table_nom, empreintes[table_nom], bilans[table_nom])
+                        afficher_bilan(bilans[table_nom])
 
-                        conn.commit()
+        # Suppressions du delta : les enfants d'abord, pour ne pas casser les clés étrangères
+        with chronometre("suppressions", temps):
+            for niveau in reversed(niveaux):
+                a_nettoyer = [
+                    (config, types_finals[config["nom_table"]]) for config, _, _ in a_charger
+                    if config in niveau and modes[config["nom_table"]] == "delta"
+                ]
+                futures = [
+                    pool.submit(tache_supprimer, config, colonnes, enfants_de(tables, config["nom_table"]),
+                                bilans[config["nom_table"]])
+                    for config, colonnes in a_nettoyer
+                ]
+                for (config, _), future in zip(a_nettoyer, futures):
+                    table_nom = config["nom_table"]
+                    bilans[table_nom] = future.result()
+                    terminer_table(conn, table_nom, empreintes[table_nom], bilans[table_nom])
+                    print(f"\nTraitement de la table : {table_nom}")
+                    afficher_bilan(bilans[table_nom])
 
-                        print(f"  -> FINI. Bilan :")
-                        print(f"     ✅ Insérés avec succès  : {succes}")
-                        print(f"     ⚠️ Doublons ignorés     : {doublons}")
-                        print(f"     ⛔️ Parents manquants (FK): {erreurs_fk}")
-                        
-                except FileNotFoundError:
-                    print(f"  -> ERREUR FATALE : Le fichier '{fichier_csv}' est introuvable.")
+    for config, _, empreinte in a_charger:
+        a_manifester.append((config, empreinte))
+    for config, empreinte in a_manifester:
+        enregistrer_manifeste(conn, config, empreinte, hachages.get(config["nom_table"]))
+    effacer_reprise(conn)
+
+    return bilans
+
+
+# --- Étape post-chargement : index et statistiques ---
+
+@contextmanager
+def chronometre(nom, temps):
+    """Mesure la durée d'une étape, l'affiche et l'ajoute au dictionnaire `temps`."""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        duree = time.perf_counter() - debut
+        temps[nom] = temps.get(nom, 0) + duree
+        print(f"  -> {nom} : {duree:.2f} s")
+
+
+def index_a_creer(config):
+    """Colonnes à indexer : index configurés + colonnes FK non couvertes par le début d'un index."""
+    index = [(col,) if isinstance(col, str) else tuple(col) for col in config.get("index", [])]
+    for col_fk, _, _ in config["cle_etrangere"]:
+        if not any(colonnes[0] == col_fk for colonnes in index):
+            index.append((col_fk,))
+    return index
+
+
+def creer_index_et_analyser(engine, tables):
+    """Crée les index manquants (en CONCURRENTLY si possible) puis lance ANALYZE ; renvoie le temps par étape."""
+    temps = {}
+    concurrently = "CONCURRENTLY " if INDEX_CONCURRENTS else ""
+    print("\nPost-chargement : index et statistiques")
+
+    # CREATE INDEX CONCURRENTLY est interdit dans une transaction : connexion en AUTOCOMMIT
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for config in tables:
+            table_nom = config["nom_table"]
+            colonnes_existantes = types_table(conn, table_nom)
+            if not colonnes_existantes:
+                continue
+            # CONCURRENTLY n'existe pas pour une table partitionnée (l'index est créé sur chaque partition)
+            concurrently_table = "" if est_partitionnee(conn, table_nom) else concurrently
+
+            for colonnes in index_a_creer(config):
+                if not all(col in colonnes_existantes for col in colonnes):
+                    print(f"  -> Index ignoré sur {table_nom}{colonnes} : colonne absente")
+                    continue
+                nom_index = f"idx_{table_nom}_{'_'.join(colonnes)}"[:63]
+                # Un CREATE INDEX CONCURRENTLY interrompu laisse un index invalide : on le reconstruit
+                invalide = conn.execute(text("""
+                    SELECT NOT i.indisvalid FROM pg_index i
+                    WHERE i.indexrelid = to_regclass(quote_ident(:nom_index))
+                """), {"nom_index": nom_index}).scalar()
+                if invalide:
+                    conn.execute(text(f'DROP INDEX {concurrently_table}IF EXISTS "{nom_index}"'))
+
+                cols_str = ", ".join(f'"{col}"' for col in colonnes)
+                with chronometre(f"index {nom_index}", temps):
+                    conn.execute(text(
+                        f'CREATE INDEX {concurrently_table}IF NOT EXISTS "{nom_index}" ON "{table_nom}" ({cols_str})'
+                    ))
+
+            with chronometre(f"ANALYZE {table_nom}", temps):
+                conn.execute(text(f'ANALYZE "{table_nom}"'))
+
+    return temps
+
+
+def activer_partitionwise(engine, tables):
+    """Jointures et agrégats partition par partition pour les sessions de la base, si une table est partitionnée."""
+    if not any(config.get("partition") for config in tables):
+        return
+    with engine.connect() as conn:
+        base = conn.execute(text("SELECT current_database()")).scalar()
+        for parametre in ("enable_partitionwise_join", "enable_partitionwise_aggregate"):
+            conn.execute(text(f'ALTER DATABASE "{base}" SET {parametre} = on'))
+        conn.commit()
+
+
+# --- Étape optionnelle (--dimensions) : colonnes répétitives encodées par dictionnaire ---
+# La table physique devient <table>_faits (identifiants entiers <colonne>_id) ; une vue reprend le nom et les
+# colonnes d'origine de la table, les requêtes des interfaces restent inchangées.
+
+def nom_faits(table_nom):
+    return f"{table_nom}_faits"
+
+
+def nom_dimension(col):
+    return f"dim_{col}"
+
+
+def est_vue(conn, nom):
+    return bool(conn.execute(text("""
+        SELECT relkind = 'v' FROM pg_class WHERE oid = to_regclass(quote_ident(:nom))
+    """), {"nom": nom}).scalar())
+
+
+def retirer_dimensions(conn, tables):
+    """Supprime la vue, la table de faits et les dimensions d'un chargement précédent avec --dimensions.
+
+    Les tables concernées sont absentes ensuite : elles sont rechargées entièrement (même en --incremental).
+    """
+    for config in tables:
+        table_nom = config["nom_table"]
+        if est_vue(conn, table_nom):
+            print(f"Suppression de la version normalisée de {table_nom}")
+            conn.execute(text(f'DROP VIEW "{table_nom}" CASCADE'))
+            conn.execute(text(f'DROP TABLE IF EXISTS "{nom_faits(table_nom)}" CASCADE'))
+    for config in tables:
+        for col in config.get("dimensions", []):
+            conn.execute(text(f'DROP TABLE IF EXISTS "{nom_dimension(col)}" CASCADE'))
+    conn.commit()
+
+
+def remplir_dimension(conn, table_nom, col):
+    """Crée dim_<col> (partagée entre les tables qui ont cette colonne) et y ajoute les valeurs de la table."""
+    dimension = nom_dimension(col)
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS "{dimension}" (
+            id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            valeur TEXT NOT NULL UNIQUE
+        )
+    """))
+    conn.execute(text(f"""
+        INSERT INTO "{dimension}" (valeur)
+        SELECT DISTINCT "{col}" FROM "{table_nom}" WHERE "{col}" IS NOT NULL ORDER BY 1
+        ON CONFLICT (valeur) DO NOTHING
+    """))
+    # Fonction de correspondance valeur -> id pour le ALTER COLUMN ... USING (pas de sous-requête possible)
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION pg_temp."id_{dimension}"(v TEXT) RETURNS INTEGER AS $$
+            SELECT id FROM "{dimension}" WHERE valeur = v
+        $$ LANGUAGE sql STABLE
+    """))
+
+
+def normaliser_dimensions(engine, tables, vues):
+    """Remplace les colonnes "dimensions" par des identifiants entiers et crée les vues de compatibilité."""
+    temps = {}
+    print("\nPost-chargement : tables de dimensions")
+
+    with engine.connect() as conn:
+        # Les vues matérialisées dépendent des colonnes remplacées : rafraichir_vues les recrée ensuite
+        for vue in vues:
+            conn.execute(text(f'DROP MATERIALIZED VIEW IF EXISTS "{vue["nom_vue"]}"'))
+        conn.commit()
+
+        for config in tables:
+            table_nom = config["nom_table"]
+            colonnes = types_table(conn, table_nom)
+            dimensions = [col for col in config.get("dimensions", []) if colonnes.get(col) == "TEXT"]
+            if not dimensions or est_vue(conn, table_nom):
+                continue
+
+            with chronometre(f"dimensions {table_nom}", temps):
+                for col in dimensions:
+                    remplir_dimension(conn, table_nom, col)
+
+                # Un seul ALTER TABLE : la table (et ses index) n'est réécrite qu'une fois
+                conversions = ", ".join(
+                    f'ALTER COLUMN "{col}" TYPE INTEGER USING pg_temp."id_{nom_dimension(col)}"("{col}")'
+                    for col in dimensions
+                )
+                conn.execute(text(f'ALTER TABLE "{table_nom}" {conversions}'))
+                for col in dimensions:
+                    conn.execute(text(f'ALTER TABLE "{table_nom}" RENAME COLUMN "{col}" TO "{col}_id"'))
+                    conn.execute(text(
+                        f'ALTER TABLE "{table_nom}" ADD FOREIGN KEY ("{col}_id") REFERENCES "{nom_dimension(col)}" (id)'
+                    ))
+                # Les clés étrangères des autres tables suivent le renommage
+                conn.execute(text(f'ALTER TABLE "{table_nom}" RENAME TO "{nom_faits(table_nom)}"'))
+
+                selection = []
+                jointures = []
+                for col in colonnes:
+                    if col in dimensions:
+                        alias = f"d{dimensions.index(col)}"
+                        selection.append(f'{alias}.valeur AS "{col}"')
+                        # LEFT JOIN sur une clé unique : PostgreSQL l'élimine si la colonne n'est pas lue
+                        jointures.append(
+                            f'LEFT JOIN "{nom_dimension(col)}" {alias} ON {alias}.id = f."{col}_id"'
+                        )
+                    else:
+                        selection.append(f'f."{col}"')
+                conn.execute(text(
+                    f'CREATE VIEW "{table_nom}" AS SELECT {", ".join(selection)} '
+                    f'FROM "{nom_faits(table_nom)}" f {" ".join(jointures)}'
+                ))
+                conn.commit()
+                print(f"  -> {table_nom} : {', '.join(dimensions)} déplacée(s) en tables de dimensions")
+
+            with chronometre(f"ANALYZE {nom_faits(table_nom)}", temps):
+                conn.execute(text(f'ANALYZE "{nom_faits(table_nom)}"'))
+                for col in dimensions:
+                    conn.execute(text(f'ANALYZE "{nom_dimension(col)}"'))
+                conn.commit()
+
+    return temps
+
+
+def rafraichir_vues(engine, vues):
+    """Crée les vues matérialisées absentes (supprimées par DROP ... CASCADE) ou rafraîchit les autres."""
+    temps = {}
+    print("\nPost-chargement : vues matérialisées")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for vue in vues:
+            nom_vue = vue["nom_vue"]
+            existe = conn.execute(text("SELECT to_regclass(quote_ident(:nom_vue))"), {"nom_vue": nom_vue}).scalar()
+            try:
+                with chronometre(f"vue {nom_vue}", temps):
+                    if existe:
+                        # CONCURRENTLY : les interfaces peuvent lire l'ancienne version pendant le calcul
+                        conn.execute(text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{nom_vue}"'))
+                    else:
+                        conn.execute(text(f'CREATE MATERIALIZED VIEW "{nom_vue}" AS {vue["sql"]}'))
+                        unique_str = ", ".join(f'"{col}"' for col in vue["unique"])
+                        conn.execute(text(f'CREATE UNIQUE INDEX "{nom_vue}_unique" ON "{nom_vue}" ({unique_str})'))
+                        conn.execute(text(f'CREATE INDEX "{nom_vue}_tri" ON "{nom_vue}" ({", ".join(vue["index"])})'))
+                        conn.execute(text(f'ANALYZE "{nom_vue}"'))
+            except Exception as e:
+                print(f"  -> Vue {nom_vue} non créée : {e}")
+
+    return temps
+
+
+def marquer_version_donnees(engine):
+    """Nouvelle version des données : les caches de résultats des interfaces (requete_web.py) sont invalidés."""
+    with engine.connect() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS _version_donnees (
+                id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                version TEXT NOT NULL,
+                charge_le TIMESTAMPTZ NOT NULL
+            )
+        """))
+        # Aléatoire plutôt qu'un compteur : une base recréée puis rechargée n'en reprend pas une ancienne
+        conn.execute(text("""
+            INSERT INTO _version_donnees (version, charge_le) VALUES (md5(random()::text || clock_timestamp()::text), now())
+            ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, charge_le = EXCLUDED.charge_le
+        """))
+        conn.commit()
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Importe les CSV Data ES dans la base PostgreSQL.")
+    parser.add_argument("--mode", choices=["copy", "ligne"], default=MODE_CHARGEMENT,
+                        help="copy : COPY + transfert ensembliste (défaut) ; ligne : insertion ligne par ligne")
+    parser.add_argument("--workers", type=int, default=NB_WORKERS,
+                        help=f"mode copy : nombre de processus de chargement (défaut : {NB_WORKERS})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="mode copy : ignore les CSV inchangés et n'applique que le delta aux tables existantes")
+    parser.add_argument("--resume", action="store_true",
+                        help="reprend un chargement interrompu à partir du dernier point de contrôle")
+    parser.add_argument("--base", default=DB_NAME,
+                        help=f"nom de la base à remplir (défaut : {DB_NAME})")
+    parser.add_argument("--csv", metavar="DOSSIER",
+                        help="dossier où lire les fichiers de TABLES (mêmes noms), à la place de ./csv/")
+    parser.add_argument("--dimensions", action="store_true",
+                        help="après le chargement, déplace les colonnes \"dimensions\" de TABLES dans des tables dim_*")
+    parser.add_argument("--temps", metavar="FICHIER",
+                        help="écrit la durée de chaque phase du chargement dans ce fichier JSON")
+    return parser.parse_args()
+
+
+def tables_du_dossier(tables, dossier):
+    """Copie de la configuration des tables avec les fichiers pris dans `dossier` (None : inchangée)."""
+    if not dossier:
+        return tables
+    return [dict(config, chemin_csv=os.path.join(dossier, os.path.basename(config["chemin_csv"])))
+            for config in tables]
+
+
+def charger_ligne_par_ligne(conn, tables, reprendre=False):
+    """Ancien mode : tables traitées dans l'ordre, contraintes créées avant l'insertion.
+
+    Avec `reprendre` (--resume), une table interrompue repart de l'octet et de la ligne du dernier commit.
+    """
+    etats = initialiser_reprise(conn, reprendre)
+    recreees = set()
+    bilans = {}
+
+    for config in tables:
+        table_nom = config["nom_table"]
+        fichier_csv = config["chemin_csv"]
+        parents = [table_ref for _, table_ref, _ in config["cle_etrangere"]]
+
+        print(f"\nTraitement de la table : {table_nom}")
+
+        try:
+            empreinte = signature_fichier(fichier_csv)
+            with ouvrir_source(fichier_csv) as f:
+                headers = lire_entete(f)
+                if not headers:
+                    print("  -> Fichier vide, passage à la suite.")
+                    continue
+
+                etat = etats.get(table_nom)
+                depart = None
+                if reprise_valide(etat, "ligne", empreinte, parents, recreees) and types_table(conn, table_nom):
+                    if etat["etape"] == "termine":
+                        print("  -> Déjà chargée lors de l'exécution interrompue.")
+                        bilans[table_nom] = etat["bilan"]
+                        continue
+                    print(f"  -> Reprise à l'octet {etat['octet']} (ligne {etat['ligne']})")
+                    f.seek(etat["octet"])
+                    depart = etat
+                else:
+                    creer_table(conn, config, {col: "TEXT" for col in headers})
+                    recreees.add(table_nom)
+                    bilan_vide = {"succes": 0, "doublons": 0, "erreurs_fk": 0, "autres_erreurs": 0}
+                    enregistrer_reprise(conn, table_nom, "ligne", empreinte, "insertion", f.tell(), 0, bilan_vide)
+                    conn.commit()
+
+                print("  -> Insertion des données en cours...")
+                bilan = inserer_ligne_par_ligne(conn, table_nom, headers, f, empreinte, depart)
+                afficher_bilan(bilan)
+                bilans[table_nom] = bilan
+
+        except FileNotFoundError:
+            print(f"  -> ERREUR FATALE : Le fichier '{fichier_csv}' est introuvable.")
+
+    effacer_reprise(conn)
+    return bilans
+
+
+def main():
+    args = lire_arguments()
+    engine = None
+    print("DEMARRAGE DU PROGRAMME D'IMPORTATION")
+    print(f"Mode de chargement : {args.mode}{' (incrémental)' if args.incremental else ''}")
+    print("-" * 50)
+
+    try:
+        engine = create_engine(f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{args.base}")
+        tables = tables_du_dossier(TABLES, args.csv)
+        temps = {}
+
+        with engine.connect() as conn:
+            retirer_dimensions(conn, tables)
+            if args.incremental and args.mode != "copy":
+                print("Le mode incrémental n'existe qu'en mode copy : rechargement complet.")
+            with chronometre("chargement", temps):
+                if args.mode == "copy":
+                    charger_en_parallele(conn, tables, max(1, args.workers), args.incremental, args.resume, temps)
+                else:
+                    charger_ligne_par_ligne(conn, tables, args.resume)
+
+        with chronometre("index et ANALYZE", temps):
+            temps.update(creer_index_et_analyser(engine, tables))
+        activer_partitionwise(engine, tables)
+        if args.dimensions:
+            with chronometre("dimensions", temps):
+                temps.update(normaliser_dimensions(engine, tables, VUES_MATERIALISEES))
+        with chronometre("vues matérialisées", temps):
+            temps.update(rafraichir_vues(engine, VUES_MATERIALISEES))
+        marquer_version_donnees(engine)
+
+        if args.temps:
+            with open(args.temps, mode="w", encoding="utf-8") as f:
+                json.dump(temps, f, ensure_ascii=False, indent=2)
 
     except Exception as global_e:
         print(f"Erreur générale de connexion ou de script : {global_e}")
@@ -171,4 +1657,4 @@ def main():
         print("Fin du programme.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,134 @@
+import csv
+import gzip
+import io
+
+# Ouverture des fichiers sources de remplissage.py : CSV brut, CSV compressé (.csv.gz, .csv.zst) ou Parquet.
+# Tous sont lus comme un flux binaire de CSV (séparateur ';', en-tête sur la première ligne),
+# décodé au fil de l'eau : la mémoire utilisée ne dépend pas de la taille du fichier.
+
+# Dépendances optionnelles : seulement nécessaires pour les formats correspondants
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+TAILLE_LOT_PARQUET = 65536  # Lignes Parquet converties en CSV à la fois
+
+
+class FluxSequentiel(io.RawIOBase):
+    """Flux binaire lu une seule fois du début à la fin (décompression, conversion).
+
+    La position est comptée au fil de la lecture ; seek() ne sait qu'avancer, en lisant et en jetant.
+    """
+
+    def __init__(self, lire, fermer=None):
+        self.lire = lire
+        self.fermer = fermer
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, tampon):
+        donnees = self.lire(len(tampon))
+        tampon[:len(donnees)] = donnees
+        self.position = self.position + len(donnees)
+        return len(donnees)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            position = self.position + position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Flux séquentiel : seek depuis la fin impossible")
+        if position < self.position:
+            raise io.UnsupportedOperation("Flux séquentiel : retour en arrière impossible")
+        while self.position < position:
+            donnees = self.lire(min(1024 * 1024, position - self.position))
+            if not donnees:
+                break
+            self.position = self.position + len(donnees)
+        return self.position
+
+    def close(self):
+        if not self.closed and self.fermer:
+            self.fermer()
+        super().close()
+
+
+def lecteur_blocs(blocs):
+    """Transforme un itérateur de blocs d'octets en fonction lire(n)."""
+    reste = memoryview(b"")
+
+    def lire(taille):
+        nonlocal reste
+        while not reste:
+            bloc = next(blocs, None)
+            if bloc is None:
+                return b""
+            reste = memoryview(bloc)
+        donnees = bytes(reste[:taille])
+        reste = reste[taille:]
+        return donnees
+
+    return lire
+
+
+def blocs_parquet(chemin):
+    """Fichier Parquet converti en CSV lot par lot : d'abord l'en-tête, puis les lignes."""
+    fichier = pq.ParquetFile(chemin)
+
+    entete = io.StringIO()
+    csv.writer(entete, delimiter=";", lineterminator="\n").writerow(fichier.schema_arrow.names)
+    yield entete.getvalue().encode("utf-8")
+
+    options = pa_csv.WriteOptions(include_header=False, delimiter=";")
+    for lot in fichier.iter_batches(batch_size=TAILLE_LOT_PARQUET):
+        sortie = io.BytesIO()
+        pa_csv.write_csv(lot, sortie, options)
+        yield sortie.getvalue()
+
+
+def ouvrir_source(chemin):
+    """Ouvre le fichier source comme un flux binaire de CSV, décompressé ou converti à la volée."""
+    nom = chemin.lower()
+
+    if nom.endswith(".gz"):
+        return gzip.open(chemin, mode="rb")
+
+    if nom.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Le module zstandard est nécessaire pour lire '{chemin}' (pip install zstandard)")
+        fichier = open(chemin, mode="rb")
+        lecteur = zstandard.ZstdDecompressor().stream_reader(fichier, read_across_frames=True)
+
+        def fermer():
+            lecteur.close()
+            fichier.close()
+
+        return io.BufferedReader(FluxSequentiel(lecteur.read, fermer), buffer_size=1024 * 1024)
+
+    if nom.endswith(".parquet"):
+        if pq is None:
+            raise RuntimeError(f"Le module pyarrow est nécessaire pour lire '{chemin}' (pip install pyarrow)")
+        open(chemin, mode="rb").close()  # FileNotFoundError comme pour un CSV
+        return io.BufferedReader(FluxSequentiel(lecteur_blocs(blocs_parquet(chemin))), buffer_size=1024 * 1024)
+
+    return open(chemin, mode="rb")
+
+
+def est_decoupable(chemin):
+    """Seul un CSV brut permet d'accéder directement à un octet : les autres formats sont lus d'un bloc."""
+    nom = chemin.lower()
+    return not (nom.endswith(".gz") or nom.endswith(".zst") or nom.endswith(".parquet"))
@@ -1,4 +1,7 @@
+import argparse
+import time
 from sqlalchemy import create_engine, text
+from creation import DB_MODELE, base_existe, copier_base, supprimer_modele, terminer_connexions
 
 # --- Configuration ---
 USER = 'postgres'
@@ -7,7 +10,27 @@ HOST = '127.0.0.1'
 PORT = 5434
 DB_TO_DROP = 'sport'  # Nom de la base à supprimer
 
+
+def supprimer_base(conn, nom_base):
+    # DROP DATABASE échoue si une interface (Tkinter, web...) est encore connectée
+    nb = terminer_connexions(conn, nom_base)
+    if nb:
+        print(f"  -> {nb} connexion(s) à '{nom_base}' fermée(s)")
+    conn.execute(text(f'DROP DATABASE IF EXISTS "{nom_base}"'))
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description=f"Supprime la base '{DB_TO_DROP}'.")
+    groupe = parser.add_mutually_exclusive_group()
+    groupe.add_argument("--reset", action="store_true",
+                        help=f"recrée aussitôt '{DB_TO_DROP}' depuis la base modèle '{DB_MODELE}' (voir creation.py --snapshot)")
+    groupe.add_argument("--modele", action="store_true",
+                        help=f"supprime aussi la base modèle '{DB_MODELE}'")
+    return parser.parse_args()
+
+
 def main():
+    args = lire_arguments()
     # Connexion à 'postgres' avec AUTOCOMMIT (obligatoire pour DROP DATABASE)
     url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/postgres"
     engine = None
@@ -17,7 +40,20 @@ def main():
     try:
         engine = create_engine(url, isolation_level="AUTOCOMMIT")
         with engine.connect() as conn:
-            conn.execute(text(f'DROP DATABASE IF EXISTS "{DB_TO_DROP}"'))
+            if args.reset and not base_existe(conn, DB_MODELE):
+                print(f"Erreur : la base modèle '{DB_MODELE}' n'existe pas (lancer d'abord creation.py --snapshot).")
+                return
+
+            supprimer_base(conn, DB_TO_DROP)
+
+            if args.reset:
+                print(f"Recréation depuis le modèle '{DB_MODELE}'...")
+                debut = time.perf_counter()
+                copier_base(conn, DB_TO_DROP, DB_MODELE)
+                print(f"  -> Base '{DB_TO_DROP}' recréée en {time.perf_counter() - debut:.1f} s.")
+            elif args.modele and base_existe(conn, DB_MODELE):
+                print(f"Suppression de la base modèle '{DB_MODELE}'...")
+                supprimer_modele(conn)
 
         print("Terminé.")
     finally:
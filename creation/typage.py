@@ -0,0 +1,174 @@
+import csv
+import re
+from datetime import datetime
+
+# Inférence des types PostgreSQL des colonnes d'un CSV, utilisée par remplissage.py (mode copy) :
+#  1. un échantillon du fichier propose un type compact par colonne ;
+#  2. le type est vérifié sur toutes les lignes de la table de staging ;
+#  3. une colonne dont une valeur ne passe pas prend le premier type plus large qui accepte tout
+#     (ELARGISSEMENTS), sinon TEXT.
+
+TAILLE_ECHANTILLON = 10000  # Nombre de lignes lues pour proposer les types
+
+BOOLEENS = {"true": True, "false": False, "vrai": True, "faux": False, "oui": True, "non": False}
+
+# Les entiers avec des zéros en tête ("01", "01000") sont des codes : ils restent en TEXT
+RE_ENTIER = r"[+-]?(0|[1-9][0-9]*)"
+RE_DECIMAL = r"[+-]?(0|[1-9][0-9]*)?[.,][0-9]+"
+RE_FLOTTANT = r"[+-]?([0-9]+([.,][0-9]*)?|[.,][0-9]+)[eE][+-]?[0-9]+"
+RE_DATE_ISO = r"[0-9]{4}-[0-9]{2}-[0-9]{2}"
+RE_DATE_FR = r"[0-9]{2}/[0-9]{2}/[0-9]{4}"
+
+BORNES_ENTIERS = [
+    ("SMALLINT", -32768, 32767),
+    ("INTEGER", -2147483648, 2147483647),
+    ("BIGINT", -9223372036854775808, 9223372036854775807),
+]
+DECIMALES_NUMERIC = 2  # Au-delà (coordonnées GPS...), on passe en DOUBLE PRECISION
+
+# Types essayés, dans l'ordre, quand le fichier complet contient une valeur refusée par le type de l'échantillon
+ELARGISSEMENTS = {
+    "SMALLINT": ["INTEGER", "BIGINT", "NUMERIC"],
+    "INTEGER": ["BIGINT", "NUMERIC"],
+    "BIGINT": ["NUMERIC"],
+    "NUMERIC": ["DOUBLE PRECISION"],
+}
+
+
+def echantillonner(f, headers, taille=TAILLE_ECHANTILLON):
+    """Lit jusqu'à `taille` lignes (fichier binaire placé après l'en-tête) : {colonne: valeurs non vides}."""
+    valeurs = {col: [] for col in headers}
+    lignes_texte = (ligne.decode("utf-8") for ligne in f)
+    reader = csv.reader(lignes_texte, delimiter=";")
+
+    for numero, ligne in enumerate(reader):
+        if numero >= taille:
+            break
+        for col, valeur in zip(headers, ligne):
+            valeur = valeur.strip()
+            if valeur:
+                valeurs[col].append(valeur)
+
+    return valeurs
+
+
+def _date_valide(valeur):
+    for motif, format_date in ((RE_DATE_ISO, "%Y-%m-%d"), (RE_DATE_FR, "%d/%m/%Y")):
+        if re.fullmatch(motif, valeur):
+            try:
+                datetime.strptime(valeur, format_date)
+                return True
+            except ValueError:
+                return False
+    return False
+
+
+def inferer_type(valeurs):
+    """Propose le type PostgreSQL le plus compact compatible avec toutes les valeurs de l'échantillon."""
+    if not valeurs:
+        return "TEXT"
+
+    if all(v.lower() in BOOLEENS for v in valeurs):
+        return "BOOLEAN"
+
+    if all(re.fullmatch(RE_ENTIER, v) for v in valeurs):
+        entiers = [int(v) for v in valeurs]
+        for type_sql, bas, haut in BORNES_ENTIERS:
+            if bas <= min(entiers) and max(entiers) <= haut:
+                return type_sql
+        return "NUMERIC"
+
+    if all(re.fullmatch(RE_ENTIER, v) or re.fullmatch(RE_DECIMAL, v) for v in valeurs):
+        decimales = max(len(re.split("[.,]", v)[1]) if re.search("[.,]", v) else 0 for v in valeurs)
+        return "NUMERIC" if decimales <= DECIMALES_NUMERIC else "DOUBLE PRECISION"
+
+    if all(re.fullmatch(RE_ENTIER, v) or re.fullmatch(RE_DECIMAL, v) or re.fullmatch(RE_FLOTTANT, v)
+           for v in valeurs):
+        return "DOUBLE PRECISION"
+
+    if all(_date_valide(v) for v in valeurs):
+        return "DATE"
+
+    return "TEXT"
+
+
+def inferer_types(valeurs_par_colonne, forces=None):
+    """Types proposés pour chaque colonne ; `forces` ({colonne: type}) l'emporte sur l'inférence."""
+    forces = forces or {}
+    types = {}
+    for col, valeurs in valeurs_par_colonne.items():
+        if col in forces:
+            types[col] = forces[col].upper()
+        else:
+            types[col] = inferer_type(valeurs)
+    return types
+
+
+# --- Expressions SQL (valeur = expression SQL du texte déjà nettoyé) ---
+
+def conversion_sql(valeur, type_sql):
+    """Expression SQL qui convertit le texte du staging vers le type de la colonne cible."""
+    type_sql = type_sql.upper()
+    if type_sql == "TEXT":
+        return valeur
+    if type_sql == "BOOLEAN":
+        return (f"CASE lower({valeur}) WHEN 'oui' THEN TRUE WHEN 'vrai' THEN TRUE "
+                f"WHEN 'non' THEN FALSE WHEN 'faux' THEN FALSE ELSE ({valeur})::boolean END")
+    if type_sql in ("NUMERIC", "DOUBLE PRECISION"):
+        return f"replace({valeur}, ',', '.')::{type_sql.lower()}"
+    if type_sql == "DATE":
+        return f"CASE WHEN {valeur} ~ '^{RE_DATE_FR}$' THEN to_date({valeur}, 'DD/MM/YYYY') ELSE ({valeur})::date END"
+    return f"({valeur})::{type_sql.lower()}"
+
+
+def test_sql(valeur, type_sql):
+    """Condition SQL vraie si la valeur (non NULL) peut être convertie sans erreur, None pour TEXT.
+
+    Un type forcé hors de ceux proposés par l'inférence (VARCHAR(10), TIMESTAMP...) est vérifié par une
+    conversion protégée : sans test, une seule valeur refusée ferait échouer tout le transfert.
+    """
+    type_sql = type_sql.upper()
+    if type_sql == "BOOLEAN":
+        booleens = ", ".join(f"'{b}'" for b in BOOLEENS)
+        return f"lower({valeur}) IN ({booleens})"
+    for type_entier, bas, haut in BORNES_ENTIERS:
+        if type_sql == type_entier:
+            return f"CASE WHEN {valeur} ~ '^{RE_ENTIER}$' THEN ({valeur})::numeric BETWEEN {bas} AND {haut} ELSE FALSE END"
+    if type_sql == "NUMERIC":
+        return f"({valeur} ~ '^{RE_ENTIER}$' OR {valeur} ~ '^{RE_DECIMAL}$')"
+    if type_sql == "DOUBLE PRECISION":
+        return f"({valeur} ~ '^{RE_ENTIER}$' OR {valeur} ~ '^{RE_DECIMAL}$' OR {valeur} ~ '^{RE_FLOTTANT}$')"
+    if type_sql == "DATE":
+        return f"pg_temp.date_valide({valeur})"
+    if type_sql == "TEXT":
+        return None
+    return f"pg_temp.conversion_valide({valeur}, '{type_sql.lower()}')"
+
+
+# Une date bien formée peut rester invalide (31/02) : seule une conversion protégée le dit. Même chose pour les
+# types forcés que test_sql ne sait pas vérifier par motif (conversion_valide)
+FONCTIONS_VALIDATION = f"""
+CREATE OR REPLACE FUNCTION pg_temp.date_valide(v TEXT) RETURNS BOOLEAN AS $$
+BEGIN
+    IF v ~ '^{RE_DATE_FR}$' THEN
+        PERFORM to_date(v, 'DD/MM/YYYY');
+    ELSIF v ~ '^{RE_DATE_ISO}$' THEN
+        PERFORM v::date;
+    ELSE
+        RETURN FALSE;
+    END IF;
+    RETURN TRUE;
+EXCEPTION WHEN others THEN
+    RETURN FALSE;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pg_temp.conversion_valide(v TEXT, type_sql TEXT) RETURNS BOOLEAN AS $$
+BEGIN
+    EXECUTE 'SELECT $1::' || type_sql USING v;
+    RETURN TRUE;
+EXCEPTION WHEN others THEN
+    RETURN FALSE;
+END
+$$ LANGUAGE plpgsql
+"""
@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Contrôle d'admission devant l'exécution des requêtes (requete_web.py), dans chaque processus :
+#  - un nombre de requêtes exécutées en même temps borné par la taille du pool, les connexions gardées entre
+#    deux requêtes (curseurs de pagination) comptant comme des requêtes en cours ;
+#  - une file d'attente bornée, avec une attente bornée, au-delà : refus (429) ;
+#  - par client, un seau de jetons (débit moyen et rafale) et un nombre de requêtes simultanées bornés.
+
+NB_CLIENTS_MAX = 10000  # Au-delà, les seaux pleins des clients inactifs sont oubliés
+
+
+class Refus(Exception):
+    """Requête refusée : `raison` pour les métriques, `reessayer` (secondes) pour l'en-tête Retry-After."""
+
+    def __init__(self, raison, reessayer, message):
+        super().__init__(message)
+        self.raison = raison
+        self.reessayer = reessayer
+
+
+class Admission:
+    def __init__(self, places, file_max, attente_max, debit_client, rafale_client, simultanees_client):
+        self.places = places
+        self.file_max = file_max
+        self.attente_max = attente_max
+        self.debit_client = debit_client
+        self.rafale_client = rafale_client
+        self.simultanees_client = simultanees_client
+        self.limites_client = True  # False : seules les limites globales s'appliquent (test de charge)
+        self.places_occupees = lambda: 0  # Places prises hors requête (connexions gardées entre deux requêtes)
+        self.en_cours = 0
+        self.en_attente = 0
+        self.seaux = {}  # client -> (jetons, instant de la dernière mise à jour)
+        self.par_client = {}  # client -> requêtes en cours ou en attente
+        self.condition = threading.Condition()
+
+    def prendre_jeton(self, client):
+        maintenant = time.monotonic()
+        jetons, mis_a_jour = self.seaux.get(client, (self.rafale_client, maintenant))
+        jetons = min(self.rafale_client, jetons + (maintenant - mis_a_jour) * self.debit_client)
+        if jetons < 1:
+            self.seaux[client] = (jetons, maintenant)
+            attente = math.ceil((1 - jetons) / self.debit_client)
+            raise Refus("debit_client", attente, f"Trop de requêtes : réessayer dans {attente} s.")
+        self.seaux[client] = (jetons - 1, maintenant)
+        if len(self.seaux) > NB_CLIENTS_MAX:
+            self.oublier_clients_inactifs(maintenant)
+
+    def oublier_clients_inactifs(self, maintenant):
+        for client, (jetons, mis_a_jour) in list(self.seaux.items()):
+            if jetons + (maintenant - mis_a_jour) * self.debit_client >= self.rafale_client:
+                del self.seaux[client]
+
+    def entrer(self, client):
+        """Attend une place (au plus attente_max secondes) ou lève Refus."""
+        with self.condition:
+            if self.limites_client:
+                self.prendre_jeton(client)
+            if self.limites_client and self.par_client.get(client, 0) >= self.simultanees_client:
+                raise Refus("simultanees_client", 1,
+                            f"Déjà {self.simultanees_client} requêtes en cours pour ce client : réessayer plus tard.")
+            if self.occupees() >= self.places and self.en_attente >= self.file_max:
+                raise Refus("file_pleine", 1, "Serveur occupé (file d'attente pleine) : réessayer plus tard.")
+
+            self.par_client[client] = self.par_client.get(client, 0) + 1
+            self.en_attente = self.en_attente + 1
+            try:
+                fin = time.monotonic() + self.attente_max
+                while self.occupees() >= self.places:
+                    reste = fin - time.monotonic()
+                    if reste <= 0:
+                        self.liberer_client(client)
+                        raise Refus("attente", 1, "Serveur occupé (attente trop longue) : réessayer plus tard.")
+                    # Réveil au moins chaque seconde : une place occupée hors requête se libère sans notify
+                    self.condition.wait(min(reste, 1))
+            finally:
+                self.en_attente = self.en_attente - 1
+            self.en_cours = self.en_cours + 1
+
+    def occupees(self):
+        return self.en_cours + self.places_occupees()
+
+    def sortir(self, client):
+        with self.condition:
+            self.en_cours = self.en_cours - 1
+            self.liberer_client(client)
+            self.condition.notify()
+
+    def liberer_client(self, client):
+        nb = self.par_client.get(client, 0) - 1
+        if nb > 0:
+            self.par_client[client] = nb
+        else:
+            self.par_client.pop(client, None)
+
+    @contextmanager
+    def admettre(self, client):
+        self.entrer(client)
+        try:
+            yield
+        finally:
+            self.sortir(client)
+
+    def etat(self):
+        with self.condition:
+            return {"en_cours": self.en_cours, "en_attente": self.en_attente}
@@ -0,0 +1,111 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Cache des résultats de requête (en mémoire du processus), utilisé par requete_web.py :
+# clé = SQL normalisé + version des données écrite par remplissage.py, donc un rechargement invalide tout.
+
+# Littéraux et identifiants entre guillemets : laissés tels quels par la normalisation
+RE_LITTERAUX = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$\$.*?\$\$)", re.DOTALL)
+# Commentaires (hors littéraux, capturés dans le groupe 1) : retirés par la normalisation
+RE_COMMENTAIRES = re.compile(RE_LITTERAUX.pattern + r"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+# Une requête qui écrit (y compris SELECT ... INTO, qui crée une table) ou dont le résultat change à chaque appel
+# n'est pas mise en cache
+RE_NON_CACHABLE = re.compile(
+    r"\b(insert|update|delete|merge|truncate|create|drop|alter|grant|revoke|copy|call|do|lock|set|into|"
+    r"nextval|setval|random|gen_random_uuid|txid_current|pg_sleep|pg_stat_\w*|now|timeofday|clock_timestamp|"
+    r"statement_timestamp|transaction_timestamp|current_timestamp|current_date|current_time|localtimestamp|"
+    r"localtime)\b"
+)
+RE_LECTURE = re.compile(r"^(select|with|values|table|execute)\b")
+# Requêtes lisibles par un curseur côté serveur : DECLARE n'accepte ni EXECUTE, ni écriture, ni plusieurs requêtes
+RE_CURSEUR = re.compile(r"^(select|with|values|table)\b")
+RE_ECRITURE = re.compile(r"\b(insert|update|delete|merge|into)\b")
+RE_ORDRE = re.compile(r"\border by\b")
+
+
+def normaliser_sql(sql):
+    """SQL sans commentaires, espaces superflus ni ';' final, en minuscules hors littéraux et identifiants
+    entre guillemets.
+
+    Les commentaires sont retirés avant de remplacer les retours à la ligne : `-- x` suivi d'une ligne ne doit
+    pas absorber cette ligne.
+    """
+    sql = RE_COMMENTAIRES.sub(lambda m: m.group(1) or " ", sql)
+    morceaux = RE_LITTERAUX.split(sql.strip().rstrip(";").strip())
+    for i in range(0, len(morceaux), 2):
+        morceaux[i] = re.sub(r"\s+", " ", morceaux[i]).lower()
+    return "".join(morceaux)
+
+
+def est_cachable(sql_normalise):
+    hors_litteraux = " ".join(RE_LITTERAUX.split(sql_normalise)[::2])
+    return bool(RE_LECTURE.match(hors_litteraux)) and not RE_NON_CACHABLE.search(hors_litteraux)
+
+
+def est_paginable(sql_normalise):
+    hors_litteraux = " ".join(RE_LITTERAUX.split(sql_normalise)[::2])
+    return (bool(RE_CURSEUR.match(hors_litteraux)) and not RE_ECRITURE.search(hors_litteraux)
+            and ";" not in hors_litteraux)
+
+
+def est_ordonne(sql_normalise):
+    """Vrai si la requête a un ORDER BY au niveau principal (hors sous-requêtes, fonctions et fenêtres).
+
+    Condition pour relire une page en réexécutant la requête ; l'ordre n'est fixé que si le tri porte sur
+    une clé unique, ce qui ne se vérifie pas ici.
+    """
+    hors_litteraux = " ".join(RE_LITTERAUX.split(sql_normalise)[::2])
+    precedent = None
+    while precedent != hors_litteraux:
+        precedent, hors_litteraux = hors_litteraux, re.sub(r"\([^()]*\)", "", hors_litteraux)
+    return bool(RE_ORDRE.search(hors_litteraux))
+
+
+class CacheResultats:
+    """Cache LRU borné en octets (taille JSON des résultats) avec durée de vie, partagé entre threads."""
+
+    def __init__(self, taille_max, duree_vie):
+        self.taille_max = taille_max
+        self.duree_vie = duree_vie
+        self.entrees = OrderedDict()  # cle -> (expiration, taille, valeur)
+        self.taille = 0
+        self.succes = 0
+        self.echecs = 0
+        self.verrou = threading.Lock()
+
+    def lire(self, cle):
+        with self.verrou:
+            entree = self.entrees.get(cle)
+            if entree is None or entree[0] < time.monotonic():
+                if entree is not None:
+                    self._retirer(cle)
+                self.echecs = self.echecs + 1
+                return None
+            self.entrees.move_to_end(cle)
+            self.succes = self.succes + 1
+            return entree[2]
+
+    def ecrire(self, cle, valeur):
+        taille = len(json.dumps(valeur, default=str))
+        if taille > self.taille_max:
+            return
+        with self.verrou:
+            if cle in self.entrees:
+                self._retirer(cle)
+            # On libère la place en retirant les entrées les moins récemment lues
+            while self.entrees and self.taille + taille > self.taille_max:
+                self._retirer(next(iter(self.entrees)))
+            self.entrees[cle] = (time.monotonic() + self.duree_vie, taille, valeur)
+            self.taille = self.taille + taille
+
+    def _retirer(self, cle):
+        _, taille, _ = self.entrees.pop(cle)
+        self.taille = self.taille - taille
+
+    def statistiques(self):
+        with self.verrou:
+            return {"hits": self.succes, "misses": self.echecs, "entries": len(self.entrees), "bytes": self.taille}
@@ -0,0 +1,257 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from cache import RE_LITTERAUX
+
+# Métriques du serveur web au format texte de Prometheus (/metrics) et journal des requêtes lentes.
+# Les valeurs sont tenues par chaque processus. Sous gunicorn (serveur.py), les processus partagent un même port
+# et Prometheus ne peut pas les interroger un par un : chacun écrit ses valeurs dans un répertoire commun
+# (Registre.partager) et /metrics, quel que soit le processus qui répond, expose leur somme.
+
+SEUILS_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Secondes
+SEUILS_LIGNES = (0, 1, 10, 100, 500, 1000, 10000, 100000)
+SEUILS_OCTETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+PERIODE_PARTAGE = 1  # Secondes entre deux écritures des valeurs d'un processus dans le répertoire commun
+
+RE_NOMBRE = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_etiquettes(etiquettes):
+    if not etiquettes:
+        return ""
+    return "{" + ",".join(f'{nom}="{echapper(valeur)}"' for nom, valeur in etiquettes) + "}"
+
+
+def cle_lue(etiquettes):
+    """Étiquettes relues en JSON (listes) remises en clé (tuple de paires)."""
+    return tuple((nom, valeur) for nom, valeur in etiquettes)
+
+
+class Compteur:
+    def __init__(self, nom, aide):
+        self.nom = nom
+        self.aide = aide
+        self.valeurs = {}  # etiquettes (tuple trié) -> valeur
+        self.verrou = threading.Lock()
+
+    def incrementer(self, valeur=1, **etiquettes):
+        cle = tuple(sorted(etiquettes.items()))
+        with self.verrou:
+            self.valeurs[cle] = self.valeurs.get(cle, 0) + valeur
+
+    def etat(self):
+        with self.verrou:
+            return [[cle, valeur] for cle, valeur in self.valeurs.items()]
+
+    @staticmethod
+    def fusionner(etats):
+        valeurs = {}
+        for etat in etats:
+            for cle, valeur in etat:
+                valeurs[cle_lue(cle)] = valeurs.get(cle_lue(cle), 0) + valeur
+        return valeurs
+
+    def exposer(self, valeurs=None):
+        """Lignes de la métrique : valeurs de ce processus, ou `valeurs` (fusionner) pour plusieurs processus."""
+        if valeurs is None:
+            valeurs = self.fusionner([self.etat()])
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} counter"]
+        for cle, valeur in valeurs.items():
+            lignes.append(f"{self.nom}{format_etiquettes(cle)} {valeur}")
+        return lignes
+
+
+class Histogramme:
+    def __init__(self, nom, aide, seuils):
+        self.nom = nom
+        self.aide = aide
+        self.seuils = seuils
+        self.valeurs = {}  # etiquettes -> (effectifs par seuil (+Inf en dernier), somme, nombre)
+        self.verrou = threading.Lock()
+
+    def observer(self, valeur, **etiquettes):
+        cle = tuple(sorted(etiquettes.items()))
+        with self.verrou:
+            effectifs, somme, nombre = self.valeurs.get(cle) or ([0] * (len(self.seuils) + 1), 0, 0)
+            effectifs[bisect.bisect_left(self.seuils, valeur)] += 1
+            self.valeurs[cle] = (effectifs, somme + valeur, nombre + 1)
+
+    def etat(self):
+        with self.verrou:
+            return [[cle, list(effectifs), somme, nombre] for cle, (effectifs, somme, nombre) in self.valeurs.items()]
+
+    @staticmethod
+    def fusionner(etats):
+        valeurs = {}
+        for etat in etats:
+            for cle, effectifs, somme, nombre in etat:
+                cumul_effectifs, cumul_somme, cumul_nombre = valeurs.get(cle_lue(cle)) or ([0] * len(effectifs), 0, 0)
+                valeurs[cle_lue(cle)] = ([a + b for a, b in zip(cumul_effectifs, effectifs)],
+                                         cumul_somme + somme, cumul_nombre + nombre)
+        return valeurs
+
+    def exposer(self, valeurs=None):
+        if valeurs is None:
+            valeurs = self.fusionner([self.etat()])
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        for cle, (effectifs, somme, nombre) in valeurs.items():
+            cumul = 0
+            for seuil, effectif in zip(list(self.seuils) + ["+Inf"], effectifs):
+                cumul = cumul + effectif
+                lignes.append(f"{self.nom}_bucket{format_etiquettes(cle + (('le', seuil),))} {cumul}")
+            lignes.append(f"{self.nom}_sum{format_etiquettes(cle)} {somme}")
+            lignes.append(f"{self.nom}_count{format_etiquettes(cle)} {nombre}")
+        return lignes
+
+
+class Jauge:
+    """Valeurs lues au moment de l'exposition : `lire()` renvoie [(etiquettes, valeur)].
+
+    `genre="counter"` pour un compteur tenu ailleurs (par exemple les succès du cache de résultats).
+    Pour plusieurs processus, les valeurs sont additionnées (connexions du pool, entrées du cache...).
+    """
+
+    def __init__(self, nom, aide, lire, genre="gauge"):
+        self.nom = nom
+        self.aide = aide
+        self.lire = lire
+        self.genre = genre
+
+    def etat(self):
+        return [[tuple(sorted(etiquettes.items())), valeur] for etiquettes, valeur in self.lire()]
+
+    fusionner = staticmethod(Compteur.fusionner)
+
+    def exposer(self, valeurs=None):
+        if valeurs is None:
+            valeurs = self.fusionner([self.etat()])
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} {self.genre}"]
+        for cle, valeur in valeurs.items():
+            lignes.append(f"{self.nom}{format_etiquettes(cle)} {valeur}")
+        return lignes
+
+
+def processus_actif(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registre:
+    def __init__(self):
+        self.metriques = []
+        self.repertoire = None  # Répertoire commun à plusieurs processus (voir partager)
+
+    def ajouter(self, metrique):
+        self.metriques.append(metrique)
+        return metrique
+
+    def partager(self, repertoire):
+        """Plusieurs processus : chacun écrira ses valeurs dans `repertoire`, vidé ici (avant le fork)."""
+        os.makedirs(repertoire, exist_ok=True)
+        for nom in os.listdir(repertoire):
+            if nom.endswith(".json"):
+                os.remove(os.path.join(repertoire, nom))
+        self.repertoire = repertoire
+
+    def ecrire_etat(self):
+        """Valeurs de ce processus dans son fichier du répertoire commun (remplacé d'un seul coup)."""
+        if self.repertoire is None:
+            return
+        chemin = os.path.join(self.repertoire, f"{os.getpid()}.json")
+        etat = {metrique.nom: metrique.etat() for metrique in self.metriques}
+        with open(chemin + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(etat, f, default=str)
+        os.replace(chemin + ".tmp", chemin)
+
+    def demarrer_partage(self):
+        """Dans un processus après le fork : ses valeurs sont écrites toutes les PERIODE_PARTAGE secondes."""
+        if self.repertoire is None:
+            return
+
+        def ecrire_en_continu():
+            while True:
+                self.ecrire_etat()
+                time.sleep(PERIODE_PARTAGE)
+
+        threading.Thread(target=ecrire_en_continu, name="metriques", daemon=True).start()
+
+    def lire_etats(self):
+        """[(processus actif, valeurs)] de chaque processus, arrêtés compris : leurs compteurs restent comptés."""
+        etats = []
+        for nom in os.listdir(self.repertoire):
+            if not nom.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.repertoire, nom), encoding="utf-8") as f:
+                    etats.append((processus_actif(int(nom[:-5])), json.load(f)))
+            except (OSError, ValueError):
+                continue  # Fichier en cours de remplacement ou illisible : ignoré pour cette lecture
+        return etats
+
+    def exposer(self):
+        lignes = []
+        if self.repertoire is None:
+            for metrique in self.metriques:
+                lignes.extend(metrique.exposer())
+            return "\n".join(lignes) + "\n"
+        self.ecrire_etat()  # Valeurs à jour pour le processus qui répond
+        etats = self.lire_etats()
+        for metrique in self.metriques:
+            # Une jauge (valeur instantanée) d'un processus arrêté n'a plus de sens ; un compteur, si
+            garder = [etat[metrique.nom] for actif, etat in etats if metrique.nom in etat
+                      and (actif or getattr(metrique, "genre", "counter") != "gauge")]
+            lignes.extend(metrique.exposer(metrique.fusionner(garder)))
+        return "\n".join(lignes) + "\n"
+
+
+def forme_requete(sql_normalise):
+    """SQL normalisé (cache.normaliser_sql) dont les chaînes et les nombres sont remplacés par '?'."""
+    morceaux = RE_LITTERAUX.split(sql_normalise)
+    for i, morceau in enumerate(morceaux):
+        if i % 2 == 0:
+            morceaux[i] = RE_NOMBRE.sub("?", morceau)
+        elif not morceau.startswith('"'):  # Les identifiants entre guillemets sont gardés
+            morceaux[i] = "?"
+    return "".join(morceaux)
+
+
+def empreinte_requete(sql_normalise):
+    """(empreinte, forme) : deux requêtes qui ne diffèrent que par leurs valeurs ont la même empreinte."""
+    forme = forme_requete(sql_normalise)
+    return hashlib.sha256(forme.encode()).hexdigest()[:16], forme
+
+
+def journal_requetes_lentes(chemin):
+    """Journal des requêtes lentes : une ligne JSON par requête, dans le fichier `chemin`."""
+    journal = logging.getLogger("sport.requetes_lentes")
+    if not journal.handlers:
+        gestionnaire = logging.FileHandler(chemin, encoding="utf-8")
+        gestionnaire.setFormatter(logging.Formatter("%(message)s"))
+        journal.addHandler(gestionnaire)
+        journal.setLevel(logging.INFO)
+        journal.propagate = False
+    return journal
+
+
+def noter_requete_lente(journal, sql_normalise, duree, **details):
+    empreinte, forme = empreinte_requete(sql_normalise)
+    journal.info(json.dumps(dict({
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fingerprint": empreinte,
+        "query": forme,
+        "duration_ms": round(duree * 1000, 1),
+    }, **details), ensure_ascii=False, default=str))
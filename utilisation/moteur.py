@@ -0,0 +1,444 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import psycopg2
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+from profil import chronometre
+
+# Moteur de requêtes commun à requete_cli.py, requete_tk.py et requete_web.py :
+#  - configuration de la base et requêtes prédéfinies en un seul endroit ;
+#  - pool de connexions réglé (pre-ping, recyclage) et réchauffé au démarrage ;
+#  - paramètres de session et requêtes prédéfinies préparées (PREPARE) à l'ouverture de chaque connexion :
+#    une requête ne paie ni l'ouverture de connexion ni la planification.
+
+# --- Configuration ---
+USER = 'postgres'
+PASSWORD = ''
+HOST = '127.0.0.1'
+PORT = 5434
+DB_NAME = 'sport'
+
+DB_URL = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
+
+TAILLE_POOL = 5  # Connexions gardées ouvertes (et ouvertes d'avance par rechauffer_pool)
+DEBORDEMENT_POOL = 10  # Connexions supplémentaires pendant un pic, fermées ensuite
+RECYCLAGE_POOL = 1800  # Une connexion plus vieille (en secondes) est renouvelée
+
+VERIFICATION_VERSION = 2  # Secondes pendant lesquelles la version des données lue en base est réutilisée
+DUREE_CATALOGUE = 300  # Secondes : le catalogue est aussi relu après ce délai (tables créées hors remplissage.py)
+TAILLE_PAGE = 500  # Lignes renvoyées par page de résultat (voir CurseurPagination et lire_page)
+DUREE_CURSEUR = 60  # Secondes sans lecture après lesquelles un curseur de pagination est fermé
+CURSEURS_MAX = 2  # Curseurs de pagination ouverts par processus (une connexion détachée du pool chacun)
+PREFIXE_REQUETE = "sport-requete:"  # application_name d'une session qui exécute une requête identifiée
+
+# Paramètres fixés sur chaque session à son ouverture
+PARAMETRES_SESSION = {
+    "work_mem": "64MB",  # Tris et GROUP BY des requêtes prédéfinies sans passer par le disque
+    "statement_timeout": "60s",  # Une requête libre trop longue est interrompue par le serveur
+    "application_name": "sport-utilisation",
+}
+
+# --- Requêtes prédéfinies (communes aux trois interfaces) ---
+PREDEFINED_QUERIES = {
+    "1": {
+        "label": "Aperçu installations (5 lignes)",
+        "sql": """
+        SELECT "numero", "nom", "commune", "dep_nom"
+        FROM "data_es_installation_updated"
+        LIMIT 5
+        """
+    },
+    "2": {
+        "label": "Top 5 types d'équipements",
+        "sql": """
+        SELECT "type", COUNT(*) AS total_equipements
+        FROM "data_es_equipement_updated"
+        GROUP BY "type"
+        ORDER BY total_equipements DESC
+        LIMIT 5
+        """
+    },
+    "3": {
+        "label": "Équipements par région",
+        "sql": """
+        SELECT i."reg_nom", COUNT(*) AS nb_equipements
+        FROM "data_es_equipement_updated" e
+        JOIN "data_es_installation_updated" i ON i."numero" = e."installation_numero"
+        GROUP BY i."reg_nom"
+        ORDER BY nb_equipements DESC
+        LIMIT 5
+        """
+    },
+    "4": {
+        "label": "Communes aux activités variées",
+        "sql": """
+        SELECT i."commune", COUNT(DISTINCT a."aps_discipline") AS nb_disciplines
+        FROM "data_es_installation_updated" i
+        JOIN "data_es_equipement_updated" e ON i."numero" = e."installation_numero"
+        JOIN "data_es_activite_updated" a ON e."numero" = a."equip_numero"
+        GROUP BY i."commune"
+        HAVING COUNT(DISTINCT a."aps_discipline") > 0
+        ORDER BY nb_disciplines DESC, i."commune"
+        LIMIT 5
+        """
+    }
+}
+
+# --- Mêmes requêtes lues dans les vues matérialisées de remplissage.py (si elles existent) ---
+REQUETES_VUES = {
+    "2": ("mv_types_equipements", """
+        SELECT "type", total_equipements
+        FROM "mv_types_equipements"
+        ORDER BY total_equipements DESC
+        LIMIT 5
+        """),
+    "3": ("mv_equipements_region", """
+        SELECT "reg_nom", nb_equipements
+        FROM "mv_equipements_region"
+        ORDER BY nb_equipements DESC
+        LIMIT 5
+        """),
+    "4": ("mv_disciplines_commune", """
+        SELECT "commune", nb_disciplines
+        FROM "mv_disciplines_commune"
+        ORDER BY nb_disciplines DESC, "commune"
+        LIMIT 5
+        """)
+}
+
+_engine = None
+_pid = None
+_version = (None, None)  # (instant de lecture, version des données)
+_catalogue = (None, None, None)  # (instant de lecture, version des données, catalogue)
+_verrou_catalogue = threading.Lock()
+_curseurs = OrderedDict()  # nom -> CurseurPagination en attente de sa page suivante, le plus ancien en premier
+_verrou_curseurs = threading.Lock()
+
+SQL_IDENTIFIER = "SELECT set_config('application_name', %s, true), set_config('statement_timeout', %s, true)"
+
+# Tables, vues et vues matérialisées du schéma public avec leurs colonnes, en une seule requête.
+# Les partitions sont omises (on interroge la table mère) ; reltuples vaut -1 tant que la table n'a pas été analysée.
+# Les tables internes du chargement (nom commençant par '_' : reprise, manifeste, version, staging) aussi.
+SQL_CATALOGUE = """
+    SELECT c.relname, c.relkind,
+           CASE WHEN c.relkind IN ('r', 'p', 'm') AND c.reltuples >= 0 THEN c.reltuples::bigint END AS lignes,
+           a.attname, format_type(a.atttypid, a.atttypmod) AS type
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm') AND NOT c.relispartition
+      AND left(c.relname, 1) <> '_'
+    ORDER BY c.relkind IN ('v', 'm'), c.relname, a.attnum
+"""
+GENRES_RELATION = {"r": "table", "p": "table", "v": "vue", "m": "vue matérialisée"}
+
+
+def nom_preparee(cle, vue=False):
+    return f"predefinie_{cle}_vue" if vue else f"predefinie_{cle}"
+
+
+def configurer_session(dbapi_conn, connection_record):
+    """À l'ouverture d'une connexion : paramètres de session, puis PREPARE de chaque requête prédéfinie."""
+    preparees = set()
+    autocommit = dbapi_conn.autocommit
+    dbapi_conn.autocommit = True  # Un PREPARE qui échoue (vue matérialisée absente) n'annule pas les autres
+    curseur = dbapi_conn.cursor()
+    try:
+        for nom, valeur in PARAMETRES_SESSION.items():
+            curseur.execute("SELECT set_config(%s, %s, false)", (nom, valeur))
+        for cle, requete in PREDEFINED_QUERIES.items():
+            versions = [(nom_preparee(cle), requete["sql"])]
+            if cle in REQUETES_VUES:
+                versions.append((nom_preparee(cle, vue=True), REQUETES_VUES[cle][1]))
+            for nom, sql in versions:
+                try:
+                    curseur.execute(f"PREPARE {nom} AS {sql}")
+                    preparees.add(nom)
+                except psycopg2.Error:
+                    pass
+    finally:
+        curseur.close()
+        dbapi_conn.autocommit = autocommit
+    connection_record.info["preparees"] = preparees
+
+
+def obtenir_engine():
+    """Moteur partagé du processus, recréé après un fork (un pool ne se partage pas entre processus)."""
+    global _engine, _pid
+    if _engine is None or _pid != os.getpid():
+        if _engine is not None:
+            _engine.dispose(close=False)  # Connexions du processus parent : ni réutilisées ni fermées ici
+        _engine = create_engine(
+            DB_URL,
+            pool_size=TAILLE_POOL,
+            max_overflow=DEBORDEMENT_POOL,
+            pool_pre_ping=True,  # Connexion coupée (redémarrage du serveur, reset de la base) remplacée sans erreur
+            pool_recycle=RECYCLAGE_POOL,
+            pool_use_lifo=True,  # On réutilise la connexion la plus récente : les autres peuvent expirer
+        )
+        event.listen(_engine, "connect", configurer_session)
+        _pid = os.getpid()
+    return _engine
+
+
+def fermer_engine():
+    """Ferme les connexions du pool de ce processus (arrêt d'un worker du serveur web, voir serveur.py)."""
+    global _engine, _pid
+    fermer_curseurs()
+    if _engine is not None and _pid == os.getpid():
+        _engine.dispose()
+    _engine = None
+    _pid = None
+
+
+def rechauffer_pool(nb=TAILLE_POOL):
+    """Ouvre d'avance `nb` connexions (paramètres et PREPARE compris) : la première requête n'attend pas."""
+    engine = obtenir_engine()
+    connexions = []
+    try:
+        for _ in range(nb):
+            connexions.append(engine.connect())
+    finally:
+        for conn in connexions:
+            conn.close()
+
+
+def utilise_vue(conn, cle):
+    if cle not in REQUETES_VUES:
+        return False
+    vue = REQUETES_VUES[cle][0]
+    return conn.execute(text("SELECT to_regclass(:vue)"), {"vue": vue}).scalar() is not None
+
+
+def requete_predefinie(conn, cle):
+    """SQL de la requête : version "vue matérialisée" si la vue existe, sinon la requête d'origine."""
+    if utilise_vue(conn, cle):
+        return REQUETES_VUES[cle][1]
+    return PREDEFINED_QUERIES[cle]["sql"]
+
+
+def executer_predefinie(conn, cle):
+    """Exécute la requête prédéfinie avec EXECUTE si elle est préparée sur cette connexion, sinon son SQL."""
+    vue = utilise_vue(conn, cle)
+    nom = nom_preparee(cle, vue)
+    preparees = conn.connection.info.get("preparees", set())
+    if nom in preparees:
+        try:
+            # Dans un point de sauvegarde : un échec n'annule pas la transaction (ni les réglages de
+            # identifier_requete, nom de session et statement_timeout)
+            with conn.begin_nested():
+                return conn.execute(text(f"EXECUTE {nom}"))
+        except DBAPIError:
+            # Tables rechargées avec d'autres types depuis le PREPARE : on repasse au SQL pour cette connexion
+            preparees.discard(nom)
+    return conn.execute(text(REQUETES_VUES[cle][1] if vue else PREDEFINED_QUERIES[cle]["sql"]))
+
+
+class CurseurPagination:
+    """Curseur côté serveur (DECLARE) gardé ouvert d'une page à la suivante, sur une connexion détachée du pool.
+
+    Créé par paginer quand la première page n'a pas tout lu. Toutes les pages viennent d'une seule exécution
+    de la requête, donc d'un même instantané : une page ne coûte que ses lignes, et aucune ligne n'est répétée
+    ou sautée même sans ORDER BY. La connexion reste en transaction entre deux pages (verrous ACCESS SHARE
+    compris) ; le serveur la ferme lui-même après DUREE_CURSEUR secondes d'inactivité
+    (idle_in_transaction_session_timeout), si ce processus ne l'a pas déjà fait.
+    """
+
+    def __init__(self, connexion, curseur, en_avance, position):
+        self.connexion = connexion
+        self.curseur = curseur
+        self.nom = curseur.name
+        self.en_avance = en_avance  # Ligne lue en plus de la page précédente (pour savoir s'il en restait)
+        self.position = position  # Lignes déjà renvoyées
+        self.lu_le = time.monotonic()
+
+    def lire(self, id_requete, delai_ms, taille=TAILLE_PAGE, temps=None):
+        """(colonnes, lignes, suite) : les `taille` lignes suivantes ; voir identifier_requete et profil.chronometre."""
+        with self.connexion.cursor() as curseur:
+            curseur.execute(SQL_IDENTIFIER, (PREFIXE_REQUETE + id_requete, str(int(delai_ms))))
+        with chronometre("lecture", temps):
+            # Une ligne de plus : on sait s'il y a une page suivante
+            lignes = self.en_avance + self.curseur.fetchmany(taille + 1 - len(self.en_avance))
+        self.en_avance = lignes[taille:]
+        lignes = lignes[:taille]
+        self.position = self.position + len(lignes)
+        self.lu_le = time.monotonic()
+        return [d[0] for d in self.curseur.description], lignes, bool(self.en_avance)
+
+    def fermer(self):
+        try:
+            self.connexion.close()
+        except psycopg2.Error:
+            pass
+
+
+def paginer(conn, sql, taille=TAILLE_PAGE, temps=None):
+    """Première page de `sql` sur `conn` (connexion du pool) : (colonnes, lignes, CurseurPagination ou None).
+
+    S'il reste des lignes, la connexion est détachée du pool (Connection.detach) et passe au curseur renvoyé :
+    la requête n'est pas réexécutée, le pool ouvrira une autre connexion à la place, et `conn` ne doit pas
+    être fermée. Sinon le curseur est fermé et `conn` reste une connexion du pool ordinaire.
+    """
+    connexion = conn.connection.dbapi_connection
+    curseur = connexion.cursor(name=f"page_{uuid.uuid4().hex}")
+    try:
+        with chronometre("exécution", temps):
+            curseur.execute(sql)
+        with chronometre("lecture", temps):
+            lignes = curseur.fetchmany(taille + 1)  # Une ligne de plus : on sait s'il y a une page suivante
+        colonnes = [d[0] for d in curseur.description]
+    except Exception:
+        curseur.close()
+        raise
+    if len(lignes) <= taille:
+        curseur.close()
+        return colonnes, lignes, None
+    # Annulé avec la transaction si la connexion retourne au pool sans avoir été détachée
+    conn.exec_driver_sql("SELECT set_config('idle_in_transaction_session_timeout', %s, false)",
+                         (f"{DUREE_CURSEUR + 5}s",))
+    conn.detach()
+    return colonnes, lignes[:taille], CurseurPagination(connexion, curseur, lignes[taille:], taille)
+
+
+def garder_curseur(curseur):
+    """Garde `curseur` pour sa page suivante ; au-delà de CURSEURS_MAX, les plus anciens sont fermés."""
+    with _verrou_curseurs:
+        _curseurs[curseur.nom] = curseur
+        a_fermer = curseurs_expires()
+        while len(_curseurs) > CURSEURS_MAX:
+            a_fermer.append(_curseurs.popitem(last=False)[1])
+    for ancien in a_fermer:
+        ancien.fermer()
+
+
+def reprendre_curseur(nom, position):
+    """Curseur `nom` s'il est ouvert dans ce processus et placé à `position` (retiré du registre), sinon None."""
+    with _verrou_curseurs:
+        a_fermer = curseurs_expires()
+        curseur = _curseurs.get(nom)
+        if curseur is not None and curseur.position == position:
+            del _curseurs[nom]
+        else:
+            curseur = None
+    for ancien in a_fermer:
+        ancien.fermer()
+    return curseur
+
+
+def curseurs_expires():
+    """Retire du registre (verrou pris) les curseurs inutilisés depuis DUREE_CURSEUR secondes."""
+    limite = time.monotonic() - DUREE_CURSEUR
+    expires = [nom for nom, curseur in _curseurs.items() if curseur.lu_le < limite]
+    return [_curseurs.pop(nom) for nom in expires]
+
+
+def nb_curseurs():
+    """Curseurs ouverts dans ce processus, ceux qui ont expiré étant fermés d'abord (voir requete_web.admission)."""
+    with _verrou_curseurs:
+        a_fermer = curseurs_expires()
+        nb = len(_curseurs)
+    for ancien in a_fermer:
+        ancien.fermer()
+    return nb
+
+
+def fermer_curseurs():
+    with _verrou_curseurs:
+        curseurs = list(_curseurs.values())
+        _curseurs.clear()
+    for curseur in curseurs:
+        curseur.fermer()
+
+
+def lire_page(conn, sql, position=0, taille=TAILLE_PAGE, temps=None):
+    """Lit `taille` lignes de `sql` à partir de la ligne `position`, en réexécutant la requête (DECLARE).
+
+    Les `position` premières lignes sont sautées par le serveur (MOVE) sans être transférées, mais calculées :
+    à n'utiliser que lorsque le curseur de la page précédente n'est plus disponible (voir paginer), et pour
+    une requête dont l'ordre est fixé. Renvoie (colonnes, lignes, suite), `suite` indiquant s'il reste
+    des lignes après cette page. `temps` : voir profil.chronometre.
+    """
+    curseur = conn.connection.dbapi_connection.cursor(name=f"page_{uuid.uuid4().hex}")
+    try:
+        curseur.itersize = taille + 1
+        with chronometre("exécution", temps):
+            curseur.execute(sql)
+            if position:
+                curseur.scroll(position)
+        with chronometre("lecture", temps):
+            lignes = curseur.fetchmany(taille + 1)  # Une ligne de plus : on sait s'il y a une page suivante
+        colonnes = [d[0] for d in curseur.description]
+    finally:
+        curseur.close()
+    return colonnes, lignes[:taille], len(lignes) > taille
+
+
+def identifier_requete(conn, id_requete, delai_ms):
+    """Nomme la session d'après la requête et borne sa durée, le temps de la transaction en cours.
+
+    Le nom (application_name, visible dans pg_stat_activity) permet à annuler_requete de retrouver la
+    session depuis n'importe quel processus. Les deux réglages disparaissent au retour de la connexion au pool.
+    """
+    conn.exec_driver_sql(SQL_IDENTIFIER, (PREFIXE_REQUETE + id_requete, str(int(delai_ms))))
+
+
+def annuler_requete(id_requete):
+    """pg_cancel_backend sur la session qui exécute `id_requete` ; renvoie le nombre de requêtes interrompues.
+
+    Connexion ouverte à part : l'annulation passe même quand toutes les connexions du pool sont occupées.
+    """
+    connexion = psycopg2.connect(DB_URL)
+    try:
+        connexion.autocommit = True
+        with connexion.cursor() as curseur:
+            curseur.execute("""
+                SELECT count(*) FILTER (WHERE pg_cancel_backend(pid)) FROM pg_stat_activity
+                WHERE datname = current_database() AND application_name = %s
+            """, (PREFIXE_REQUETE + id_requete,))
+            return curseur.fetchone()[0]
+    finally:
+        connexion.close()
+
+
+def lire_catalogue():
+    catalogue = {}
+    with obtenir_engine().connect() as conn:
+        for relation, genre, lignes, colonne, type_colonne in conn.execute(text(SQL_CATALOGUE)):
+            entree = catalogue.setdefault(relation, {"genre": GENRES_RELATION[genre], "lignes": lignes, "colonnes": []})
+            if colonne is not None:
+                entree["colonnes"].append({"nom": colonne, "type": type_colonne})
+    return catalogue
+
+
+def catalogue_schema():
+    """{relation: {"genre", "lignes" (estimation, None si inconnue), "colonnes": [{"nom", "type"}]}}.
+
+    Gardé en mémoire tant que la version des données ne change pas (et au plus DUREE_CATALOGUE secondes).
+    """
+    global _catalogue
+    version = version_donnees()
+    with _verrou_catalogue:
+        lu_le, version_lue, catalogue = _catalogue
+        if lu_le is None or version_lue != version or time.monotonic() - lu_le > DUREE_CATALOGUE:
+            catalogue = lire_catalogue()
+            _catalogue = (time.monotonic(), version, catalogue)
+    return catalogue
+
+
+def version_donnees():
+    """Version des données écrite par remplissage.py à chaque chargement (None si la base n'a jamais été chargée).
+
+    Relue en base au plus toutes les VERIFICATION_VERSION secondes.
+    """
+    global _version
+    lu_le, version = _version
+    if lu_le is None or time.monotonic() - lu_le > VERIFICATION_VERSION:
+        with obtenir_engine().connect() as conn:
+            version = None
+            if conn.execute(text("SELECT to_regclass('_version_donnees')")).scalar():
+                version = conn.execute(text("SELECT version FROM _version_donnees")).scalar()
+        _version = (time.monotonic(), version)
+    return version
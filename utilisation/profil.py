@@ -0,0 +1,110 @@
+import json
+import time
+from contextlib import contextmanager
+from sqlalchemy import text
+
+# Mode profil des trois interfaces : plan d'exécution réel (EXPLAIN ANALYZE) et durées mesurées côté client
+# (connexion, exécution, lecture, sérialisation, affichage).
+
+PART_CHAUDE = 0.2  # Un nœud qui prend au moins cette part du temps d'exécution est signalé
+NB_CHAUDS = 3  # ... ainsi que les NB_CHAUDS nœuds les plus coûteux
+EXECUTEE_DEUX_FOIS = ("Requête exécutée deux fois : sous EXPLAIN ANALYZE (transaction en lecture seule, annulée), "
+                      "puis normalement.")
+
+
+@contextmanager
+def chronometre(nom, temps):
+    """Ajoute la durée (en ms) de l'étape `nom` au dictionnaire `temps` (rien si `temps` est None)."""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        if temps is not None:
+            temps[nom] = temps.get(nom, 0) + (time.perf_counter() - debut) * 1000
+
+
+def expliquer(conn, sql):
+    """Plan réel de `sql` : {"planification", "execution" (ms, côté serveur), "noeuds"}.
+
+    EXPLAIN ANALYZE exécute vraiment la requête : réservé aux requêtes en lecture, et lancé dans un point de
+    sauvegarde en lecture seule, annulé ensuite. Une requête qui écrirait échoue au lieu d'écrire, et la
+    transaction (avec les réglages de moteur.identifier_requete) reste utilisable pour l'exécution normale.
+    """
+    point = conn.begin_nested()
+    try:
+        conn.execute(text("SET LOCAL transaction_read_only = on"))
+        resultat = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql.strip().rstrip(';')}")).scalar()
+    finally:
+        point.rollback()  # Annule aussi le SET LOCAL : la suite de la transaction peut écrire
+    if isinstance(resultat, str):
+        resultat = json.loads(resultat)
+    plan = resultat[0]
+    return {
+        "planification": plan.get("Planning Time"),
+        "execution": plan.get("Execution Time"),
+        "noeuds": noeuds_plan(plan["Plan"], plan.get("Execution Time") or 0),
+    }
+
+
+def libelle_noeud(noeud):
+    libelle = noeud["Node Type"]
+    if "Join Type" in noeud and "Join" in libelle:
+        libelle = f"{libelle} ({noeud['Join Type']})"
+    if "Relation Name" in noeud:
+        libelle = f"{libelle} sur {noeud['Relation Name']}"
+    if "Index Name" in noeud:
+        libelle = f"{libelle} via {noeud['Index Name']}"
+    return libelle
+
+
+def noeuds_plan(racine, duree_execution):
+    """Arbre du plan mis à plat (ordre d'affichage) avec le temps propre de chaque nœud.
+
+    Temps propre = temps total du nœud (sur toutes ses boucles) moins celui de ses enfants directs.
+    """
+    noeuds = []
+
+    def parcourir(noeud, profondeur):
+        boucles = noeud.get("Actual Loops") or 1
+        total = (noeud.get("Actual Total Time") or 0) * boucles
+        enfants = noeud.get("Plans", [])
+        total_enfants = sum((e.get("Actual Total Time") or 0) * (e.get("Actual Loops") or 1) for e in enfants)
+        entree = {
+            "profondeur": profondeur,
+            "noeud": libelle_noeud(noeud),
+            "lignes": (noeud.get("Actual Rows") or 0) * boucles,
+            "lignes_estimees": noeud.get("Plan Rows"),
+            "temps_total": round(total, 3),
+            "temps_propre": round(max(total - total_enfants, 0), 3),
+            "blocs_lus": noeud.get("Shared Read Blocks", 0),
+            "blocs_cache": noeud.get("Shared Hit Blocks", 0),
+            "chaud": False,
+        }
+        noeuds.append(entree)
+        for enfant in enfants:
+            parcourir(enfant, profondeur + 1)
+
+    parcourir(racine, 0)
+    plus_couteux = {id(n) for n in sorted(noeuds, key=lambda n: n["temps_propre"], reverse=True)[:NB_CHAUDS]}
+    for entree in noeuds:
+        entree["part"] = entree["temps_propre"] / duree_execution if duree_execution else 0
+        entree["chaud"] = entree["temps_propre"] > 0 and (id(entree) in plus_couteux or entree["part"] >= PART_CHAUDE)
+    return noeuds
+
+
+def formater_temps(temps):
+    return "  ".join(f"{nom} {duree:.1f} ms" for nom, duree in temps.items())
+
+
+def formater_plan(profil):
+    """Plan en texte (console) : une ligne par nœud, indentée, les nœuds chauds marqués d'un '>>'."""
+    lignes = [EXECUTEE_DEUX_FOIS,
+              f"Planification {profil['planification']:.1f} ms, exécution {profil['execution']:.1f} ms (serveur)"]
+    for n in profil["noeuds"]:
+        marque = ">>" if n["chaud"] else "  "
+        lignes.append(
+            f"{marque} {'  ' * n['profondeur']}{n['noeud']} : {n['temps_propre']:.1f} ms propres "
+            f"({n['part']:.0%}), {n['lignes']} lignes (estimées {n['lignes_estimees']}), "
+            f"blocs {n['blocs_cache']} en cache / {n['blocs_lus']} lus"
+        )
+    return "\n".join(lignes)
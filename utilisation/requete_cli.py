@@ -1,57 +1,26 @@
-from sqlalchemy import create_engine, text
+import argparse
+from sqlalchemy import text
+from cache import est_paginable, normaliser_sql
+from moteur import DB_NAME, PREDEFINED_QUERIES, executer_predefinie, obtenir_engine, requete_predefinie
+from profil import chronometre, expliquer, formater_plan, formater_temps
 
-# --- Configuration ---
-USER = 'postgres'
-PASSWORD = ''
-HOST = '127.0.0.1'
-PORT = 5434
-DB_NAME = 'sport'
-
-# --- Dictionnaire des requêtes prédéfinies ---
-PREDEFINED_QUERIES = {
-    1: """
-    SELECT "numero", "nom", "commune", "dep_nom"
-    FROM "data_es_installation_updated"
-    LIMIT 5
-    """,
-    2: """
-    SELECT "type", COUNT(*) AS total_equipements
-    FROM "data_es_equipement_updated"
-    GROUP BY "type"
-    ORDER BY total_equipements DESC
-    LIMIT 5
-    """,
-    3: """
-    SELECT i."reg_nom", COUNT(*) AS nb_equipements
-    FROM "data_es_equipement_updated" e
-    JOIN "data_es_installation_updated" i ON i."numero" = e."installation_numero"
-    GROUP BY i."reg_nom"
-    ORDER BY nb_equipements DESC
-    LIMIT 5
-    """,
-    4: """
-    SELECT i."commune", COUNT(DISTINCT a."aps_discipline") AS nb_disciplines
-    FROM "data_es_installation_updated" i
-    JOIN "data_es_equipement_updated" e ON i."numero" = e."installation_numero"
-    JOIN "data_es_activite_updated" a ON e."numero" = a."equip_numero"
-    GROUP BY i."commune"
-    HAVING COUNT(DISTINCT a."aps_discipline") > 0
-    ORDER BY nb_disciplines DESC, i."commune"
-    LIMIT 5
-    """
-}
+def lire_arguments():
+    parser = argparse.ArgumentParser(description=f"Requêtes SQL sur la base '{DB_NAME}'.")
+    parser.add_argument("--profil", action="store_true",
+                        help="affiche aussi le plan d'exécution réel (EXPLAIN ANALYZE) et la durée de chaque étape")
+    return parser.parse_args()
 
 def main():
-    # Connexion
-    url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
-    engine = create_engine(url)
+    args = lire_arguments()
+    # Connexion (pool et requêtes préparées : voir moteur.py)
+    engine = obtenir_engine()
 
     # --- Menu Console ---
     print(f"--- Menu Requetes SQL ({DB_NAME}) ---")
     print("0 : Ecrire une requete manuelle")
     for num, q in PREDEFINED_QUERIES.items():
         # On affiche juste la première ligne de la requête pour info
-        preview = q.strip().split('\n')[0]
+        preview = q["sql"].strip().split('\n')[0]
         print(f"{num} : {preview}...")
     
     try:
@@ -65,18 +34,34 @@ def main():
     
     if choix == 0:
         sql_query = input("Entrez votre requete SQL : ")
-    elif choix in PREDEFINED_QUERIES:
-        sql_query = PREDEFINED_QUERIES[choix]
-        print(f"\nRequete selectionnee :\n{sql_query}")
+    elif str(choix) in PREDEFINED_QUERIES:
+        sql_query = None  # choisie à la connexion (vue matérialisée ou requête d'origine)
     else:
         print("Choix invalide.")
         return
 
     # --- Execution ---
+    temps = {} if args.profil else None  # Durées des étapes (ms), en mode profil
+    profil = None
     try:
-        with engine.connect() as conn:
-            print("-" * 80)
-            result = conn.execute(text(sql_query))
+        with chronometre("connexion", temps):
+            conn = engine.connect()
+        with conn:
+            if sql_query is None:
+                sql_predefinie = requete_predefinie(conn, str(choix))
+                print(f"\nRequete selectionnee :\n{sql_predefinie}")
+                print("-" * 80)
+                if args.profil:
+                    profil = expliquer(conn, sql_predefinie)
+                with chronometre("exécution", temps):
+                    result = executer_predefinie(conn, str(choix))
+            else:
+                print("-" * 80)
+                # EXPLAIN ANALYZE exécute la requête : seulement pour une requête en lecture
+                if args.profil and est_paginable(normaliser_sql(sql_query)):
+                    profil = expliquer(conn, sql_query)
+                with chronometre("exécution", temps):
+                    result = conn.execute(text(sql_query))
 
             # Si la requête ne retourne rien (ex: UPDATE/DELETE), on s'arrête là
             if not result.returns_rows:
@@ -89,13 +74,20 @@ def main():
             print("-" * 80)
 
             # Affichage des données
-            rows = result.fetchall()
-            for row in rows:
-                print(row)
+            with chronometre("lecture", temps):
+                rows = result.fetchall()
+            with chronometre("affichage", temps):
+                for row in rows:
+                    print(row)
 
             print("-" * 80)
             print(f"Total : {len(rows)} ligne(s).")
 
+        if args.profil:
+            print("-" * 80)
+            print(formater_plan(profil) if profil else "Plan non disponible (requête qui n'est pas en lecture).")
+            print(f"Client : {formater_temps(temps)}")
+
     except Exception as e:
         print(f"Erreur SQL : {e}")
 
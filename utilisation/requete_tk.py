@@ -1,47 +1,23 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-from sqlalchemy import create_engine, text, inspect
-
-# --- Configuration ---
-USER = 'postgres'
-PASSWORD = ''
-HOST = '127.0.0.1'
-PORT = 5434
-DB_NAME = 'sport'
-
-# --- Requêtes Prédéfinies ---
-PREDEFINED_QUERIES = {
-    "1. Aperçu installations (5 lignes)": """
-    SELECT "numero", "nom", "commune", "dep_nom"
-    FROM "data_es_installation_updated"
-    LIMIT 5
-    """,
-    "2. Top 5 types d'équipements": """
-    SELECT "type", COUNT(*) AS total_equipements
-    FROM "data_es_equipement_updated"
-    GROUP BY "type"
-    ORDER BY total_equipements DESC
-    LIMIT 5
-    """,
-    "3. Équipements par région": """
-    SELECT i."reg_nom", COUNT(*) AS nb_equipements
-    FROM "data_es_equipement_updated" e
-    JOIN "data_es_installation_updated" i ON i."numero" = e."installation_numero"
-    GROUP BY i."reg_nom"
-    ORDER BY nb_equipements DESC
-    LIMIT 5
-    """,
-    "4. Communes aux activités variées": """
-    SELECT i."commune", COUNT(DISTINCT a."aps_discipline") AS nb_disciplines
-    FROM "data_es_installation_updated" i
-    JOIN "data_es_equipement_updated" e ON i."numero" = e."installation_numero"
-    JOIN "data_es_activite_updated" a ON e."numero" = a."equip_numero"
-    GROUP BY i."commune"
-    HAVING COUNT(DISTINCT a."aps_discipline") > 0
-    ORDER BY nb_disciplines DESC, i."commune"
-    LIMIT 5
-    """
-}
+from sqlalchemy import text
+from cache import est_paginable, normaliser_sql
+from moteur import (DB_NAME, PREDEFINED_QUERIES, catalogue_schema, executer_predefinie, obtenir_engine,
+                    rechauffer_pool, requete_predefinie)
+from profil import EXECUTEE_DEUX_FOIS, chronometre, expliquer, formater_temps
+
+# Libellés du menu des requêtes prédéfinies -> clé dans PREDEFINED_QUERIES
+LIBELLES_PREDEFINIES = {f"{cle}. {requete['label']}": cle for cle, requete in PREDEFINED_QUERIES.items()}
+
+# Exécution en arrière-plan : un thread lit les lignes par lots, la boucle Tk les insère par petits morceaux
+TAILLE_LOT = 500  # Lignes lues par aller-retour avec le serveur
+LOTS_EN_ATTENTE = 20  # Lots lus d'avance au plus (le thread attend que le tableau suive)
+LOTS_PAR_PASSAGE = 2  # Lots insérés dans le tableau à chaque passage de la boucle Tk
+INTERVALLE_LECTURE = 30  # Millisecondes entre deux passages
+LIMITE_AFFICHAGE = 100000  # Au-delà, la lecture s'arrête : le Treeview ne tient pas des millions de lignes
+
 
 class SportDBApp:
     def __init__(self, root):
@@ -50,9 +26,12 @@ class SportDBApp:
         self.root.geometry("900x600")
         self.configure_tree_style()
 
-        # Connexion
-        self.url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
-        self.engine = create_engine(self.url)
+        # Connexion : pool partagé (moteur.py), ouvert d'avance pour que la première requête soit immédiate
+        self.engine = obtenir_engine()
+        try:
+            rechauffer_pool()
+        except Exception as e:
+            print(f"Erreur connexion : {e}")
         
         # Layout principal
         self.main_frame = ttk.Frame(root, padding="10")
@@ -77,6 +56,20 @@ class SportDBApp:
         self.notebook.add(self.tab_free, text="Custom")
         self.setup_tab_free()
 
+        # Exécution en cours : barre de progression, nombre de lignes reçues et annulation
+        self.execution = None
+        self.status_frame = ttk.Frame(self.main_frame)
+        self.status_frame.pack(fill=tk.X, pady=(0, 5))
+        self.progress = ttk.Progressbar(self.status_frame, mode="indeterminate", length=150)
+        self.progress.pack(side=tk.LEFT)
+        self.lbl_status = ttk.Label(self.status_frame, text="")
+        self.lbl_status.pack(side=tk.LEFT, padx=10)
+        self.btn_cancel = ttk.Button(self.status_frame, text="Annuler", command=self.annuler_requete, state="disabled")
+        self.btn_cancel.pack(side=tk.RIGHT)
+        # Mode profil : plan réel (EXPLAIN ANALYZE) et durée de chaque étape, affichés dans une fenêtre à part
+        self.var_profil = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.status_frame, text="Profil", variable=self.var_profil).pack(side=tk.RIGHT, padx=10)
+
         # Zone du bas : Résultats (Treeview)
         self.tree_frame = ttk.LabelFrame(self.main_frame, text="Résultats", padding="5")
         self.tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -105,7 +98,7 @@ class SportDBApp:
         lbl = ttk.Label(frame, text="Choisissez une requête :")
         lbl.pack(side=tk.LEFT, padx=5)
 
-        self.combo_predef = ttk.Combobox(frame, values=list(PREDEFINED_QUERIES.keys()), width=50, state="readonly")
+        self.combo_predef = ttk.Combobox(frame, values=list(LIBELLES_PREDEFINIES), width=50, state="readonly")
         self.combo_predef.current(0)
         self.combo_predef.pack(side=tk.LEFT, padx=5)
         self.combo_predef.bind("<<ComboboxSelected>>", self.update_predef_preview)
@@ -158,10 +151,10 @@ class SportDBApp:
     # --- Logique ---
 
     def load_db_metadata(self):
-        """Charge la liste des tables pour le Builder."""
+        """Charge la liste des tables pour le Builder (catalogue en cache, voir moteur.py)."""
         try:
-            insp = inspect(self.engine)
-            tables = insp.get_table_names()
+            # Les vues comptent aussi : avec remplissage.py --dimensions, les tables data_es_* sont des vues
+            tables = list(catalogue_schema())
             self.combo_tables['values'] = tables
             if tables:
                 self.combo_tables.current(0)
@@ -183,10 +176,22 @@ class SportDBApp:
         style.configure("Treeview.Heading", font=("Arial", 10, "bold"), foreground="#111111")
         style.map("Treeview", background=[("selected", "#e5e5ff")])
 
+    def requete_predefinie(self, key):
+        """Version "vue matérialisée" de la requête si la vue existe, sinon la requête d'origine."""
+        cle = LIBELLES_PREDEFINIES.get(key)
+        if cle is None:
+            return ""
+        try:
+            with self.engine.connect() as conn:
+                return requete_predefinie(conn, cle)
+        except Exception as e:
+            print(f"Erreur lecture vues : {e}")
+        return PREDEFINED_QUERIES[cle]["sql"]
+
     def update_predef_preview(self, event=None):
         """Affiche l'aperçu SQL de la requête prédéfinie sélectionnée."""
         key = self.combo_predef.get()
-        sql = PREDEFINED_QUERIES.get(key, "").strip()
+        sql = self.requete_predefinie(key).strip()
         self.txt_predef_preview.configure(state="normal")
         self.txt_predef_preview.delete("1.0", tk.END)
         self.txt_predef_preview.insert(tk.END, sql)
@@ -198,8 +203,8 @@ class SportDBApp:
         if not table_name: return
         
         try:
-            insp = inspect(self.engine)
-            cols = [c['name'] for c in insp.get_columns(table_name)]
+            entree = catalogue_schema().get(table_name)
+            cols = [c['nom'] for c in entree['colonnes']] if entree else []
             # Ajout de l'option "Toutes (*)"
             cols.insert(0, "*") 
             self.combo_columns['values'] = cols
@@ -209,8 +214,8 @@ class SportDBApp:
 
     def run_predefined(self):
         key = self.combo_predef.get()
-        sql_query = PREDEFINED_QUERIES[key]
-        self.execute_query(sql_query)
+        if key in LIBELLES_PREDEFINIES:
+            self.execute_query(None, cle_predefinie=LIBELLES_PREDEFINIES[key])
 
     def run_builder(self):
         table = self.combo_tables.get()
@@ -239,42 +244,195 @@ class SportDBApp:
         # Conversion approximative caractères -> pixels
         return min(max(90, max_len * 7), 260)
 
-    def execute_query(self, sql_query):
-        """Exécute la requête et met à jour le tableau."""
+    def execute_query(self, sql_query, cle_predefinie=None):
+        """Lance la requête (ou la requête prédéfinie préparée `cle_predefinie`) dans un thread.
+
+        La fenêtre reste réactive : les lignes arrivent par lots et sont insérées par lire_resultats.
+        """
+        self.annuler_requete(afficher=False)
+
         # Nettoyer le tableau
         self.tree.delete(*self.tree.get_children())
         self.tree["columns"] = []
 
+        self.execution = {
+            "file": queue.Queue(maxsize=LOTS_EN_ATTENTE),
+            "annulee": threading.Event(),
+            "connexion": None,  # Connexion psycopg2 du thread, pour annuler la requête côté serveur
+            "colonnes": None,
+            "nb": 0,
+            "limite": False,  # Lecture arrêtée à LIMITE_AFFICHAGE lignes
+            "temps": {} if self.var_profil.get() else None,  # Durées des étapes (ms), en mode profil
+            "plan": None,
+        }
+        self.progress.start(10)
+        self.lbl_status.configure(text="Exécution...")
+        self.btn_cancel.configure(state="normal")
+        threading.Thread(target=self.executer_en_arriere_plan, args=(self.execution, sql_query, cle_predefinie),
+                         daemon=True).start()
+        self.root.after(INTERVALLE_LECTURE, self.lire_resultats, self.execution)
+
+    def executer_en_arriere_plan(self, execution, sql_query, cle_predefinie):
+        """Thread d'exécution : envoie ("colonnes" | "lignes" | "info" | "erreur" | "limite" | "fin", contenu) dans la file."""
+        file = execution["file"]
+        temps = execution["temps"]
         try:
-            with self.engine.connect() as conn:
-                result = conn.execute(text(sql_query))
-                
-                if not result.returns_rows:
-                    messagebox.showinfo("Succès", "Requête exécutée (pas de retour de données).")
+            with chronometre("connexion", temps):
+                conn = self.engine.connect()
+            with conn:
+                execution["connexion"] = conn.connection.dbapi_connection
+                if execution["annulee"].is_set():
                     return
+                paginable = cle_predefinie is None and est_paginable(normaliser_sql(sql_query))
+                # EXPLAIN ANALYZE exécute la requête : seulement pour une requête en lecture
+                if temps is not None and (cle_predefinie is not None or paginable):
+                    execution["plan"] = expliquer(conn, requete_predefinie(conn, cle_predefinie)
+                                                  if cle_predefinie is not None else sql_query)
+                with chronometre("exécution", temps):
+                    if cle_predefinie is not None:
+                        result = executer_predefinie(conn, cle_predefinie)
+                    elif paginable:
+                        # Curseur côté serveur : les lignes arrivent par lots, sans tout charger en mémoire
+                        result = conn.execution_options(stream_results=True).execute(text(sql_query.strip().rstrip(";")))
+                    else:
+                        result = conn.execute(text(sql_query))
 
-                # Configuration des colonnes
-                headers = list(result.keys())
-                self.tree["columns"] = headers
-                self.tree["show"] = "headings" # Cache la colonne d'index vide
-
-                rows = result.fetchall()
-                if not rows:
-                    messagebox.showinfo("Résultat", "Aucune ligne retournée.")
+                if not result.returns_rows:
+                    file.put(("info", "Requête exécutée (pas de retour de données)."))
                     return
 
-                for idx, col in enumerate(headers):
-                    width = self._compute_column_width(col, rows, idx)
+                file.put(("colonnes", list(result.keys())))
+                nb = 0
+                lots = result.partitions(TAILLE_LOT)
+                while True:
+                    with chronometre("lecture", temps):
+                        lot = next(lots, None)
+                    if lot is None or execution["annulee"].is_set():
+                        break
+                    file.put(("lignes", [list(row) for row in lot]))
+                    nb = nb + len(lot)
+                    if nb >= LIMITE_AFFICHAGE:
+                        file.put(("limite", nb))
+                        break
+        except Exception as e:
+            # Une requête annulée se termine par une erreur QueryCanceled : elle n'est pas affichée
+            if not execution["annulee"].is_set():
+                file.put(("erreur", str(e)))
+        finally:
+            execution["connexion"] = None
+            file.put(("fin", None))
+
+    def annuler_requete(self, afficher=True):
+        """Arrête la lecture et interrompt la requête sur le serveur (équivalent de pg_cancel_backend)."""
+        execution = self.execution
+        if execution is None or execution["annulee"].is_set():
+            return
+        execution["annulee"].set()
+        connexion = execution["connexion"]
+        if connexion is not None:
+            try:
+                connexion.cancel()
+            except Exception as e:
+                print(f"Erreur annulation : {e}")
+        if afficher:
+            self.progress.stop()
+            self.btn_cancel.configure(state="disabled")
+            self.lbl_status.configure(text=f"Requête annulée ({execution['nb']} lignes reçues).")
+
+    def lire_resultats(self, execution):
+        """Vide la file du thread par petits morceaux, puis se replanifie avec root.after jusqu'au message "fin"."""
+        courante = execution is self.execution and not execution["annulee"].is_set()
+        lus = 0
+        while not courante or lus < LOTS_PAR_PASSAGE:
+            try:
+                message, contenu = execution["file"].get_nowait()
+            except queue.Empty:
+                break
+            if message == "fin":
+                if courante:
+                    self.terminer_execution(execution)
+                return
+            if courante:
+                self.traiter_message(execution, message, contenu)
+                lus = lus + (message == "lignes")
+        # Une exécution annulée est vidée sans affichage : son thread ne reste pas bloqué sur la file pleine
+        self.root.after(INTERVALLE_LECTURE, self.lire_resultats, execution)
+
+    def traiter_message(self, execution, message, contenu):
+        if message == "colonnes":
+            execution["colonnes"] = contenu
+            self.tree["columns"] = contenu
+            self.tree["show"] = "headings" # Cache la colonne d'index vide
+        elif message == "lignes":
+            if execution["nb"] == 0:
+                # Largeurs calculées sur le premier lot
+                for idx, col in enumerate(execution["colonnes"]):
+                    width = self._compute_column_width(col, contenu, idx)
                     self.tree.heading(col, text=col)
                     self.tree.column(col, width=width, anchor="w", stretch=True)
-
-                # Insertion des données (en alternant la couleur pour la lisibilité)
-                for i, row in enumerate(rows):
+            # Insertion des données (en alternant la couleur pour la lisibilité)
+            with chronometre("affichage", execution["temps"]):
+                for i, row in enumerate(contenu, start=execution["nb"]):
                     tag = "odd" if i % 2 else "even"
-                    self.tree.insert("", tk.END, values=list(row), tags=(tag,))
-                
-        except Exception as e:
-            messagebox.showerror("Erreur SQL", str(e))
+                    self.tree.insert("", tk.END, values=row, tags=(tag,))
+            execution["nb"] = execution["nb"] + len(contenu)
+            self.lbl_status.configure(text=f"{execution['nb']} lignes reçues...")
+        elif message == "info":
+            messagebox.showinfo("Succès", contenu)
+        elif message == "erreur":
+            messagebox.showerror("Erreur SQL", contenu)
+        elif message == "limite":
+            execution["limite"] = True
+
+    def terminer_execution(self, execution):
+        self.progress.stop()
+        self.btn_cancel.configure(state="disabled")
+        if execution["colonnes"] is None:
+            self.lbl_status.configure(text="")
+        elif execution["nb"] == 0:
+            self.lbl_status.configure(text="")
+            messagebox.showinfo("Résultat", "Aucune ligne retournée.")
+        elif execution["limite"]:
+            self.lbl_status.configure(text=f"{execution['nb']} lignes (affichage limité à {LIMITE_AFFICHAGE} lignes).")
+        else:
+            self.lbl_status.configure(text=f"{execution['nb']} lignes.")
+        if execution["temps"] is not None:
+            self.afficher_profil(execution["plan"], execution["temps"])
+
+    def afficher_profil(self, plan, temps):
+        """Fenêtre du mode profil : durées côté client, puis arbre du plan avec les nœuds les plus coûteux surlignés."""
+        fenetre = tk.Toplevel(self.root)
+        fenetre.title("Profil de la requête")
+        fenetre.geometry("900x400")
+        cadre = ttk.Frame(fenetre, padding="10")
+        cadre.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(cadre, text=f"Client : {formater_temps(temps)}").pack(anchor="w")
+        if plan is None:
+            ttk.Label(cadre, text="Plan non disponible (requête qui n'est pas en lecture).").pack(anchor="w")
+            return
+        ttk.Label(cadre, text=EXECUTEE_DEUX_FOIS).pack(anchor="w")
+        ttk.Label(cadre, text=f"Serveur : planification {plan['planification']:.1f} ms, "
+                              f"exécution {plan['execution']:.1f} ms").pack(anchor="w", pady=(0, 5))
+
+        colonnes = ("propre", "part", "lignes", "estimees", "blocs")
+        arbre = ttk.Treeview(cadre, columns=colonnes)
+        arbre.heading("#0", text="Nœud")
+        arbre.column("#0", width=330)
+        for col, titre in zip(colonnes, ("Temps propre (ms)", "Part", "Lignes", "Estimées", "Blocs cache / lus")):
+            arbre.heading(col, text=titre)
+            arbre.column(col, width=110, anchor="e")
+        arbre.tag_configure("chaud", background="#ffd6d6", foreground="#111111")
+        arbre.pack(fill=tk.BOTH, expand=True)
+
+        parents = []  # parents[p] : dernier nœud inséré à la profondeur p
+        for n in plan["noeuds"]:
+            del parents[n["profondeur"]:]
+            item = arbre.insert(parents[-1] if parents else "", tk.END, text=n["noeud"], open=True,
+                                values=(f"{n['temps_propre']:.1f}", f"{n['part']:.0%}", n["lignes"],
+                                        n["lignes_estimees"], f"{n['blocs_cache']} / {n['blocs_lus']}"),
+                                tags=("chaud",) if n["chaud"] else ())
+            parents.append(item)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,67 +1,271 @@
+import base64
+import csv
+import functools
+import hashlib
+import io
+import json
 import os
-from flask import Flask, render_template_string, request, jsonify
-from sqlalchemy import create_engine, text, inspect
-
-# --- Configuration ---
-USER = 'postgres'
-PASSWORD = ''
-HOST = '127.0.0.1'
-PORT = 5434
-DB_NAME = 'sport'
+import re
+import time
+import unicodedata
+import uuid
+import zlib
+from flask import Flask, Response, g, render_template_string, request, jsonify
+from sqlalchemy import text
+from admission import Admission, Refus
+from cache import CacheResultats, est_cachable, est_ordonne, est_paginable, normaliser_sql
+from metriques import (SEUILS_DUREE, SEUILS_LIGNES, SEUILS_OCTETS, Compteur, Histogramme, Jauge, Registre,
+                       journal_requetes_lentes, noter_requete_lente)
+from profil import chronometre, expliquer
+from transport import TYPE_COLONNES, compresser, encoder_resultat
+from moteur import (DB_NAME, PREDEFINED_QUERIES, TAILLE_PAGE, TAILLE_POOL, annuler_requete, catalogue_schema,
+                    executer_predefinie, garder_curseur, identifier_requete, lire_page, nb_curseurs, obtenir_engine,
+                    paginer, rechauffer_pool, reprendre_curseur, requete_predefinie, version_donnees)
 
 # Configuration de l'app Flask
 app = Flask(__name__)
 
-# Connexion Base de Données
-db_url = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DB_NAME}"
-engine = create_engine(db_url)
-
-# --- Requêtes Prédéfinies (mêmes que dans le script Tkinter) ---
-PREDEFINED_QUERIES = {
-    "1": {
-        "label": "Aperçu installations (5 lignes)",
-        "sql": """
-        SELECT "numero", "nom", "commune", "dep_nom"
-        FROM "data_es_installation_updated"
-        LIMIT 5
-        """
-    },
-    "2": {
-        "label": "Top 5 types d'équipements",
-        "sql": """
-        SELECT "type", COUNT(*) AS total_equipements
-        FROM "data_es_equipement_updated"
-        GROUP BY "type"
-        ORDER BY total_equipements DESC
-        LIMIT 5
-        """
-    },
-    "3": {
-        "label": "Équipements par région",
-        "sql": """
-        SELECT i."reg_nom", COUNT(*) AS nb_equipements
-        FROM "data_es_equipement_updated" e
-        JOIN "data_es_installation_updated" i ON i."numero" = e."installation_numero"
-        GROUP BY i."reg_nom"
-        ORDER BY nb_equipements DESC
-        LIMIT 5
-        """
-    },
-    "4": {
-        "label": "Communes aux activités variées",
-        "sql": """
-        SELECT i."commune", COUNT(DISTINCT a."aps_discipline") AS nb_disciplines
-        FROM "data_es_installation_updated" i
-        JOIN "data_es_equipement_updated" e ON i."numero" = e."installation_numero"
-        JOIN "data_es_activite_updated" a ON e."numero" = a."equip_numero"
-        GROUP BY i."commune"
-        HAVING COUNT(DISTINCT a."aps_discipline") > 0
-        ORDER BY nb_disciplines DESC, i."commune"
-        LIMIT 5
-        """
-    }
+# Cache des résultats de /execute (voir cache.py) : invalidé à chaque chargement par remplissage.py
+CACHE_TAILLE_MAX = 64 * 1024 * 1024  # Octets (taille JSON des résultats gardés)
+CACHE_DUREE_VIE = 300  # Secondes
+cache_resultats = CacheResultats(CACHE_TAILLE_MAX, CACHE_DUREE_VIE)
+
+# Chaque exécution porte un identifiant (choisi par la page, sinon par le serveur) : /cancel l'interrompt
+DELAI_REQUETE = 30000  # statement_timeout (ms) d'une requête de /execute ou /export ; la page peut demander moins
+RE_ID_REQUETE = re.compile(r"^[A-Za-z0-9-]{1,40}$")
+
+# Contrôle d'admission de /execute et /export (voir admission.py), propre à chaque processus
+ADMISSION_PLACES = TAILLE_POOL  # Requêtes exécutées en même temps : une par connexion gardée dans le pool
+ADMISSION_FILE_MAX = 20  # Requêtes en attente d'une place ; au-delà, refus immédiat (429)
+ADMISSION_ATTENTE_MAX = 10  # Secondes d'attente d'une place avant refus (429)
+DEBIT_CLIENT = 2  # Requêtes par seconde en moyenne pour un client (adresse IP)...
+RAFALE_CLIENT = 10  # ... avec des rafales jusqu'à ce nombre
+SIMULTANEES_CLIENT = 2  # Requêtes en cours ou en attente pour un même client
+admission = Admission(ADMISSION_PLACES, ADMISSION_FILE_MAX, ADMISSION_ATTENTE_MAX,
+                      DEBIT_CLIENT, RAFALE_CLIENT, SIMULTANEES_CLIENT)
+# Un curseur de pagination garde sa connexion entre deux pages : il occupe une place (moteur.CURSEURS_MAX au plus)
+admission.places_occupees = nb_curseurs
+
+# Export (/export) : lignes lues par lots sur un curseur côté serveur et envoyées au fil de l'eau
+EXPORT_LOT = 5000  # Lignes par aller-retour avec le serveur (et par morceau envoyé)
+FORMATS_EXPORT = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
 }
 
+# Métriques (/metrics, format Prometheus) et journal des requêtes lentes (voir metriques.py)
+SEUIL_REQUETE_LENTE = 1.0  # Secondes : une exécution plus longue est notée dans le journal
+FICHIER_REQUETES_LENTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requetes_lentes.log")
+journal_lent = journal_requetes_lentes(FICHIER_REQUETES_LENTES)
+
+def etat_pool():
+    pool = obtenir_engine().pool
+    return [({"etat": "utilisees"}, pool.checkedout()), ({"etat": "libres"}, pool.checkedin()),
+            ({"etat": "debordement"}, max(pool.overflow(), 0))]
+
+def statistique_cache(nom):
+    return lambda: [({}, cache_resultats.statistiques()[nom])]
+
+registre = Registre()
+requetes_http = registre.ajouter(Compteur("sport_http_requests_total", "Requêtes HTTP par route et code de réponse."))
+erreurs_http = registre.ajouter(Compteur("sport_http_errors_total", "Réponses en erreur (code >= 400) par route."))
+duree_http = registre.ajouter(Histogramme("sport_http_request_duration_seconds",
+                                          "Durée de traitement des requêtes HTTP.", SEUILS_DUREE))
+lignes_renvoyees = registre.ajouter(Histogramme("sport_response_rows", "Lignes renvoyées par réponse.", SEUILS_LIGNES))
+octets_renvoyes = registre.ajouter(Histogramme("sport_response_bytes", "Taille des réponses (après compression).",
+                                               SEUILS_OCTETS))
+attente_pool = registre.ajouter(Histogramme("sport_pool_checkout_wait_seconds",
+                                            "Attente pour obtenir une connexion du pool.", SEUILS_DUREE))
+registre.ajouter(Jauge("sport_pool_connections", "Connexions du pool par état.", etat_pool))
+registre.ajouter(Jauge("sport_page_cursors", "Curseurs de pagination ouverts (une connexion détachée du pool chacun).",
+                       lambda: [({}, nb_curseurs())]))
+registre.ajouter(Jauge("sport_cache_hits_total", "Lectures servies par le cache de résultats.",
+                       statistique_cache("hits"), genre="counter"))
+registre.ajouter(Jauge("sport_cache_misses_total", "Lectures absentes du cache de résultats.",
+                       statistique_cache("misses"), genre="counter"))
+registre.ajouter(Jauge("sport_cache_entries", "Résultats gardés dans le cache.", statistique_cache("entries")))
+refus_admission = registre.ajouter(Compteur("sport_admission_refusals_total",
+                                            "Requêtes refusées (429) par le contrôle d'admission, par raison."))
+registre.ajouter(Jauge("sport_admission_requests", "Requêtes admises (en_cours) et en attente d'une place.",
+                       lambda: [({"etat": etat}, nb) for etat, nb in admission.etat().items()]))
+registre.ajouter(Jauge("sport_cache_bytes", "Taille (JSON) des résultats gardés dans le cache.",
+                       statistique_cache("bytes")))
+
+def instrumenter(route):
+    """Durée, code de réponse, lignes et octets renvoyés de la route ; requête lente notée dans le journal.
+
+    La route renseigne g.sql_normalise, g.id_requete et g.nb_lignes quand elle exécute une requête.
+    """
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                reponse = app.make_response(fonction(*args, **kwargs))
+            except Exception:
+                requetes_http.incrementer(route=route, status=500)
+                erreurs_http.incrementer(route=route)
+                raise
+            duree = time.perf_counter() - debut
+            requetes_http.incrementer(route=route, status=reponse.status_code)
+            duree_http.observer(duree, route=route)
+            if reponse.status_code >= 400:
+                erreurs_http.incrementer(route=route)
+            if not reponse.is_streamed:  # Un export n'a pas de taille connue d'avance
+                octets_renvoyes.observer(reponse.content_length or 0, route=route)
+            if "nb_lignes" in g:
+                lignes_renvoyees.observer(g.nb_lignes, route=route)
+            if "sql_normalise" in g and duree >= SEUIL_REQUETE_LENTE:
+                noter_requete_lente(journal_lent, g.sql_normalise, duree, route=route, rows=g.get("nb_lignes"),
+                                    status=reponse.status_code, query_id=g.get("id_requete"))
+            return reponse
+        return enveloppe
+    return decorateur
+
+def refuser(refus):
+    """Réponse 429 avec Retry-After pour une requête refusée par le contrôle d'admission."""
+    refus_admission.incrementer(raison=refus.raison)
+    return jsonify({"error": str(refus)}), 429, {"Retry-After": str(refus.reessayer)}
+
+def connecter(temps=None):
+    """Connexion du pool, en mesurant l'attente (sport_pool_checkout_wait_seconds)."""
+    debut = time.perf_counter()
+    with chronometre("connexion", temps):
+        conn = obtenir_engine().connect()
+    attente_pool.observer(time.perf_counter() - debut)
+    return conn
+
+def empreinte_sql(sql_normalise):
+    return hashlib.sha256(sql_normalise.encode()).hexdigest()[:16]
+
+def creer_jeton(sql_normalise, version, position, curseur=None):
+    """Jeton de la page suivante : position, empreinte du SQL, version des données et curseur ouvert.
+
+    Le curseur (moteur.CurseurPagination) n'existe que dans le processus qui a servi la page : ailleurs, ou
+    une fois fermé, la page est relue en réexécutant la requête (voir lire_page_paginee).
+    """
+    contenu = {"position": position, "sql": empreinte_sql(sql_normalise), "version": version, "curseur": curseur}
+    return base64.urlsafe_b64encode(json.dumps(contenu).encode()).decode()
+
+def lire_jeton(jeton, sql_normalise, version):
+    """(position, curseur) de la page demandée ; ValueError si le jeton ne correspond pas à cette requête ou à ces données."""
+    try:
+        contenu = json.loads(base64.urlsafe_b64decode(jeton.encode()))
+        position = int(contenu["position"])
+        curseur = contenu.get("curseur")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("Jeton de page invalide.")
+    if contenu.get("sql") != empreinte_sql(sql_normalise) or position < 0 or not isinstance(curseur, (str, type(None))):
+        raise ValueError("Jeton de page invalide pour cette requête.")
+    if contenu.get("version") != version:
+        raise ValueError("Les données ont été rechargées depuis la première page : relancer la requête.")
+    return position, curseur
+
+def lire_page_paginee(sql, sql_normalise, position, nom_curseur, id_requete, delai, temps=None):
+    """(colonnes, lignes, suite, nom du curseur gardé pour la page suivante ou None) d'une requête paginable.
+
+    La première page est lue sur une connexion du pool ; sa connexion n'est gardée (moteur.paginer) que s'il
+    reste des lignes. Une page suivante est lue sur le curseur de la page précédente s'il est encore ouvert
+    dans ce processus. Sinon la requête est réexécutée jusqu'à `position`, seulement si elle est triée : sans
+    ORDER BY, deux exécutions peuvent renvoyer les lignes dans un ordre différent (pages avec des lignes
+    répétées ou manquantes).
+    """
+    curseur = reprendre_curseur(nom_curseur, position) if nom_curseur else None
+    if curseur is not None:
+        try:
+            colonnes, lignes, suite = curseur.lire(id_requete, delai, temps=temps)
+        except Exception:
+            curseur.fermer()
+            raise
+        if not suite:
+            curseur.fermer()
+            return colonnes, lignes, suite, None
+        garder_curseur(curseur)
+        return colonnes, lignes, suite, curseur.nom
+
+    if position and not est_ordonne(sql_normalise):
+        raise ValueError("Page suivante expirée (curseur fermé) et requête sans ORDER BY : relancer la requête.")
+    conn = connecter(temps)
+    try:
+        identifier_requete(conn, id_requete, delai)
+        if position:
+            colonnes, lignes, suite = lire_page(conn, sql, position, temps=temps)
+            return colonnes, lignes, suite, None
+        colonnes, lignes, curseur = paginer(conn, sql, temps=temps)
+    finally:
+        if curseur is None:  # Une connexion détachée appartient au curseur
+            conn.close()
+    if curseur is None:
+        return colonnes, lignes, False, None
+    garder_curseur(curseur)
+    return colonnes, lignes, True, curseur.nom
+
+def lots_csv(colonnes, lots):
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, delimiter=';')
+    ecrivain.writerow(colonnes)
+    for lot in lots:
+        ecrivain.writerows(lot)
+        yield tampon.getvalue().encode()
+        tampon.seek(0)
+        tampon.truncate()
+    if tampon.getvalue():
+        yield tampon.getvalue().encode()  # En-tête seul si le résultat est vide
+
+def lots_ndjson(colonnes, lots):
+    for lot in lots:
+        yield "".join(json.dumps(dict(zip(colonnes, ligne)), default=str, ensure_ascii=False) + "\n"
+                      for ligne in lot).encode()
+
+def compresser_flux(morceaux):
+    compresseur = zlib.compressobj(wbits=31)  # wbits=31 : format gzip
+    for morceau in morceaux:
+        compresse = compresseur.compress(morceau)
+        if compresse:
+            yield compresse
+    yield compresseur.flush()
+
+def parametres_execution(valeurs):
+    """Identifiant de la requête et délai (ms) demandés, bornés par DELAI_REQUETE."""
+    id_requete = valeurs.get('query_id') or uuid.uuid4().hex
+    if not RE_ID_REQUETE.match(id_requete):
+        raise ValueError("Identifiant de requête invalide.")
+    try:
+        delai = int(valeurs.get('timeout_ms') or DELAI_REQUETE)
+    except ValueError:
+        raise ValueError("Délai invalide.")
+    return id_requete, min(max(delai, 1), DELAI_REQUETE)
+
+def repondre_resultat(resultat, temps=None):
+    """Résultat de /execute dans le format demandé (Accept), compressé selon Accept-Encoding (voir transport.py).
+
+    En mode profil, les durées des étapes (`temps`) partent dans l'en-tête Server-Timing.
+    """
+    with chronometre("sérialisation", temps):
+        corps, type_contenu = encoder_resultat(resultat, request.headers.get("Accept"))
+        corps, encodage = compresser(corps, request.headers.get("Accept-Encoding"))
+    reponse = Response(corps, content_type=type_contenu)
+    reponse.headers["Vary"] = "Accept, Accept-Encoding"
+    if encodage is not None:
+        reponse.headers["Content-Encoding"] = encodage
+    if temps is not None:
+        # Noms sans accents : un nom d'étape Server-Timing est un token ASCII
+        reponse.headers["Server-Timing"] = ", ".join(
+            f"{unicodedata.normalize('NFKD', nom).encode('ascii', 'ignore').decode()};dur={duree:.1f}"
+            for nom, duree in temps.items())
+    return reponse
+
+def requetes_effectives():
+    """Requêtes prédéfinies, en lisant les vues matérialisées quand elles existent."""
+    requetes = {key: dict(val) for key, val in PREDEFINED_QUERIES.items()}
+    try:
+        with obtenir_engine().connect() as conn:
+            for key in requetes:
+                requetes[key]["sql"] = requete_predefinie(conn, key)
+    except Exception as e:
+        print(f"Erreur lecture vues : {e}")
+    return requetes
+
 # --- TEMPLATE HTML/CSS/JS  ---
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -173,7 +377,8 @@ HTML_TEMPLATE = """
 
         /* --- Results Area --- */
         .results {
-            flex: 1; padding: 0; overflow: auto;
+            flex: 1; padding: 0; overflow: hidden;
+            display: flex; flex-direction: column;
             background: var(--bg);
         }
 
@@ -190,11 +395,30 @@ HTML_TEMPLATE = """
         tr:hover td { background-color: #f5f5f5; }
         .null-val { color: #ccc; font-style: italic; }
 
+        /* Grille virtuelle : seules les lignes visibles existent dans le DOM */
+        .grid-viewport { flex: 1; overflow: auto; }
+        table.grid { table-layout: fixed; min-width: 100%; }
+        table.grid td { overflow: hidden; text-overflow: ellipsis; }
+        tr.grid-spacer td { padding: 0; border: 0; height: 0; }
+        tr.grid-spacer:hover td { background: none; }
+
         /* States */
         .empty-state {
-            display: flex; align-items: center; justify-content: center; height: 100%;
+            display: flex; align-items: center; justify-content: center; flex: 1;
             color: #ccc; font-weight: 300; letter-spacing: 1px;
         }
+        /* Mode profil : durées des étapes et plan d'exécution au-dessus des résultats */
+        .profile-panel {
+            max-height: 40%; overflow: auto; padding: 10px 20px;
+            border-bottom: 1px solid var(--border); font-size: 0.8rem;
+        }
+        .profile-panel table { font-size: 0.8rem; margin-top: 8px; }
+        .profile-panel th, .profile-panel td { padding: 4px 10px; }
+        .profile-panel tr.hot td { background-color: #ffd6d6; }
+        button.stop-btn {
+            margin-left: 15px; padding: 6px 12px; background: #000; color: #fff;
+            border: none; cursor: pointer; font-size: 0.8rem; letter-spacing: 0.5px;
+        }
         .error-msg { padding: 20px; background: #000; color: #fff; font-family: monospace; }
         .success-bar { 
             padding: 10px 20px; background: #f0f0f0; color: #666; 
@@ -314,6 +538,10 @@ HTML_TEMPLATE = """
                 <button class="action-btn" onclick="runQuery('free')">EXÉCUTER</button>
             </div>
 
+            <div class="checkbox-wrapper" style="margin-top:20px;">
+                <input type="checkbox" id="profile-mode"> <label>Mode profil (EXPLAIN ANALYZE)</label>
+            </div>
+
         </div>
 
         <!-- Results -->
@@ -324,6 +552,14 @@ HTML_TEMPLATE = """
 
     <script>
         const queries = {{ queries | tojson }};
+        // Requête affichée : lignes reçues et jeton de la page suivante (null : tout est reçu)
+        let current = null;
+        // Exécution en cours sur le serveur : son identifiant permet de l'interrompre (/cancel)
+        let running = null;
+        // Grille virtuelle : lignes <tr> recyclées, hauteur d'une ligne mesurée au premier affichage
+        let grid = null;
+        const GRID_OVERSCAN = 10;  // Lignes dessinées en plus au-dessus et au-dessous de la zone visible
+        const GRID_PREFETCH = 200;  // Page suivante demandée quand il reste moins de lignes que ça sous la zone visible
 
         document.addEventListener('DOMContentLoaded', () => {
             updatePreview();
@@ -343,16 +579,22 @@ HTML_TEMPLATE = """
             document.getElementById('predef-preview').value = queries[key].sql;
         }
 
+        // Catalogue du schéma, lu une fois au chargement de la page : { table: { genre, lignes, colonnes } }
+        let catalog = {};
+
         async function loadTables() {
             try {
-                const res = await fetch('/metadata/tables');
-                const tables = await res.json();
+                const res = await fetch('/metadata/catalog');
+                const entries = await res.json();
+                const tables = entries.map(e => e.nom);
+                catalog = {};
+                entries.forEach(e => { catalog[e.nom] = e; });
                 const select = document.getElementById('builder-table');
                 select.innerHTML = '';
-                tables.forEach(t => {
+                entries.forEach(e => {
                     const opt = document.createElement('option');
-                    opt.value = t;
-                    opt.innerText = t;
+                    opt.value = e.nom;
+                    opt.innerText = e.lignes === null ? e.nom : `${e.nom} (≈ ${e.lignes.toLocaleString('fr-FR')} lignes)`;
                     select.appendChild(opt);
                 });
                 if(tables.length > 0) {
@@ -362,13 +604,12 @@ HTML_TEMPLATE = """
             } catch (e) { console.error("Err tables", e); }
         }
 
-        async function loadColumns() {
+        function loadColumns() {
             const table = document.getElementById('builder-table').value;
-            if(!table) return;
+            if(!table || !catalog[table]) return;
             
             try {
-                const res = await fetch('/metadata/columns/' + table);
-                const cols = await res.json();
+                const cols = catalog[table].colonnes.map(c => c.nom);
                 
                 const fillSelect = (id, includeDefault, defaultText) => {
                     const el = document.getElementById(id);
@@ -402,14 +643,70 @@ HTML_TEMPLATE = """
             } catch (e) { console.error("Err cols", e); }
         }
 
+        // Résultats demandés colonne par colonne (voir transport.py), remis ici en lignes pour la grille
+        const RESULT_HEADERS = { 'Content-Type': 'application/json', 'Accept': '{{ type_colonnes }}, application/json' };
+
+        function decodeResult(data) {
+            if (!data.data) return data;  // Erreur ou format ligne par ligne
+            const rows = new Array(data.n);
+            for (let i = 0; i < data.n; i++) rows[i] = new Array(data.columns.length);
+            data.data.forEach((values, j) => {
+                const dict = data.dictionaries[j];
+                for (let i = 0; i < data.n; i++) {
+                    const v = values[i];
+                    rows[i][j] = dict && v !== null ? dict[v] : v;
+                }
+            });
+            data.rows = rows;
+            return data;
+        }
+
+        // Réponse 429 (contrôle d'admission) : nouvel essai après le délai Retry-After, ESSAIS_429 fois au plus
+        const ESSAIS_429 = 5;
+
+        async function fetchExecute(body, run) {
+            for (let essai = 1; ; essai++) {
+                const response = await fetch('/execute', { method: 'POST', headers: RESULT_HEADERS, body: JSON.stringify(body) });
+                if (response.status !== 429 || essai >= ESSAIS_429 || run.cancelled) return response;
+                const delai = parseFloat(response.headers.get('Retry-After')) || 1;
+                await new Promise(resolve => setTimeout(resolve, delai * 1000));
+                if (run.cancelled) return response;
+            }
+        }
+
+        function errorMessage(response, data) {
+            return response.status === 429
+                ? `<div class="error-msg">SERVEUR OCCUPÉ:<br>${data.error}</div>`
+                : `<div class="error-msg">ERREUR SQL:<br>${data.error}</div>`;
+        }
+
+        function newQueryId() {
+            return crypto.randomUUID ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+
+        function stopQuery() {
+            if (!running) return;
+            running.cancelled = true;
+            fetch('/cancel', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query_id: running.id })
+            }).catch(e => console.error("Err cancel", e));
+        }
+
         async function runQuery(mode) {
             const resultsArea = document.getElementById('results-area');
-            resultsArea.innerHTML = '<div class="empty-state">Chargement...</div>';
+            stopQuery();  // Une requête encore en cours est interrompue avant de lancer la suivante
+            const run = { id: newQueryId(), cancelled: false };
+            running = run;
+            resultsArea.innerHTML = '<div class="empty-state">Chargement... <button class="stop-btn" onclick="stopQuery()">STOP</button></div>';
 
             let sql = "";
 
+            let predefinie = null;
             if (mode === 'predef') {
                 sql = document.getElementById('predef-preview').value;
+                predefinie = document.getElementById('predef-select').value;
             } 
             else if (mode === 'builder') {
                 const table = document.getElementById('builder-table').value;
@@ -448,56 +745,262 @@ HTML_TEMPLATE = """
             }
 
             try {
-                const response = await fetch('/execute', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ sql: sql })
-                });
-                
-                const data = await response.json();
+                const profile = document.getElementById('profile-mode').checked;
+                const t0 = performance.now();
+                const response = await fetchExecute({ sql: sql, predefinie: predefinie, query_id: run.id, profile: profile }, run);
+                const tResponse = performance.now();
+                const data = decodeResult(await response.json());
+                const tDecoded = performance.now();
+                if (running !== run) return;  // Remplacée par une requête plus récente
+                running = null;
 
                 if (data.error) {
-                    resultsArea.innerHTML = `<div class="error-msg">ERREUR SQL:<br>${data.error}</div>`;
+                    resultsArea.innerHTML = run.cancelled
+                        ? '<div class="empty-state">Requête annulée.</div>'
+                        : errorMessage(response, data);
                     return;
                 }
 
-                renderTable(data.columns, data.rows);
+                current = { sql: sql, predefinie: predefinie, next: data.next_page_token, rows: data.rows, loading: false };
+                if (profile) {
+                    // Durées côté serveur (Server-Timing), puis réseau, décodage et affichage mesurés ici
+                    const timings = parseServerTiming(response.headers.get('Server-Timing'));
+                    const server = Object.values(timings).reduce((a, b) => a + b, 0);
+                    timings['réseau'] = Math.max(tResponse - t0 - server, 0);
+                    timings['décodage'] = tDecoded - tResponse;
+                    current.profile = { plan: data.profile, timings: timings };
+                }
+                const tRender = performance.now();
+                renderTable(data.columns, data.cache);
+                if (current.profile) {
+                    current.profile.timings['affichage'] = performance.now() - tRender;
+                    renderProfile();
+                }
 
             } catch (e) {
+                if (running !== run) return;
+                running = null;
                 resultsArea.innerHTML = `<div class="error-msg">Erreur Serveur: ${e}</div>`;
             }
         }
 
-        function renderTable(cols, rows) {
+        function renderCount(cache) {
+            const more = current.next ? '+' : '';
+            const cached = cache && cache.status === 'hit' ? ' (cache)' : '';
+            const loading = current.loading ? ' (chargement...)' : '';
+            const count = document.getElementById('row-count');
+            count.innerText = `${current.rows.length}${more} lignes${cached}${loading}`;
+            if (current.loading) {
+                count.insertAdjacentHTML('beforeend', '<button class="stop-btn" onclick="stopQuery()">STOP</button>');
+            }
+        }
+
+        function parseServerTiming(header) {
+            const timings = {};
+            (header || '').split(',').forEach(part => {
+                const [name, ...params] = part.trim().split(';');
+                const dur = params.find(p => p.trim().startsWith('dur='));
+                if (name && dur) timings[name] = parseFloat(dur.trim().slice(4));
+            });
+            return timings;
+        }
+
+        function renderProfile() {
+            const panel = document.getElementById('profile-panel');
+            if (!panel) return;
+            const { plan, timings } = current.profile;
+            const cell = text => { const td = document.createElement('td'); td.textContent = text; return td; };
+
+            const summary = document.createElement('div');
+            summary.textContent = 'Client : ' + Object.entries(timings).map(([k, v]) => `${k} ${v.toFixed(1)} ms`).join('  ·  ');
+            panel.appendChild(summary);
+            if (!plan) {
+                panel.insertAdjacentHTML('beforeend', `<div>Plan non disponible (requête qui n'est pas en lecture).</div>`);
+                return;
+            }
+            const twice = document.createElement('div');
+            twice.textContent = 'Requête exécutée deux fois : sous EXPLAIN ANALYZE (transaction en lecture seule, annulée), puis normalement.';
+            panel.appendChild(twice);
+            const server = document.createElement('div');
+            server.textContent = `Serveur : planification ${plan.planification.toFixed(1)} ms, exécution ${plan.execution.toFixed(1)} ms`;
+            panel.appendChild(server);
+
+            // Arbre du plan : indentation par profondeur, nœuds les plus coûteux surlignés
+            const table = document.createElement('table');
+            table.innerHTML = '<thead><tr><th>Nœud</th><th>Temps propre (ms)</th><th>Part</th><th>Lignes</th><th>Estimées</th><th>Blocs cache / lus</th></tr></thead>';
+            const body = document.createElement('tbody');
+            plan.noeuds.forEach(n => {
+                const tr = document.createElement('tr');
+                if (n.chaud) tr.className = 'hot';
+                const label = cell(n.noeud);
+                label.style.paddingLeft = `${10 + n.profondeur * 18}px`;
+                tr.appendChild(label);
+                tr.appendChild(cell(n.temps_propre.toFixed(1)));
+                tr.appendChild(cell(`${Math.round(n.part * 100)} %`));
+                tr.appendChild(cell(n.lignes));
+                tr.appendChild(cell(n.lignes_estimees));
+                tr.appendChild(cell(`${n.blocs_cache} / ${n.blocs_lus}`));
+                body.appendChild(tr);
+            });
+            table.appendChild(body);
+            panel.appendChild(table);
+        }
+
+        function columnWidth(header, rows, idx) {
+            // Largeur fixée d'après un échantillon : les colonnes ne bougent pas pendant le défilement
+            let maxLen = String(header).length;
+            rows.slice(0, 50).forEach(row => {
+                const cell = row[idx] === null ? 'NULL' : String(row[idx]);
+                maxLen = Math.max(maxLen, cell.length);
+            });
+            return Math.min(Math.max(90, maxLen * 8 + 40), 320);
+        }
+
+        function renderTable(cols, cache) {
             const area = document.getElementById('results-area');
-            if (rows.length === 0) {
-                area.innerHTML = '<div class="empty-state">Aucun résultat.</div>';
+            if (current.rows.length === 0) {
+                area.innerHTML = (current.profile ? '<div class="profile-panel" id="profile-panel"></div>' : '')
+                    + '<div class="empty-state">Aucun résultat.</div>';
                 return;
             }
 
-            let html = `
+            const widths = cols.map((c, i) => columnWidth(c, current.rows, i));
+            area.innerHTML = `
                 <div class="success-bar">
                     <span>Résultat</span>
-                    <span>${rows.length} lignes</span>
+                    <span>
+                        Exporter :
+                        <a href="#" onclick="exportResults('csv'); return false;">CSV</a> ·
+                        <a href="#" onclick="exportResults('ndjson'); return false;">NDJSON</a>
+                        <label><input type="checkbox" id="export-gzip"> gzip</label>
+                    </span>
+                    <span id="row-count"></span>
+                </div>
+                ${current.profile ? '<div class="profile-panel" id="profile-panel"></div>' : ''}
+                <div class="grid-viewport" id="grid-viewport">
+                    <table class="grid" style="width:${widths.reduce((a, b) => a + b, 0)}px">
+                        <colgroup>${widths.map(w => `<col style="width:${w}px">`).join('')}</colgroup>
+                        <thead>
+                            <tr id="grid-head"></tr>
+                        </thead>
+                        <tbody>
+                            <tr class="grid-spacer" id="grid-top"><td colspan="${cols.length}"></td></tr>
+                            <tr class="grid-spacer" id="grid-bottom"><td colspan="${cols.length}"></td></tr>
+                        </tbody>
+                    </table>
                 </div>
-                <table>
-                    <thead>
-                        <tr>${cols.map(c => `<th>${c}</th>`).join('')}</tr>
-                    </thead>
-                    <tbody>
             `;
+            const head = document.getElementById('grid-head');
+            cols.forEach(c => {
+                const th = document.createElement('th');
+                th.textContent = c;
+                head.appendChild(th);
+            });
 
-            rows.forEach(row => {
-                html += '<tr>';
-                row.forEach(val => {
-                    const displayVal = val === null ? '<span class="null-val">NULL</span>' : val;
-                    html += `<td>${displayVal}</td>`;
-                });
-                html += '</tr>';
+            const viewport = document.getElementById('grid-viewport');
+            grid = { viewport: viewport, nbCols: cols.length, pool: [], rowHeight: 0, pending: false };
+            viewport.addEventListener('scroll', () => {
+                // Un seul dessin par image, quel que soit le nombre d'événements scroll
+                if (grid.pending) return;
+                grid.pending = true;
+                requestAnimationFrame(() => { grid.pending = false; drawGrid(); });
+            });
+            renderCount(cache);
+            drawGrid();
+        }
+
+        function drawGrid() {
+            const rows = current.rows;
+            const viewport = grid.viewport;
+            const rowHeight = grid.rowHeight || 41;
+            const first = Math.max(0, Math.floor(viewport.scrollTop / rowHeight) - GRID_OVERSCAN);
+            const last = Math.min(rows.length, first + Math.ceil(viewport.clientHeight / rowHeight) + 2 * GRID_OVERSCAN);
+
+            // Lignes du DOM réutilisées : on n'en crée que si la fenêtre visible grandit
+            const bottom = document.getElementById('grid-bottom');
+            while (grid.pool.length < last - first) {
+                const tr = document.createElement('tr');
+                for (let j = 0; j < grid.nbCols; j++) tr.appendChild(document.createElement('td'));
+                bottom.parentNode.insertBefore(tr, bottom);
+                grid.pool.push(tr);
+            }
+            grid.pool.forEach((tr, k) => {
+                const row = rows[first + k];
+                tr.style.display = first + k < last ? '' : 'none';
+                if (first + k >= last) return;
+                for (let j = 0; j < grid.nbCols; j++) {
+                    const td = tr.cells[j];
+                    const val = row[j];
+                    td.className = val === null ? 'null-val' : '';
+                    td.textContent = val === null ? 'NULL' : String(val);
+                }
             });
 
-            html += '</tbody></table>';
-            area.innerHTML = html;
+            if (!grid.rowHeight && grid.pool.length && first < last) {
+                grid.rowHeight = grid.pool[0].getBoundingClientRect().height || 41;
+            }
+            document.getElementById('grid-top').cells[0].style.height = `${first * grid.rowHeight}px`;
+            bottom.cells[0].style.height = `${(rows.length - last) * grid.rowHeight}px`;
+
+            if (current.next && !current.loading && rows.length - last < GRID_PREFETCH) {
+                loadMore();
+            }
+        }
+
+        function exportResults(format) {
+            // Formulaire POST : le navigateur télécharge le flux directement, sans le garder en mémoire
+            if (!current) return;
+            const form = document.createElement('form');
+            form.method = 'POST';
+            form.action = '/export';
+            const fields = { sql: current.sql, format: format, query_id: newQueryId(), gzip: document.getElementById('export-gzip').checked ? '1' : '' };
+            Object.entries(fields).forEach(([name, value]) => {
+                const input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = name;
+                input.value = value;
+                form.appendChild(input);
+            });
+            document.body.appendChild(form);
+            form.submit();
+            form.remove();
+        }
+
+        async function loadMore() {
+            const query = current;
+            const run = { id: newQueryId(), cancelled: false };
+            running = run;
+            query.loading = true;
+            renderCount();
+            try {
+                const response = await fetchExecute(
+                    { sql: query.sql, predefinie: query.predefinie, page_token: query.next, query_id: run.id }, run);
+                const data = decodeResult(await response.json());
+                if (current !== query) return;  // Une autre requête a été lancée entre-temps
+                if (running === run) running = null;
+                query.loading = false;
+                if (data.error) {
+                    query.next = null;
+                    document.getElementById('results-area').insertAdjacentHTML(
+                        'beforeend', run.cancelled
+                            ? '<div class="error-msg">Chargement interrompu.</div>'
+                            : errorMessage(response, data));
+                } else {
+                    // Ajout en place : concat recopierait tout le tampon à chaque page
+                    for (const row of data.rows) query.rows.push(row);
+                    query.next = data.next_page_token;
+                }
+                renderCount(data.cache);
+                drawGrid();
+            } catch (e) {
+                if (current !== query) return;
+                if (running === run) running = null;
+                query.loading = false;
+                query.next = null;
+                renderCount();
+                document.getElementById('results-area').insertAdjacentHTML(
+                    'beforeend', `<div class="error-msg">Erreur Serveur: ${e}</div>`);
+            }
         }
     </script>
 </body>
@@ -508,44 +1011,204 @@ HTML_TEMPLATE = """
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE, db_name=DB_NAME, queries=PREDEFINED_QUERIES)
+    return render_template_string(HTML_TEMPLATE, db_name=DB_NAME, queries=requetes_effectives(),
+                                  type_colonnes=TYPE_COLONNES)
 
 @app.route('/execute', methods=['POST'])
+@instrumenter("execute")
 def execute_sql():
     data = request.json
     sql_query = data.get('sql')
-    
+    # Requête prédéfinie : exécutée par son nom (PREPARE fait à l'ouverture de la connexion, voir moteur.py)
+    cle_predefinie = data.get('predefinie')
+    # Pages suivantes : jeton renvoyé avec la page précédente
+    jeton = data.get('page_token')
+    # Mode profil : plan réel (EXPLAIN ANALYZE) dans la réponse, durées des étapes dans Server-Timing
+    temps = {} if data.get('profile') else None
+
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text(sql_query))
-            
-            if not result.returns_rows:
-                return jsonify({"columns": [], "rows": []})
-            
-            columns = list(result.keys())
-            rows = [list(row) for row in result.fetchall()]
-            
-            return jsonify({"columns": columns, "rows": rows})
+        id_requete, delai = parametres_execution(data)
+        if cle_predefinie in PREDEFINED_QUERIES:
+            # Le SQL envoyé n'est pas exécuté : la clé du cache (et du jeton) vient de la requête prédéfinie
+            sql_query = PREDEFINED_QUERIES[cle_predefinie]["sql"]
+        sql_normalise = normaliser_sql(sql_query or "")
+        g.id_requete, g.sql_normalise = id_requete, sql_normalise
+        version = version_donnees()
+        position, nom_curseur = lire_jeton(jeton, sql_normalise, version) if jeton else (0, None)
+        paginable = cle_predefinie not in PREDEFINED_QUERIES and est_paginable(sql_normalise)
+
+        cle_cache = None
+        if est_cachable(sql_normalise) and temps is None:
+            cle_cache = (sql_normalise, version, position)
+            resultat = cache_resultats.lire(cle_cache)
+            if resultat is not None:
+                g.nb_lignes = len(resultat["rows"])
+                return repondre_resultat(dict(resultat, query_id=id_requete,
+                                              cache=dict(cache_resultats.statistiques(), status="hit")))
+
+        suite = False
+        plan = None
+        nom_curseur_suivant = None
+        # Une place d'exécution (admission.py) est prise avant la connexion et rendue après
+        with admission.admettre(request.remote_addr):
+            if paginable:
+                # EXPLAIN ANALYZE exécute la requête : seulement pour une requête en lecture
+                if temps is not None:
+                    with connecter(temps) as conn:
+                        identifier_requete(conn, id_requete, delai)
+                        plan = expliquer(conn, sql_query)
+                # Curseur côté serveur : seule la page demandée passe par la mémoire de Flask
+                columns, rows, suite, nom_curseur_suivant = lire_page_paginee(
+                    sql_query.strip().rstrip(";"), sql_normalise, position, nom_curseur, id_requete, delai, temps)
+            else:
+                with connecter(temps) as conn:
+                    # Session nommée d'après la requête (pour /cancel) et durée bornée, le temps de cette exécution
+                    identifier_requete(conn, id_requete, delai)
+                    if temps is not None and cle_predefinie in PREDEFINED_QUERIES:
+                        plan = expliquer(conn, requete_predefinie(conn, cle_predefinie))
+                    with chronometre("exécution", temps):
+                        if cle_predefinie in PREDEFINED_QUERIES:
+                            result = executer_predefinie(conn, cle_predefinie)
+                        else:
+                            result = conn.execute(text(sql_query))
+
+                    if not result.returns_rows:
+                        return repondre_resultat({"columns": [], "rows": [], "query_id": id_requete}, temps)
+
+                    columns = list(result.keys())
+                    # Pas de curseur serveur possible (EXECUTE, écriture avec RETURNING) : une page au plus
+                    with chronometre("lecture", temps):
+                        rows = result.fetchmany(TAILLE_PAGE)
+            rows = [list(row) for row in rows]
+        g.nb_lignes = len(rows)
+
+        resultat = {
+            "columns": columns,
+            "rows": rows,
+            "offset": position,
+            "next_page_token": (creer_jeton(sql_normalise, version, position + len(rows), nom_curseur_suivant)
+                                if suite else None),
+        }
+        # Page servie par le cache : son jeton désigne un curseur qui aura avancé ou sera fermé, la page suivante
+        # sera relue en réexécutant la requête, ce qui demande un ORDER BY
+        if suite and not est_ordonne(sql_normalise):
+            cle_cache = None
+        if cle_cache is not None:
+            cache_resultats.ecrire(cle_cache, resultat)
+        statut = "miss" if cle_cache is not None else "bypass"
+        if temps is not None:
+            resultat = dict(resultat, profile=plan)
+        return repondre_resultat(dict(resultat, query_id=id_requete,
+                                      cache=dict(cache_resultats.statistiques(), status=statut)), temps)
             
+    except Refus as refus:
+        return refuser(refus)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/export', methods=['GET', 'POST'])
+@instrumenter("export")
+def export_sql():
+    """Résultat complet en CSV ou NDJSON, envoyé au fil de la lecture (mémoire constante), gzip en option."""
+    sql_query = request.values.get('sql', '')
+    format_export = request.values.get('format', 'csv')
+    gzip_demande = request.values.get('gzip') in ("1", "true", "on")
+
+    try:
+        id_requete, delai = parametres_execution(request.values)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if format_export not in FORMATS_EXPORT:
+        return jsonify({"error": f"Format inconnu : {format_export} (csv ou ndjson)."}), 400
+    if not est_paginable(normaliser_sql(sql_query)):
+        return jsonify({"error": "Seule une requête en lecture (SELECT, WITH, VALUES, TABLE) peut être exportée."}), 400
+
+    # La requête est lancée avant la réponse : une erreur SQL donne une erreur 400 et non un fichier tronqué
+    g.id_requete, g.sql_normalise = id_requete, normaliser_sql(sql_query)
+    # La place d'exécution (admission.py) est gardée jusqu'à la fin du téléchargement
+    client = request.remote_addr
+    try:
+        admission.entrer(client)
+    except Refus as refus:
+        return refuser(refus)
+
+    def liberer():
+        conn.close()
+        admission.sortir(client)
+
+    try:
+        conn = connecter()
+    except Exception as e:
+        admission.sortir(client)
+        return jsonify({"error": str(e)}), 400
+    try:
+        identifier_requete(conn, id_requete, delai)
+        result = conn.execution_options(stream_results=True).execute(text(sql_query.strip().rstrip(";")))
+        colonnes = list(result.keys())
+    except Exception as e:
+        liberer()
+        return jsonify({"error": str(e)}), 400
+
+    def morceaux():
+        lots = result.yield_per(EXPORT_LOT).partitions()
+        if format_export == "csv":
+            yield from lots_csv(colonnes, lots)
+        else:
+            yield from lots_ndjson(colonnes, lots)
+
+    type_contenu, extension = FORMATS_EXPORT[format_export]
+    nom_fichier = f"export.{extension}"
+    flux = morceaux()
+    if gzip_demande:
+        type_contenu, nom_fichier, flux = "application/gzip", nom_fichier + ".gz", compresser_flux(flux)
+    reponse = Response(flux, mimetype=type_contenu, headers={
+        "Content-Disposition": f'attachment; filename="{nom_fichier}"',
+        "X-Accel-Buffering": "no",  # Derrière nginx : pas de mise en tampon de la réponse
+    })
+    # Appelé par le serveur à la fin de la réponse, aussi quand le client interrompt le téléchargement
+    reponse.call_on_close(liberer)
+    return reponse
+
+@app.route('/cancel', methods=['POST'])
+@instrumenter("cancel")
+def cancel_query():
+    """Interrompt la requête `query_id` sur le serveur, quel que soit le processus qui l'exécute."""
+    id_requete = (request.json or {}).get('query_id') or ""
+    if not RE_ID_REQUETE.match(id_requete):
+        return jsonify({"error": "Identifiant de requête invalide."}), 400
+    try:
+        return jsonify({"query_id": id_requete, "cancelled": annuler_requete(id_requete)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/metadata/catalog')
+@instrumenter("catalog")
+def get_catalog():
+    """Catalogue complet (tables, vues, colonnes, types, estimation du nombre de lignes), lu en cache (moteur.py)."""
+    try:
+        # Liste plutôt que dictionnaire : jsonify trierait les clés et mélangerait tables et vues
+        return jsonify([dict(entree, nom=nom) for nom, entree in catalogue_schema().items()])
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 @app.route('/metadata/tables')
+@instrumenter("tables")
 def get_tables():
-    insp = inspect(engine)
-    tables = insp.get_table_names()
-    return jsonify(tables)
+    # Les vues comptent aussi : avec remplissage.py --dimensions, les tables data_es_* sont des vues
+    return jsonify(list(catalogue_schema()))
 
 @app.route('/metadata/columns/<table_name>')
+@instrumenter("columns")
 def get_columns(table_name):
-    insp = inspect(engine)
-    try:
-        cols = [c['name'] for c in insp.get_columns(table_name)]
-        return jsonify(cols)
-    except Exception:
-        return jsonify([])
+    entree = catalogue_schema().get(table_name)
+    return jsonify([c["nom"] for c in entree["colonnes"]] if entree else [])
+
+@app.route('/metrics')
+def metrics():
+    return Response(registre.exposer(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == '__main__':
     PORT_WEB = 5001
+    rechauffer_pool()
     print(f"Serveur prêt : http://127.0.0.1:{PORT_WEB}")
     app.run(debug=True, port=PORT_WEB)
@@ -0,0 +1,97 @@
+import argparse
+import os
+import tempfile
+from moteur import TAILLE_POOL, fermer_engine, rechauffer_pool
+from requete_web import DELAI_REQUETE, admission, app, registre
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Module optionnel, seulement pour ce mode de service (pip install gunicorn)
+    BaseApplication = object
+
+# Service de requete_web.py pour plusieurs utilisateurs : la même application Flask sous gunicorn,
+# serveur WSGI qui lance plusieurs processus (fork) et plusieurs threads par processus.
+# (python requete_web.py reste le serveur de développement : un processus, rechargement et débogueur.)
+#
+# Chaque processus a son propre pool de connexions (moteur.obtenir_engine le recrée après le fork),
+# son propre cache de résultats et ses propres métriques. Celles-ci sont additionnées par /metrics à partir
+# d'un répertoire commun (REPERTOIRE_METRIQUES, voir metriques.Registre.partager).
+
+HOTE = "127.0.0.1"
+PORT_WEB = 5001
+NB_PROCESSUS = min(4, os.cpu_count() or 1)
+NB_THREADS = TAILLE_POOL  # Un thread par connexion gardée dans le pool : pas d'attente du pool en régime normal
+DELAI_ARRET = 30  # Secondes laissées aux requêtes en cours à l'arrêt (SIGTERM) avant de couper
+DELAI_WORKER = DELAI_REQUETE // 1000 + 30  # Un processus bloqué plus longtemps (s) est remplacé
+REPERTOIRE_METRIQUES = os.path.join(tempfile.gettempdir(), "sport-metriques")  # Suffixé par le port d'écoute
+
+
+def post_worker_init(worker):
+    """Processus prêt (après le fork) : son pool est ouvert d'avance, la première requête n'attend pas."""
+    registre.demarrer_partage()
+    try:
+        rechauffer_pool()
+    except Exception as e:
+        worker.log.warning(f"Pool non préchauffé : {e}")
+
+
+def worker_exit(server, worker):
+    """Arrêt d'un processus : ses connexions sont fermées proprement plutôt que coupées."""
+    registre.ecrire_etat()  # Dernières valeurs de ses compteurs, qui restent comptées par /metrics
+    fermer_engine()
+
+
+class ServeurWSGI(BaseApplication):
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for cle, valeur in self.options.items():
+            self.cfg.set(cle, valeur)
+
+    def load(self):
+        return self.application
+
+
+def lire_arguments():
+    parser = argparse.ArgumentParser(description="Sert requete_web.py avec gunicorn (plusieurs processus et threads).")
+    parser.add_argument("--hote", default=HOTE, help=f"adresse d'écoute (défaut : {HOTE})")
+    parser.add_argument("--port", type=int, default=PORT_WEB, help=f"port (défaut : {PORT_WEB})")
+    parser.add_argument("--processus", type=int, default=NB_PROCESSUS,
+                        help=f"nombre de processus (défaut : {NB_PROCESSUS})")
+    parser.add_argument("--threads", type=int, default=NB_THREADS,
+                        help=f"threads par processus (défaut : {NB_THREADS}, la taille du pool de connexions)")
+    parser.add_argument("--sans-limite-client", action="store_true",
+                        help="sans limites par client (débit, requêtes simultanées), pour un test de charge depuis "
+                             "une seule adresse ; les limites globales restent")
+    return parser.parse_args()
+
+
+def main():
+    args = lire_arguments()
+    if BaseApplication is object:
+        print("Erreur : gunicorn n'est pas installé (pip install gunicorn).")
+        return
+    if args.sans_limite_client:
+        admission.limites_client = False  # Avant le fork : vaut pour tous les processus
+    registre.partager(f"{REPERTOIRE_METRIQUES}-{args.port}")
+    options = {
+        "bind": f"{args.hote}:{args.port}",
+        "workers": args.processus,
+        "threads": args.threads,
+        "worker_class": "gthread",
+        "timeout": DELAI_WORKER,
+        "graceful_timeout": DELAI_ARRET,
+        "keepalive": 5,
+        "accesslog": "-",
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+    }
+    print(f"Serveur : http://{args.hote}:{args.port} ({args.processus} processus x {args.threads} threads)")
+    ServeurWSGI(app, options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # Module optionnel : json de la bibliothèque standard à la place (plus lent)
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Module optionnel : compression gzip seulement
+    brotli = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Module optionnel : pas de format Arrow sans pyarrow
+    pa = None
+
+# Format des résultats de /execute, utilisé par requete_web.py :
+#  - application/json : {"columns", "rows"} ligne par ligne (format d'origine) ;
+#  - TYPE_COLONNES : colonne par colonne, chaînes répétées remplacées par un indice dans un dictionnaire ;
+#  - TYPE_ARROW : flux Arrow IPC (si pyarrow est installé), métadonnées dans le schéma (clé "meta").
+
+TYPE_JSON = "application/json"
+TYPE_COLONNES = "application/vnd.sport.columnar+json"
+TYPE_ARROW = "application/vnd.apache.arrow.stream"
+
+TAILLE_MIN_COMPRESSION = 1024  # Octets : en dessous, la compression coûte plus qu'elle ne rapporte
+NIVEAU_GZIP = 6
+QUALITE_BROTLI = 5  # Compromis vitesse/taille pour une réponse produite à chaque requête
+
+
+def serialiser_json(valeur):
+    if orjson is not None:
+        return orjson.dumps(valeur, default=str)
+    return json.dumps(valeur, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encoder_colonne(valeurs):
+    """(valeurs, dictionnaire) : une colonne de chaînes peu variées devient des indices dans son dictionnaire."""
+    distinctes = {}
+    for valeur in valeurs:
+        if valeur is None:
+            continue
+        if not isinstance(valeur, str):
+            return valeurs, None
+        distinctes.setdefault(valeur, len(distinctes))
+    if not distinctes or len(distinctes) * 2 > len(valeurs):
+        return valeurs, None
+    return [None if valeur is None else distinctes[valeur] for valeur in valeurs], list(distinctes)
+
+
+def en_colonnes(colonnes, lignes):
+    """{"columns", "n", "data", "dictionaries"} : data[j] contient la colonne j (ou ses indices si dictionaries[j])."""
+    donnees = []
+    dictionnaires = []
+    for j in range(len(colonnes)):
+        valeurs, dictionnaire = encoder_colonne([ligne[j] for ligne in lignes])
+        donnees.append(valeurs)
+        dictionnaires.append(dictionnaire)
+    return {"columns": colonnes, "n": len(lignes), "data": donnees, "dictionaries": dictionnaires}
+
+
+def en_arrow(colonnes, lignes, meta):
+    tableaux = []
+    for j in range(len(colonnes)):
+        valeurs, dictionnaire = encoder_colonne([ligne[j] for ligne in lignes])
+        if dictionnaire is not None:
+            tableaux.append(pa.DictionaryArray.from_arrays(pa.array(valeurs, pa.int32()), pa.array(dictionnaire)))
+            continue
+        try:
+            tableaux.append(pa.array(valeurs))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Types mélangés dans la colonne : transmise en texte
+            tableaux.append(pa.array([None if v is None else str(v) for v in valeurs], pa.string()))
+    table = pa.Table.from_arrays(tableaux, names=colonnes)
+    table = table.replace_schema_metadata({"meta": serialiser_json(meta)})
+    sortie = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sortie, table.schema) as ecrivain:
+        ecrivain.write_table(table)
+    return sortie.getvalue().to_pybytes()
+
+
+def choisir_format(accept):
+    """Format demandé par l'en-tête Accept (le premier reconnu), sinon le JSON ligne par ligne."""
+    for morceau in (accept or "").split(","):
+        type_media = morceau.split(";")[0].strip()
+        if type_media == TYPE_ARROW and pa is not None:
+            return TYPE_ARROW
+        if type_media in (TYPE_COLONNES, TYPE_JSON):
+            return type_media
+    return TYPE_JSON
+
+
+def encoder_resultat(resultat, accept):
+    """(corps, type) de `resultat` ({"columns", "rows", ...métadonnées}) dans le format demandé."""
+    format_resultat = choisir_format(accept)
+    if format_resultat == TYPE_JSON:
+        return serialiser_json(resultat), TYPE_JSON
+    meta = {cle: valeur for cle, valeur in resultat.items() if cle not in ("columns", "rows")}
+    if format_resultat == TYPE_ARROW:
+        return en_arrow(resultat["columns"], resultat["rows"], meta), TYPE_ARROW
+    return serialiser_json(dict(meta, **en_colonnes(resultat["columns"], resultat["rows"]))), TYPE_COLONNES
+
+
+def compresser(corps, accept_encoding):
+    """(corps, Content-Encoding) : brotli ou gzip selon Accept-Encoding, rien pour un petit corps."""
+    encodages = {morceau.split(";")[0].strip() for morceau in (accept_encoding or "").split(",")}
+    if len(corps) < TAILLE_MIN_COMPRESSION:
+        return corps, None
+    if "br" in encodages and brotli is not None:
+        return brotli.compress(corps, quality=QUALITE_BROTLI), "br"
+    if "gzip" in encodages:
+        compresseur = zlib.compressobj(NIVEAU_GZIP, wbits=31)  # wbits=31 : format gzip
+        return compresseur.compress(corps) + compresseur.flush(), "gzip"
+    return corps, None